@@ -0,0 +1,116 @@
+"""
+Per-frame overhead of the action pipeline.
+
+Compares handing received messages straight to their handlers with queueing them as
+:class:`~pyvlcb.services.service.MessageIn` actions and draining them in batches, and
+measures frames going all the way from a raw socket to a handler, without and with
+per-service timing::
+
+    python -m benchmarks.bench_actions
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from socket import AF_UNIX, SOCK_DGRAM, socketpair
+from time import perf_counter
+
+from pyvlcb.modules.controller import ACTION_BATCH, Controller
+from pyvlcb.services.can import CanService
+from pyvlcb.services.service import MessageIn, Service
+from pyvlcb.transports.rawcan import CAN_FRAME, RawCanTransport
+from pyvlcb.vlcbdefs import OPC_ACON
+
+FRAMES = 200000
+MESSAGE = bytes([OPC_ACON, 0, 1, 0, 2])
+
+
+class _Consumer(Service):
+    """Counts the accessory events it receives."""
+
+    opcodes = (OPC_ACON,)
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    @property
+    def service_id(self) -> int:
+        return 0
+
+    @property
+    def service_version_id(self) -> int:
+        return 1
+
+    def begin(self) -> None:
+        pass
+
+    def handle_message(self, data) -> None:
+        self.count += 1
+
+    def process(self, action) -> None:
+        pass
+
+
+def _direct(controller: Controller) -> float:
+    dispatch = controller.dispatch
+    start = perf_counter()
+    for _ in range(FRAMES):
+        dispatch(MESSAGE)
+    return (perf_counter() - start) / FRAMES
+
+
+def _queued(controller: Controller) -> float:
+    put = controller.put_action
+    start = perf_counter()
+    for _ in range(FRAMES // ACTION_BATCH):
+        for _ in range(ACTION_BATCH):
+            put(MessageIn(MESSAGE))
+        controller.process_actions()
+    return (perf_counter() - start) / (FRAMES // ACTION_BATCH * ACTION_BATCH)
+
+
+def _end_to_end(config_file: Path, timing: bool = False) -> float:
+    sock, peer = socketpair(AF_UNIX, SOCK_DGRAM)
+    can_service = CanService(
+        RawCanTransport(sock=sock, rx_frames=ACTION_BATCH), max_batch=ACTION_BATCH
+    )
+    consumer = _Consumer()
+    controller = Controller([can_service, consumer], config_file)
+    if timing:
+        controller.enable_timing()
+    frame = CAN_FRAME.pack(0x5FF, len(MESSAGE), MESSAGE.ljust(8, b"\0"))
+    rounds = FRAMES // 10 // ACTION_BATCH
+    elapsed = 0.0
+    for _ in range(rounds):
+        for _ in range(ACTION_BATCH):
+            peer.send(frame)
+        start = perf_counter()
+        controller.process()
+        elapsed += perf_counter() - start
+    peer.close()
+    sock.close()
+    assert consumer.count == rounds * ACTION_BATCH
+    return elapsed / consumer.count
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = Path(tmp) / "config.json"
+        shutil.copyfile("pyvlcb/config.json", config_file)
+        controller = Controller([_Consumer()], config_file)
+        direct = _direct(controller)
+        queued = _queued(controller)
+        end_to_end = _end_to_end(config_file)
+        timed = _end_to_end(config_file, timing=True)
+    print(f"direct dispatch:       {direct * 1e6:6.2f} us/message")
+    print(f"queued, batch of {ACTION_BATCH}:   {queued * 1e6:6.2f} us/message")
+    print(f"  pipeline overhead:   {(queued - direct) * 1e6:6.2f} us/message")
+    print(f"socket to handler:     {end_to_end * 1e6:6.2f} us/frame")
+    print(f"  with timing:         {timed * 1e6:6.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Decode and encode rate of the VLCB message codec::
+
+    python -m benchmarks.bench_codec
+"""
+
+from timeit import repeat
+
+from pyvlcb import codec
+from pyvlcb.vlcbdefs import OPC_ACON, OPC_EVLRN
+
+ROUNDS = 100000
+
+
+def _rate(stmt: str, namespace: dict) -> float:
+    best = min(repeat(stmt, globals=namespace, number=ROUNDS, repeat=5))
+    return ROUNDS / best
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    frame = memoryview(bytearray(16))
+    codec.encode_into(frame, OPC_ACON, 0x0102, 0x0304, offset=8)
+    acon = frame[8:13]
+    evlrn = memoryview(codec.encode(OPC_EVLRN, 1, 2, 3, 4))
+    buffer = bytearray(8)
+    namespace = {
+        "codec": codec,
+        "acon": acon,
+        "evlrn": evlrn,
+        "buffer": buffer,
+        "OPC_ACON": OPC_ACON,
+        "acon_codec": codec.CODECS[OPC_ACON],
+    }
+    for name, stmt in (
+        ("decode ACON", "codec.decode(acon)"),
+        ("decode EVLRN", "codec.decode(evlrn)"),
+        ("decode ACON (codec)", "acon_codec.decode(acon)"),
+        ("encode_into ACON", "codec.encode_into(buffer, OPC_ACON, 1, 2)"),
+    ):
+        print(f"{name:>20}: {_rate(stmt, namespace):12.0f} /s")
+
+
+if __name__ == "__main__":
+    main()
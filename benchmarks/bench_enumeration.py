@@ -0,0 +1,73 @@
+"""
+CANID self enumeration on a busy bus.
+
+Simulates the replies of the other modules of a 100 node bus through a socket pair, so
+no CAN interface is needed, and measures the time the module spends handling them and
+selecting its CANID. On a real bus the collection window
+(:data:`~pyvlcb.services.can.ENUM_WINDOW`) is added on top of that::
+
+    python -m benchmarks.bench_enumeration
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from socket import AF_UNIX, SOCK_DGRAM, socketpair
+from time import perf_counter
+
+from pyvlcb.modules.controller import Controller
+from pyvlcb.services.can import CanService, lowest_free_can_id
+from pyvlcb.transports.rawcan import CAN_FRAME, RawCanTransport
+from pyvlcb.transports.scheduler import MAX_FRAME_BITS
+
+NODES = 100
+ROUNDS = 200
+BITRATE = 125000
+# worst case length in bits of an empty frame
+EMPTY_FRAME_BITS = MAX_FRAME_BITS - 64
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = Path(tmp) / "config.json"
+        shutil.copyfile("pyvlcb/config.json", config_file)
+        sock, peer = socketpair(AF_UNIX, SOCK_DGRAM)
+        can_service = CanService(
+            RawCanTransport(sock=sock, rx_frames=NODES),
+            max_batch=NODES,
+            enum_window=0.0,
+        )
+        controller = Controller([can_service], config_file)
+        # the other modules take every CANID but the last ones
+        replies = [
+            CAN_FRAME.pack(0x580 | (1 + i % 98), 0, bytes(8)) for i in range(NODES - 1)
+        ]
+        handling = 0.0
+        for _ in range(ROUNDS):
+            can_service.start_enumeration()
+            peer.recv(64)
+            for reply in replies:
+                peer.send(reply)
+            start = perf_counter()
+            can_service._check_incoming_messages()  # pylint: disable=W0212
+            controller._run_timers()  # pylint: disable=W0212
+            handling += perf_counter() - start
+        responders = sum(1 << can_id for can_id in range(1, 99))
+        start = perf_counter()
+        for _ in range(ROUNDS):
+            lowest_free_can_id(responders)
+        selection = (perf_counter() - start) / ROUNDS
+        peer.close()
+        sock.close()
+    bus_time = NODES * EMPTY_FRAME_BITS / BITRATE
+    print(f"{NODES} node bus, CANID {controller.can_id} selected")
+    print(f"  replies on the bus:  {bus_time * 1000:7.2f} ms at {BITRATE} bit/s")
+    print(f"  reply handling:      {handling / ROUNDS * 1000:7.3f} ms")
+    print(f"  CANID selection:     {selection * 1e6:7.2f} us (worst case scan)")
+
+
+if __name__ == "__main__":
+    main()
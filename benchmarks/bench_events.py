@@ -0,0 +1,73 @@
+"""
+Memory used by an event table in the old and new representations::
+
+    python -m benchmarks.bench_events
+"""
+
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from pyvlcb.modules.storage import Event, MemoryStorage
+
+EVENTS = 10000
+EVENT_VARS = 4
+
+
+@dataclass
+class _ListEvent:
+    """The former representation: a dict backed dataclass with a list of ints."""
+
+    node_number: int
+    event_number: int
+    event_vars: List[int]
+
+
+def _old_table() -> Dict[str, Any]:
+    # the former in-memory document, plus one event object per read
+    document = {
+        f"EVT{i:03d}": {
+            "NODE_NUMBER": i >> 8,
+            "EVENT_NUMBER": i,
+            "EVENT_VARS": [(i + j) & 0xFF for j in range(EVENT_VARS)],
+        }
+        for i in range(EVENTS)
+    }
+    events = [
+        _ListEvent(data["NODE_NUMBER"], data["EVENT_NUMBER"], data["EVENT_VARS"])
+        for data in document.values()
+    ]
+    return {"document": document, "events": events}
+
+
+def _new_table() -> MemoryStorage:
+    storage = MemoryStorage()
+    for i in range(EVENTS):
+        storage.write_event(
+            i, Event(i >> 8, i, bytes((i + j) & 0xFF for j in range(EVENT_VARS)))
+        )
+    return storage
+
+
+def _measure(build: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    table = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del table
+    return size
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    old = _measure(_old_table)
+    new = _measure(_new_table)
+    print(f"{EVENTS} events with {EVENT_VARS} event variables")
+    print(f"  dict + list dataclass: {old / EVENTS:6.0f} bytes/event")
+    print(f"  slotted bytes Event:   {new / EVENTS:6.0f} bytes/event (indexed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Receive latency: time from a frame being sent on a virtual bus to its handler running,
+with the RX queue and the controller loop, and in direct-dispatch mode::
+
+    python -m benchmarks.bench_latency
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from statistics import median, quantiles
+from threading import Thread
+from time import perf_counter, sleep
+from typing import List
+
+from can import Message
+
+from pyvlcb.modules.controller import Controller
+from pyvlcb.services.can import CanService
+from pyvlcb.services.service import Service
+from pyvlcb.transports.can import CanTransportOverVirtual
+from pyvlcb.vlcbdefs import OPC_ACON
+
+FRAMES = 500
+#: Seconds between frames, so every frame finds the module idle.
+GAP = 0.001
+
+
+class _Consumer(Service):
+    """Records when each accessory event arrives."""
+
+    opcodes = (OPC_ACON,)
+    thread_safe = True
+
+    def __init__(self) -> None:
+        self.arrivals: List[float] = []
+
+    @property
+    def service_id(self) -> int:
+        return 0
+
+    @property
+    def service_version_id(self) -> int:
+        return 1
+
+    def begin(self) -> None:
+        pass
+
+    def handle_message(self, data) -> None:
+        self.arrivals.append(perf_counter())
+
+    def process(self, action) -> None:
+        pass
+
+
+def _measure(config_file: Path, direct: bool) -> List[float]:
+    transport = CanTransportOverVirtual(log_filename=None)
+    sender = CanTransportOverVirtual(log_filename=None)
+    consumer = _Consumer()
+    controller = Controller(
+        [CanService(transport, direct=direct), consumer], config_file
+    )
+    sent: List[float] = []
+
+    def send() -> None:
+        sleep(0.1)
+        for i in range(FRAMES):
+            msg = Message(
+                arbitration_id=0x5FF,
+                data=[OPC_ACON, 0, 1, i >> 8, i & 0xFF],
+                is_extended_id=False,
+            )
+            sent.append(perf_counter())
+            sender.send(msg)
+            sleep(GAP)
+        sleep(0.1)
+        controller.stop()
+
+    thread = Thread(target=send)
+    thread.start()
+    controller.run()
+    thread.join()
+    sender.shutdown()
+    transport.shutdown()
+    return [arrival - start for start, arrival in zip(sent, consumer.arrivals)]
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = Path(tmp) / "config.json"
+        shutil.copyfile("pyvlcb/config.json", config_file)
+        for name, direct in (("queued", False), ("direct", True)):
+            latencies = _measure(config_file, direct)
+            p99 = quantiles(latencies, n=100)[98]
+            print(
+                f"{name}: median {median(latencies) * 1e6:7.1f} us,"
+                f" p99 {p99 * 1e6:7.1f} us ({len(latencies)} frames)"
+            )
+
+
+if __name__ == "__main__":
+    main()
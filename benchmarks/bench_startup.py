@@ -0,0 +1,50 @@
+"""
+Cold start time of a module: imports plus controller construction.
+
+Every round runs in a fresh interpreter, as on boot::
+
+    python -m benchmarks.bench_startup
+"""
+
+import subprocess
+import sys
+from statistics import median
+
+ROUNDS = 10
+
+_STARTUP = """
+from time import perf_counter
+start = perf_counter()
+from pyvlcb.modules.controller import Controller
+from pyvlcb.services.can import CanService
+from pyvlcb.transports.rawcan import RawCanTransport
+imported = perf_counter()
+
+class Module(Controller):
+    pass
+
+Module([], "pyvlcb/config.json")
+print(imported - start, perf_counter() - imported)
+"""
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    imports, constructions = [], []
+    for _ in range(ROUNDS):
+        output = subprocess.run(
+            [sys.executable, "-c", _STARTUP],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        imports.append(float(output[0]))
+        constructions.append(float(output[1]))
+    print(f"imports:      {median(imports) * 1000:7.2f} ms (median of {ROUNDS})")
+    print(f"construction: {median(constructions) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Receive throughput of the CAN transports.
+
+Sends a stream of frames on a socketcan interface from a second thread and
+measures how fast each transport delivers them. Needs a (virtual) CAN interface::
+
+    sudo ./vcan.sh
+    python -m benchmarks.bench_transports vcan0
+"""
+
+import sys
+from socket import AF_CAN, CAN_RAW, SOCK_RAW, socket
+from threading import Thread
+from time import perf_counter, sleep
+
+from pyvlcb.transports.can import CanTransportOverSocketcan
+from pyvlcb.transports.rawcan import CAN_FRAME, RawCanTransport
+
+FRAMES = 20000
+BATCH = 64
+
+
+def _send_burst(channel: str, frames: int) -> None:
+    with socket(AF_CAN, SOCK_RAW, CAN_RAW) as sock:
+        sock.bind((channel,))
+        for i in range(frames):
+            while True:
+                try:
+                    sock.send(CAN_FRAME.pack(i & 0x7FF, 8, bytes(8)))
+                    break
+                except OSError:
+                    # TX queue full, let the receivers catch up
+                    sleep(0.0001)
+
+
+def _drain(transport) -> tuple[int, float]:
+    received = len(transport.recv_many(BATCH, 5.0))
+    start = last = perf_counter()
+    while True:
+        count = len(transport.recv_many(BATCH, 0.5))
+        if not count:
+            return received, last - start
+        received += count
+        last = perf_counter()
+
+
+def main(channel: str) -> None:
+    """
+    Run the benchmark on channel.
+    """
+    for name, factory in (
+        ("python-can", lambda: CanTransportOverSocketcan(channel)),
+        ("raw AF_CAN", lambda: RawCanTransport(channel, rx_frames=BATCH)),
+    ):
+        transport = factory()
+        sender = Thread(target=_send_burst, args=(channel, FRAMES))
+        sender.start()
+        received, elapsed = _drain(transport)
+        sender.join()
+        print(
+            f"{name:>12}: {received / elapsed:10.0f} frames/s, "
+            f"{FRAMES - received} dropped"
+        )
+        transport.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "vcan0")
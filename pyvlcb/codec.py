@@ -0,0 +1,236 @@
+"""
+VLCB message codec.
+
+The codec table is generated at import time from the ``OPC_*`` definitions in
+:mod:`pyvlcb.vlcbdefs`, so every defined op-code can be encoded and decoded. The length
+of a message is given by the top three bits of its op-code (number of data bytes).
+Messages starting with a node number and/or an event or device number decode those
+as 16 bit big endian fields (``nn``, ``en``, ``dn``), the remaining bytes as ``d1``,
+``d2``... A few op-codes have their own layout (see ``_LAYOUTS``).
+
+Decoding reads straight from any buffer (``bytes``, ``bytearray``, ``memoryview``) without
+copying it, encoding writes into a caller supplied buffer.
+"""
+
+from collections import namedtuple
+from struct import Struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from . import vlcbdefs
+
+# Event op-codes: node number, event number and data.
+_EVENT_OPCODES = frozenset(
+    (
+        "ACON",
+        "ACOF",
+        "AREQ",
+        "ARON",
+        "AROF",
+        "ASON",
+        "ASOF",
+        "ASRQ",
+        "ARSON",
+        "ARSOF",
+        "ACON1",
+        "ACOF1",
+        "ARON1",
+        "AROF1",
+        "ASON1",
+        "ASOF1",
+        "ARSON1",
+        "ARSOF1",
+        "ACON2",
+        "ACOF2",
+        "ARON2",
+        "AROF2",
+        "ASON2",
+        "ASOF2",
+        "ARSON2",
+        "ARSOF2",
+        "ACON3",
+        "ACOF3",
+        "ARON3",
+        "AROF3",
+        "ASON3",
+        "ASOF3",
+        "ARSON3",
+        "ARSOF3",
+        "EVULN",
+        "REQEV",
+        "EVLRN",
+        "EVANS",
+        "EVLRNI",
+    )
+)
+
+# Node op-codes: node number and data.
+_NODE_OPCODES = frozenset(
+    (
+        "SNN",
+        "NNRSM",
+        "RQNN",
+        "NNREL",
+        "NNACK",
+        "NNLRN",
+        "NNULN",
+        "NNCLR",
+        "NNEVN",
+        "NERD",
+        "RQEVN",
+        "WRACK",
+        "RQDAT",
+        "BOOT",
+        "ENUM",
+        "NNRST",
+        "CMDERR",
+        "EVNLF",
+        "NVRD",
+        "NENRD",
+        "RQNPN",
+        "NUMEV",
+        "CANID",
+        "MODE",
+        "RQSD",
+        "RDGN",
+        "NVSETRD",
+        "NVSET",
+        "NVANS",
+        "PARAN",
+        "REVAL",
+        "HEARTB",
+        "SD",
+        "GRSP",
+        "NEVAL",
+        "PNN",
+        "DGN",
+        "ESD",
+        "ACDAT",
+        "ARDAT",
+    )
+)
+
+# Device op-codes: device number and data.
+_DEVICE_OPCODES = frozenset(("DDES", "DDRS", "DDWS", "RQDDS"))
+
+# Op-codes with their own fields after the op-code.
+_LAYOUTS: Dict[str, List[Tuple[str, str]]] = {
+    # node number, then the event (node number and event number) and its index
+    "ENRSP": [("nn", "H"), ("event_nn", "H"), ("event_en", "H"), ("index", "B")],
+    # node number, then the acknowledged op-code and the event
+    "ENACK": [("nn", "H"), ("ack_opc", "B"), ("event_nn", "H"), ("event_en", "H")],
+}
+
+
+def message_length(opcode: int) -> int:
+    """
+    Length in bytes of a message, op-code included.
+    """
+    return (opcode >> 5) + 1
+
+
+class OpCodec:
+    """
+    Encoder and decoder of the messages of one op-code.
+    """
+
+    __slots__ = ("opcode", "name", "length", "struct", "message_type")
+
+    def __init__(self, opcode: int, name: str) -> None:
+        self.opcode = opcode
+        self.name = name
+        self.length = message_length(opcode)
+        fields: List[Tuple[str, str]] = [("opc", "B")]
+        if name in _LAYOUTS:
+            fields += _LAYOUTS[name]
+        elif name in _EVENT_OPCODES:
+            fields += [("nn", "H"), ("en", "H")]
+        elif name in _NODE_OPCODES:
+            fields.append(("nn", "H"))
+        elif name in _DEVICE_OPCODES:
+            fields.append(("dn", "H"))
+        size = Struct(">" + "".join(fmt for _, fmt in fields)).size
+        fields += [(f"d{i}", "B") for i in range(1, self.length - size + 1)]
+        self.struct = Struct(">" + "".join(fmt for _, fmt in fields))
+        self.message_type = namedtuple(name, [field for field, _ in fields])
+
+    def decode(self, data: Any) -> NamedTuple:
+        """
+        Decode a message of this op-code.
+        """
+        return self.message_type._make(self.struct.unpack_from(data))
+
+    def encode_into(self, buffer: Any, offset: int, *fields: int) -> int:
+        """
+        Encode a message of this op-code into buffer at offset.
+
+        Returns:
+            int: message length.
+        """
+        self.struct.pack_into(buffer, offset, self.opcode, *fields)
+        return self.length
+
+
+def _generate_codecs() -> List[Optional[OpCodec]]:
+    codecs: List[Optional[OpCodec]] = [None] * 256
+    for attr, opcode in vars(vlcbdefs).items():
+        if attr.startswith("OPC_"):
+            codecs[opcode] = OpCodec(opcode, attr[4:])
+    return codecs
+
+
+#: Codec of every op-code, indexed by op-code (None if undefined).
+CODECS: List[Optional[OpCodec]] = _generate_codecs()
+#: Codec of every op-code, indexed by mnemonic.
+CODECS_BY_NAME: Dict[str, OpCodec] = {
+    codec.name: codec for codec in CODECS if codec is not None
+}
+
+
+def _codec(opcode: int) -> OpCodec:
+    codec = CODECS[opcode]
+    if codec is None:
+        raise ValueError(f"unknown op-code 0x{opcode:02X}")
+    return codec
+
+
+def decode(data: Any) -> NamedTuple:
+    """
+    Decode a message.
+
+    Args:
+        data (bytes | bytearray | memoryview): the message, starting with the op-code.
+
+    Raises:
+        ValueError: unknown op-code or message too short.
+
+    Returns:
+        NamedTuple: the message fields, named after the op-code mnemonic.
+    """
+    codec = _codec(data[0])
+    if len(data) < codec.length:
+        raise ValueError(f"{codec.name} needs {codec.length} bytes")
+    return codec.message_type._make(codec.struct.unpack_from(data))
+
+
+def encode_into(buffer: Any, opcode: int, *fields: int, offset: int = 0) -> int:
+    """
+    Encode a message into a caller supplied buffer.
+
+    Args:
+        buffer (bytearray | memoryview): writable buffer.
+        opcode (int): the op-code.
+        fields (int): message fields after the op-code.
+        offset (int): position in buffer.
+
+    Returns:
+        int: message length.
+    """
+    return _codec(opcode).encode_into(buffer, offset, *fields)
+
+
+def encode(opcode: int, *fields: int) -> bytes:
+    """
+    Encode a message.
+    """
+    codec = _codec(opcode)
+    return codec.struct.pack(opcode, *fields)
@@ -1 +1,13 @@
-__all__ = ["config", "params", "controller"]
+__all__ = [
+    "config",
+    "eeprom",
+    "executor",
+    "journal",
+    "storage",
+    "params",
+    "responses",
+    "ring",
+    "sqlite",
+    "timing",
+    "controller",
+]
@@ -3,12 +3,18 @@ Main module.
 """
 
 from abc import ABC
+from contextlib import contextmanager
 from ctypes import LittleEndianStructure, Union, c_uint8
-from dataclasses import dataclass
 from enum import Enum
-from json import dump, load
 from os import PathLike
-from typing import Any, List
+from typing import Any, Dict, Iterator, Tuple
+
+from .storage import DEFAULT_SETTINGS, FLUSH_DELAY, Event, JsonStorage, Storage
+
+#: Heartbeat bit of the node flags.
+HEARTBEAT_FLAG = 0x01
+#: Event acknowledge bit of the node flags.
+EVENT_ACK_FLAG = 0x02
 
 
 class Mode(Enum):
@@ -48,195 +54,265 @@ class NodeFlags(Union):
     _fields_ = [("bit", NodeFlagsBits), ("as_byte", c_uint8)]
 
 
-@dataclass
-class Event:
-    """VLCB event."""
+class Settings:
+    """
+    Module settings, read once from the storage.
 
-    node_number: int
-    event_number: int
-    event_vars: List[int]
+    The attributes are plain values for the hot paths; they are changed through
+    :class:`Configuration`, which also saves them.
+    """
+
+    __slots__ = (
+        "manufacturer_id",
+        "module_id",
+        "module_name",
+        "version",
+        "mode",
+        "can_id",
+        "node_number",
+        "node_flags",
+        "reset_flag",
+    )
+
+    #: Storage key of each attribute.
+    KEYS = {
+        "manufacturer_id": "MANUFACTURER_ID",
+        "module_id": "MODULE_ID",
+        "module_name": "MODULE_NAME",
+        "version": "VERSION",
+        "mode": "MODE",
+        "can_id": "CAN_ID",
+        "node_number": "NODE_NUMBER",
+        "node_flags": "NODE_FLAGS",
+        "reset_flag": "RESET_FLAG",
+    }
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.manufacturer_id: int = 0
+        self.module_id: int = 0
+        self.module_name: str = ""
+        self.version: str = ""
+        self.mode: Mode = Mode.UNINITIALISED
+        self.can_id: int = 0
+        self.node_number: int = 0
+        self.node_flags: int = 0
+        self.reset_flag: int = 0
+        for attr, key in self.KEYS.items():
+            setattr(self, attr, settings.get(key, DEFAULT_SETTINGS[key]))
+        self.mode = Mode(self.mode)
 
 
 class Configuration(ABC):
     """
     Abstract Configuration class.
+
+    The configuration is kept by a :class:`~pyvlcb.modules.storage.Storage`. Given a
+    file name, it is a :class:`~pyvlcb.modules.storage.JsonStorage`: every change is
+    saved to the file at once, unless write_behind is set; then changes only mark the
+    configuration dirty and are saved by :meth:`flush` (called by :meth:`flush_if_due`
+    once no change happened for flush_delay seconds).
     """
 
-    def __init__(self, filename: str | PathLike) -> None:
-        self._nonvolatile_filename: str | PathLike = filename
-        self._nonvolatile_mem: dict[str, dict[str, Any]] = self._load_nonvolatile_mem()
+    def __init__(
+        self,
+        filename: str | PathLike | Storage,
+        write_behind: bool = False,
+        flush_delay: float = FLUSH_DELAY,
+    ) -> None:
+        if isinstance(filename, Storage):
+            self._storage = filename
+        else:
+            self._storage = JsonStorage(filename, write_behind, flush_delay)
+        self._settings = Settings(self._storage.settings())
+        self._generation = 0
         if self.mode == Mode.UNINITIALISED and self.node_number == 0xFFFF:
             # factory virgin state
-            self.clear_all_node_vars()
-            self.clear_all_events()
-            self.set_mode(Mode.UNINITIALISED)
-            self.can_id = 0
-            # pylint: disable=W0201
-            self.node_flags.as_byte = 0
+            with self.batch():
+                self.clear_all_node_vars()
+                self.clear_all_events()
+                self.set_mode(Mode.UNINITIALISED)
+                self.can_id = 0
+                self.node_flags = NodeFlags()
+
+    @property
+    def storage(self) -> Storage:
+        """The storage backend."""
+        return self._storage
+
+    @property
+    def dirty(self) -> bool:
+        """There are changes not saved yet."""
+        return self._storage.dirty
+
+    def flush(self) -> None:
+        """Save pending changes."""
+        self._storage.flush()
+
+    def flush_if_due(self) -> bool:
+        """Save pending changes if they are older than the flush delay."""
+        return self._storage.flush_if_due()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group changes so they are saved once, when the outermost batch ends."""
+        with self._storage.batch():
+            yield
+
+    def close(self) -> None:
+        """Save pending changes and release the storage."""
+        self._storage.close()
 
-    def _load_nonvolatile_mem(self) -> dict[str, dict[str, Any]]:
-        with open(self._nonvolatile_filename, "rt", encoding="utf-8") as file:
-            return load(file)
+    @property
+    def settings(self) -> Settings:
+        """The module settings, to read them on hot paths."""
+        return self._settings
+
+    def read_setting(self, key: str) -> Any:
+        """Read a setting, e.g. ``MODULE_NAME``."""
+        return self._storage.read_setting(key)
+
+    @property
+    def generation(self) -> int:
+        """Incremented on every change of the settings."""
+        return self._generation
 
-    def _save_nonvolatile_mem(self) -> None:
-        with open(self._nonvolatile_filename, "wt", encoding="utf-8") as file:
-            dump(self._nonvolatile_mem, file, indent=4)
+    def _write_setting(self, attr: str, value: Any) -> None:
+        setattr(self._settings, attr, value)
+        self._generation += 1
+        if isinstance(value, Mode):
+            value = value.value
+        self._storage.write_setting(Settings.KEYS[attr], value)
 
     @property
     def mode(self) -> Mode:
         """Current operating mode."""
-        return Mode(self._nonvolatile_mem["settings"]["MODE"])
+        return self._settings.mode
 
     def set_mode(self, mode: Mode, node_number: int = 0) -> None:
         """Set module mode."""
-        self._nonvolatile_mem["settings"]["MODE"] = mode.value
-        if mode == Mode.UNINITIALISED:
-            self.node_number = 0
-        elif mode == Mode.NORMAL:
-            self.node_number = node_number
-        self._save_nonvolatile_mem()
+        with self._storage.batch():
+            self._write_setting("mode", mode)
+            if mode == Mode.UNINITIALISED:
+                self.node_number = 0
+            elif mode == Mode.NORMAL:
+                self.node_number = node_number
 
     @property
     def can_id(self) -> int:
         """CAN identifier."""
-        return self._nonvolatile_mem["settings"]["CAN_ID"]
+        return self._settings.can_id
 
     @can_id.setter
     def can_id(self, can_id: int):
-        self._nonvolatile_mem["settings"]["CAN_ID"] = can_id
-        self._save_nonvolatile_mem()
+        self._write_setting("can_id", can_id)
 
     @property
     def node_number(self) -> int:
         """Node number."""
-        return self._nonvolatile_mem["settings"]["NODE_NUMBER"]
+        return self._settings.node_number
 
     @node_number.setter
     def node_number(self, node_number: int):
-        self._nonvolatile_mem["settings"]["NODE_NUMBER"] = node_number
-        self._save_nonvolatile_mem()
+        self._write_setting("node_number", node_number)
 
     @property
     def node_flags(self) -> NodeFlags:
-        """Node flags."""
+        """Node flags, a copy: assign it back to change them."""
         flags = NodeFlags()
         # pylint: disable=W0201
-        flags.as_byte = self._nonvolatile_mem["settings"]["NODE_FLAGS"]
+        flags.as_byte = self._settings.node_flags
         return flags
 
     @node_flags.setter
     def node_flags(self, flags: NodeFlags):
-        self._nonvolatile_mem["settings"]["NODE_FLAGS"] = flags.value
-        self._save_nonvolatile_mem()
+        self._write_setting("node_flags", flags.as_byte)
+
+    def _set_node_flag(self, flag: int, on: bool) -> None:
+        flags = self._settings.node_flags
+        self._write_setting("node_flags", flags | flag if on else flags & ~flag)
 
     @property
     def heartbeat(self) -> bool:
         """Heartbeat."""
-        return bool(self.node_flags.heartbeat)
+        return bool(self._settings.node_flags & HEARTBEAT_FLAG)
 
     @heartbeat.setter
     def heartbeat(self, on: bool) -> None:
         # pylint: disable=C0103
         """Heartbeat."""
-        self.node_flags.heartbeat = int(on)
+        self._set_node_flag(HEARTBEAT_FLAG, on)
 
     @property
     def event_ack(self) -> bool:
         """Event acknolwdege."""
-        return bool(self.node_flags.event_ack)
+        return bool(self._settings.node_flags & EVENT_ACK_FLAG)
 
     @event_ack.setter
     def event_ack(self, on: bool) -> None:
         # pylint: disable=C0103
-        self.node_flags.heartbeat = int(on)
-
-    def _event_key(self, idx: int) -> str:
-        # pylint: disable=R0201
-        return f"EVT{idx:03d}"
+        self._set_node_flag(EVENT_ACK_FLAG, on)
 
     @property
     def num_events(self) -> int:
         """Number of events."""
-        return len(self._nonvolatile_mem["events"])
+        return self._storage.num_events
 
     def read_event(self, idx: int) -> Event | None:
         """Read a stored event."""
-        try:
-            evt_key = self._event_key(idx)
-            data = self._nonvolatile_mem["events"][evt_key]
-            evt = Event(data["NODE_NUMBER"], data["EVENT_NUMBER"], data["EVENT_VARS"])
-            return evt
-        except KeyError:
-            return None
+        return self._storage.read_event(idx)
 
     def write_event(self, idx, event: Event) -> None:
         """Write an event."""
-        evt_key = self._event_key(idx)
-        if evt_key not in self._nonvolatile_mem["events"]:
-            self._nonvolatile_mem["events"][evt_key] = {}
-        self._nonvolatile_mem["events"][evt_key]["NODE_NUMBER"] = event.node_number
-        self._nonvolatile_mem["events"][evt_key]["EVENT_NUMBER"] = event.event_number
-        self._nonvolatile_mem["events"][evt_key]["EVENT_VARS"] = event.event_vars
-        self._save_nonvolatile_mem()
+        self._storage.write_event(idx, event)
 
     def clear_event(self, idx: int) -> None:
         """Clear an event."""
-        evt_key = self._event_key(idx)
-        try:
-            del self._nonvolatile_mem["events"][evt_key]
-            self._save_nonvolatile_mem()
-        except KeyError:
-            pass
+        self._storage.clear_event(idx)
 
     def find_event(self, node_number: int, event_number: int) -> Event | None:
         """Locate an event by contents."""
-        for evt in self._nonvolatile_mem["events"].values():
-            if (
-                evt["NODE_NUMBER"] == node_number
-                and evt["EVENT_NUMBER"] == event_number
-            ):
-                return Event(evt["NODE_NUMBER"], evt["EVENT_NUMBER"], evt["EVENT_VARS"])
-        return None
+        idx = self._storage.find_event_index(node_number, event_number)
+        if idx is None:
+            return None
+        return self._storage.read_event(idx)
+
+    def find_event_index(self, node_number: int, event_number: int) -> int | None:
+        """Index of an event, located by contents."""
+        return self._storage.find_event_index(node_number, event_number)
+
+    def find_short_event(self, device_number: int) -> Event | None:
+        """Locate a short event (stored with node number 0) by device number."""
+        return self.find_event(0, device_number)
+
+    def node_event_indexes(self, node_number: int) -> Dict[int, int]:
+        """Indexes of the events of a node, keyed by event number."""
+        return self._storage.node_event_indexes(node_number)
+
+    def iter_events(self) -> Iterator[Tuple[int, Event]]:
+        """Stored events and their indexes, e.g. to answer NERD."""
+        return self._storage.iter_events()
 
     def clear_all_events(self):
         """Clear all event data."""
-        self._nonvolatile_mem["events"] = {}
-        self._save_nonvolatile_mem()
-
-    def _node_var_key(self, idx: int) -> str:
-        # pylint: disable=R0201
-        return f"NV{idx:03d}"
+        self._storage.clear_all_events()
 
     @property
     def num_node_vars(self) -> int:
         """Number of node_vars."""
-        return len(self._nonvolatile_mem["node_vars"])
+        return self._storage.num_node_vars
 
     def read_node_var(self, idx: int) -> int | None:
         """Read a stored node variable."""
-        try:
-            nv_key = self._node_var_key(idx)
-            data = self._nonvolatile_mem["node_vars"][nv_key]
-            return int(data)
-        except KeyError:
-            return None
+        return self._storage.read_node_var(idx)
 
     def write_node_var(self, idx: int, val: int) -> None:
         """Write a node variable."""
-        nv_key = self._node_var_key(idx)
-        self._nonvolatile_mem["node_vars"][nv_key] = val
-        self._save_nonvolatile_mem()
+        self._storage.write_node_var(idx, val)
 
     def clear_node_var(self, idx: int) -> None:
         """Clear a node variable."""
-        nv_key = self._node_var_key(idx)
-        try:
-            del self._nonvolatile_mem["node_vars"][nv_key]
-            self._save_nonvolatile_mem()
-        except KeyError:
-            pass
+        self._storage.clear_node_var(idx)
 
     def clear_all_node_vars(self):
         """Clear all node vars data."""
-        self._nonvolatile_mem["node_vars"] = {}
-        self._save_nonvolatile_mem()
+        self._storage.clear_all_node_vars()
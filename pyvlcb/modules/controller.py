@@ -2,30 +2,144 @@
 TODO
 """
 
-from abc import ABC, abstractmethod
-from typing import List, Sequence
+from abc import ABC
+from heapq import heappop, heappush
+from functools import partial
+from itertools import count
+from os import close, pipe, read, set_blocking, write
+from selectors import EVENT_READ, BaseSelector, DefaultSelector
+from threading import Lock, get_ident
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 from os import PathLike
-from json import load
-from pyvlcb.services.service import Service
-from .config import Configuration
+from time import monotonic, perf_counter_ns
+from pyvlcb.services.service import (
+    Action,
+    ExecutionPolicy,
+    HandlerResult,
+    MessageIn,
+    ModeChange,
+    Service,
+    TimerExpired,
+)
+from .config import FLUSH_DELAY, Configuration, Mode
+from .ring import DEFAULT_CAPACITY, ActionRing
+from .storage import Storage
+from .timing import Histogram, ProfileCapture
+
+if TYPE_CHECKING:
+    from asyncio import Event, Task
+
+    from .executor import HandlerPool
+
+#: Maximum number of queued actions handled by a single :meth:`Controller.process_actions`.
+ACTION_BATCH = 64
+
+
+def _check_picklable_execute(service: Service) -> None:
+    # the process pool pickles execute with each message: a bound method takes the
+    # service, its controller and their locks along, lambdas and local functions
+    # cannot be pickled at all
+    # pylint: disable=import-outside-toplevel
+    from pickle import PicklingError, dumps
+
+    try:
+        dumps(service.execute)
+    except (PicklingError, TypeError, AttributeError) as exc:
+        raise ValueError(
+            f"{type(service).__name__}.execute cannot be pickled for the process pool, "
+            "make it a staticmethod or a module-level function"
+        ) from exc
 
 
 class Controller(ABC):
     """
     Abstract Controller class.
+
+    With write_behind, configuration changes are saved from a controller timer once
+    they paused for flush_delay seconds, and when :meth:`run` or :meth:`run_async`
+    ends.
+
+    Services pass actions to each other with :meth:`put_action`; they are queued in a
+    bounded ring of action_capacity actions and handled in batches after the services
+    are polled.
+
+    :meth:`enable_timing` and :meth:`profile` instrument the ticks; until then the
+    loops run without measuring anything.
+
+    Messages whose :class:`~pyvlcb.services.service.ExecutionPolicy` is a pool are
+    executed on a thread pool of thread_workers or a process pool of process_workers
+    (default sizes with None), created when first needed, and their results come back
+    as :class:`~pyvlcb.services.service.HandlerResult` actions. Services using the
+    process pool must make :meth:`~pyvlcb.services.service.Service.execute` a
+    staticmethod or a module-level function: ValueError is raised when it cannot be
+    pickled.
     """
 
+    # pylint: disable=too-many-arguments
     def __init__(
-        self, services: Sequence[Service], config_file: str | PathLike
+        self,
+        services: Sequence[Service],
+        config_file: str | PathLike | Storage,
+        write_behind: bool = False,
+        flush_delay: float = FLUSH_DELAY,
+        action_capacity: int = DEFAULT_CAPACITY,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
     ) -> None:
         self._services: Sequence[Service] = services
-        self._config = Configuration(config_file)
-        with open(config_file, "rt", encoding="utf-8") as file:
-            settings = load(file)["settings"]
-        self._name = settings["MODULE_NAME"]
-        self._manufacturer = settings["MANUFACTURER_ID"]
-        self._module_id = settings["MODULE_ID"]
-        self._version = settings["VERSION"]
+        for service in services:
+            service.set_controller(self)
+        self._config = Configuration(config_file, write_behind, flush_delay)
+        settings = self._config.settings
+        self._name = settings.module_name
+        self._manufacturer = settings.manufacturer_id
+        self._module_id = settings.module_id
+        self._version = settings.version
+        self._actions = ActionRing(action_capacity)
+        # actions put from other threads, serialized by the lock: the rings only take
+        # one producer
+        self._remote_actions = ActionRing(action_capacity)
+        self._remote_lock = Lock()
+        self._owner = get_ident()
+        self._timers: List[Tuple[float, int, float, Optional[Callable[[], None]]]] = []
+        self._timer_ids = count()
+        self._cancelled_timers: Set[int] = set()
+        self._running = False
+        self._stop_event: Optional["Event"] = None
+        self._selector: Optional[BaseSelector] = None
+        self._wakeup_fd: Optional[int] = None
+        self._timing: Optional[Dict[Service, Histogram]] = None
+        self._budget_ns = 0
+        self._capture: Optional[ProfileCapture] = None
+        self._tick: Callable[[], None] = self._plain_tick
+        self._header_ids: Optional[Tuple[int, ...]] = None
+        self._async_wakeup: Optional[Callable[[], Any]] = None
+        self._workers = {
+            ExecutionPolicy.THREAD: thread_workers,
+            ExecutionPolicy.PROCESS: process_workers,
+        }
+        self._pools: Dict[ExecutionPolicy, "HandlerPool"] = {}
+        self._dispatch_table = self._build_dispatch_table(services)
+        self._safe_table = self._build_dispatch_table(
+            [service for service in services if service.thread_safe]
+        )
+        self._unsafe_table = self._build_dispatch_table(
+            [service for service in services if not service.thread_safe]
+        )
+        self._pooled_table = self._build_pooled_table(services)
+        self._unhandled_counts = [0] * 256
+        if write_behind:
+            self.add_timer(flush_delay, self._config.flush_if_due)
 
     @property
     def name(self) -> str:
@@ -55,6 +169,13 @@ class Controller(ABC):
         """
         return self._version
 
+    @property
+    def config(self) -> Configuration:
+        """
+        The module configuration.
+        """
+        return self._config
+
     @property
     def can_id(self) -> int:
         """
@@ -65,6 +186,18 @@ class Controller(ABC):
     @can_id.setter
     def can_id(self, can_id: int) -> None:
         self._config.can_id = can_id
+        self._header_ids = None
+
+    @property
+    def header_ids(self) -> Tuple[int, ...]:
+        """
+        Standard CAN arbitration IDs of this module, indexed by priority class
+        (major priority << 2 | minor priority). Rebuilt when the CANID changes.
+        """
+        if self._header_ids is None:
+            can_id = self._config.settings.can_id & 0x7F
+            self._header_ids = tuple((priority << 7) | can_id for priority in range(16))
+        return self._header_ids
 
     @property
     def services(self) -> Sequence[Service]:
@@ -72,3 +205,566 @@ class Controller(ABC):
         The services that the module implements.
         """
         return self._services
+
+    @staticmethod
+    def _build_dispatch_table(
+        services: Sequence[Service],
+    ) -> List[Tuple[Service, ...]]:
+        table: List[List[Service]] = [[] for _ in range(256)]
+        for service in services:
+            for opcode in service.opcodes:
+                policy = service.opcode_execution.get(opcode, service.execution)
+                if policy is ExecutionPolicy.INLINE:
+                    table[opcode].append(service)
+        return [tuple(handlers) for handlers in table]
+
+    @staticmethod
+    def _build_pooled_table(
+        services: Sequence[Service],
+    ) -> List[Tuple[Tuple[Service, ExecutionPolicy], ...]]:
+        table: List[List[Tuple[Service, ExecutionPolicy]]] = [[] for _ in range(256)]
+        for service in services:
+            checked = False
+            for opcode in service.opcodes:
+                policy = service.opcode_execution.get(opcode, service.execution)
+                if policy is ExecutionPolicy.PROCESS and not checked:
+                    _check_picklable_execute(service)
+                    checked = True
+                if policy is not ExecutionPolicy.INLINE:
+                    table[opcode].append((service, policy))
+        return [tuple(handlers) for handlers in table]
+
+    def _pool(self, policy: ExecutionPolicy) -> "HandlerPool":
+        pool = self._pools.get(policy)
+        if pool is None:
+            # the pools are only loaded by modules using them
+            # pylint: disable=import-outside-toplevel
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            from .executor import HandlerPool
+
+            workers = self._workers[policy]
+            if policy is ExecutionPolicy.THREAD:
+                executor = ThreadPoolExecutor(workers, thread_name_prefix="vlcb")
+            else:
+                executor = ProcessPoolExecutor(workers)
+            pool = self._pools[policy] = HandlerPool(executor, self.wakeup)
+        return pool
+
+    def _submit(
+        self,
+        pooled: Tuple[Tuple[Service, ExecutionPolicy], ...],
+        data: bytes | bytearray | memoryview,
+    ) -> None:
+        message = bytes(data)
+        for service, policy in pooled:
+            self._pool(policy).submit(service, message)
+
+    @property
+    def queue_depths(self) -> Dict[ExecutionPolicy, int]:
+        """
+        Work waiting per execution policy: queued actions for
+        :attr:`~pyvlcb.services.service.ExecutionPolicy.INLINE`, messages submitted
+        and not executed yet for the pools in use.
+        """
+        depths = {ExecutionPolicy.INLINE: len(self._actions)}
+        for policy, pool in self._pools.items():
+            depths[policy] = pool.depth
+        return depths
+
+    def shutdown_pools(self, wait: bool = True) -> None:
+        """
+        Stop the handler pools, waiting for the submitted messages with wait. Results
+        not handled yet are dropped; the pools are created again when needed.
+        """
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait)
+
+    @property
+    def actions(self) -> ActionRing:
+        """
+        The queue of actions waiting to be handled, filled by the controller thread.
+        """
+        return self._actions
+
+    def put_action(self, action: Action) -> bool:
+        """
+        Queue an action for the services. May be called from any thread.
+
+        The controller thread (the one running :meth:`run` or :meth:`run_async`, or
+        the one that created the controller) puts straight into :attr:`actions`.
+        Other threads, e.g. thread-safe handlers in the direct receive mode of
+        :class:`~pyvlcb.services.can.CanService`, put into a second ring under a lock
+        and wake the controller up; :meth:`process_actions` moves those first.
+
+        Returns:
+            bool: False if the queue is full and the action was dropped.
+        """
+        if get_ident() == self._owner:
+            return self._actions.put(action)
+        with self._remote_lock:
+            queued = self._remote_actions.put(action)
+        if queued:
+            self.wakeup()
+        return queued
+
+    def process_actions(self, max_count: int = ACTION_BATCH) -> int:
+        """
+        Handle a batch of queued actions: :class:`~pyvlcb.services.service.MessageIn`
+        are dispatched by op-code, :class:`~pyvlcb.services.service.HandlerResult`
+        go to the service that produced them, other actions are passed to every
+        service. Actions put from other threads and results of the handler pools are
+        queued first.
+
+        Returns:
+            int: number of actions handled.
+        """
+        remote = self._remote_actions
+        if remote:
+            for action in remote.drain(self._actions.free):
+                self._actions.put(action)
+        for pool in self._pools.values():
+            if pool.results:
+                pool.move_results(self._actions)
+        batch = self._actions.drain(max_count)
+        if self._timing is not None:
+            self._timed_actions(batch, self._timing)
+            return len(batch)
+        dispatch = self.dispatch
+        services = self._services
+        # pylint: disable=unidiomatic-typecheck
+        for action in batch:
+            kind = type(action)
+            if kind is MessageIn:
+                dispatch(action.data)  # type: ignore[attr-defined]
+            elif kind is HandlerResult:
+                action.service.handle_result(action)  # type: ignore[attr-defined]
+            else:
+                for service in services:
+                    service.process(action)
+        return len(batch)
+
+    def set_mode(self, mode: Mode, node_number: int = 0) -> None:
+        """
+        Change the module mode and tell the services with a
+        :class:`~pyvlcb.services.service.ModeChange` action.
+        """
+        self._config.set_mode(mode, node_number)
+        self.put_action(ModeChange(mode))
+
+    @property
+    def unhandled_counts(self) -> List[int]:
+        """
+        Number of received messages no service handles, indexed by op-code.
+        """
+        return self._unhandled_counts
+
+    def handles(self, opcode: int) -> bool:
+        """
+        Tell whether a service handles an op-code, counting it as unhandled otherwise,
+        so receivers can drop such messages before copying them. May be called from
+        any thread.
+        """
+        if self._dispatch_table[opcode] or self._pooled_table[opcode]:
+            return True
+        self._unhandled_counts[opcode] += 1
+        return False
+
+    def dispatch(self, data: bytes | bytearray | memoryview) -> int:
+        """
+        Pass a received VLCB message to the services that handle its op-code, inline
+        or through their pool.
+
+        Args:
+            data (bytes | bytearray | memoryview): the message, starting with the op-code.
+
+        Returns:
+            int: number of services the message was passed to.
+        """
+        handlers = self._dispatch_table[data[0]]
+        pooled = self._pooled_table[data[0]]
+        if not handlers and not pooled:
+            self._unhandled_counts[data[0]] += 1
+            return 0
+        for service in handlers:
+            service.handle_message(data)
+        if pooled:
+            self._submit(pooled, data)
+        return len(handlers) + len(pooled)
+
+    def dispatch_direct(self, data: bytes) -> bool:
+        """
+        Pass a received VLCB message to the thread-safe services that handle its
+        op-code. May be called from any thread.
+
+        Returns:
+            bool: True if services that are not thread-safe or run on a pool handle it
+            too; the caller must get it to :meth:`dispatch_deferred` on the controller
+            thread.
+        """
+        opcode = data[0]
+        handlers = self._safe_table[opcode]
+        for service in handlers:
+            service.handle_message(data)
+        if self._unsafe_table[opcode] or self._pooled_table[opcode]:
+            return True
+        if not handlers:
+            self._unhandled_counts[opcode] += 1
+        return False
+
+    def dispatch_deferred(self, data: bytes) -> int:
+        """
+        Pass a message already given to :meth:`dispatch_direct` to the services that
+        are not thread-safe or run on a pool.
+
+        Returns:
+            int: number of services the message was passed to.
+        """
+        handlers = self._unsafe_table[data[0]]
+        pooled = self._pooled_table[data[0]]
+        for service in handlers:
+            service.handle_message(data)
+        if pooled:
+            self._submit(pooled, data)
+        return len(handlers) + len(pooled)
+
+    def add_timer(
+        self,
+        interval: float,
+        callback: Optional[Callable[[], None]] = None,
+        repeat: bool = True,
+    ) -> int:
+        """
+        Schedule a callback to be run from the controller loop.
+
+        Args:
+            interval (float): seconds until the callback is run.
+            callback (Callable[[], None] | None): function to be called, or None to
+                queue a :class:`~pyvlcb.services.service.TimerExpired` action instead.
+            repeat (bool): run the callback every interval seconds until cancelled.
+
+        Returns:
+            int: timer identifier for :meth:`cancel_timer`.
+        """
+        timer_id = next(self._timer_ids)
+        heappush(
+            self._timers,
+            (monotonic() + interval, timer_id, interval if repeat else 0.0, callback),
+        )
+        return timer_id
+
+    def cancel_timer(self, timer_id: int) -> None:
+        """
+        Cancel a timer created with :meth:`add_timer`.
+        """
+        if any(timer[1] == timer_id for timer in self._timers):
+            self._cancelled_timers.add(timer_id)
+
+    def _run_timers(self) -> Optional[float]:
+        """
+        Run expired timers.
+
+        Returns:
+            float | None: seconds until the next timer expires, None if there is none.
+        """
+        timers = self._timers
+        now = monotonic()
+        while timers and timers[0][0] <= now:
+            deadline, timer_id, interval, callback = heappop(timers)
+            if timer_id in self._cancelled_timers:
+                self._cancelled_timers.discard(timer_id)
+                continue
+            if interval > 0.0:
+                # missed expirations are skipped rather than run back to back
+                deadline += interval
+                if deadline <= now:
+                    deadline = now + interval
+                heappush(timers, (deadline, timer_id, interval, callback))
+            if callback is None:
+                self._actions.put(TimerExpired(timer_id))
+            else:
+                callback()
+        if not timers:
+            return None
+        return max(timers[0][0] - monotonic(), 0.0)
+
+    def begin(self) -> None:
+        """
+        Set up all services.
+        """
+        for service in self._services:
+            service.begin()
+
+    def process(self) -> None:
+        """
+        Run one tick of the controller: expired timers, every service, then a batch of
+        queued actions.
+        """
+        self._run_timers()
+        self._tick()
+
+    def enable_timing(self, budget: Optional[float] = None) -> None:
+        """
+        Time every :meth:`~pyvlcb.services.service.Service.process` and
+        :meth:`~pyvlcb.services.service.Service.handle_message` call, per service.
+
+        Args:
+            budget (float | None): log a warning when a call takes longer than this
+                many seconds, None never warns.
+        """
+        if self._timing is None:
+            self._timing = {service: Histogram() for service in self._services}
+        self._budget_ns = 0 if budget is None else int(budget * 1e9)
+        self._select_tick()
+
+    def disable_timing(self) -> None:
+        """
+        Stop timing the services and forget the histograms.
+        """
+        self._timing = None
+        self._select_tick()
+
+    @property
+    def timing(self) -> Dict[Service, Histogram]:
+        """
+        Durations of the calls of each service in nanoseconds, empty unless
+        :meth:`enable_timing` was called.
+        """
+        return {} if self._timing is None else self._timing
+
+    def profile(self, ticks: int, trace_memory: bool = False) -> ProfileCapture:
+        """
+        Run :mod:`cProfile`, and :mod:`tracemalloc` with trace_memory, during the next
+        ticks. A capture already running is stopped.
+
+        Returns:
+            ProfileCapture: the capture; its results are available once it is done.
+        """
+        if self._capture is not None:
+            self._capture.stop()
+        self._capture = ProfileCapture(ticks, trace_memory)
+        self._select_tick()
+        return self._capture
+
+    def _select_tick(self) -> None:
+        if self._timing is None and self._capture is None:
+            self._tick = self._plain_tick
+        else:
+            self._tick = self._instrumented_tick
+
+    def _plain_tick(self) -> None:
+        for service in self._services:
+            service.process(None)
+        self.process_actions()
+
+    def _instrumented_tick(self) -> None:
+        timing = self._timing
+        if timing is None:
+            self._plain_tick()
+        else:
+            for service in self._services:
+                start = perf_counter_ns()
+                service.process(None)
+                self._record(timing, service, perf_counter_ns() - start)
+            self.process_actions()
+        if self._capture is not None and self._capture.tick():
+            self._capture = None
+            self._select_tick()
+
+    def _timed_actions(
+        self, batch: List[Action], timing: Dict[Service, Histogram]
+    ) -> None:
+        table = self._dispatch_table
+        # pylint: disable=unidiomatic-typecheck
+        for action in batch:
+            if type(action) is MessageIn:
+                data = action.data  # type: ignore[attr-defined]
+                handlers = table[data[0]]
+                pooled = self._pooled_table[data[0]]
+                if not handlers and not pooled:
+                    self._unhandled_counts[data[0]] += 1
+                for service in handlers:
+                    start = perf_counter_ns()
+                    service.handle_message(data)
+                    self._record(timing, service, perf_counter_ns() - start)
+                if pooled:
+                    self._submit(pooled, data)
+            elif type(action) is HandlerResult:
+                service = action.service  # type: ignore[attr-defined]
+                start = perf_counter_ns()
+                service.handle_result(action)
+                self._record(timing, service, perf_counter_ns() - start)
+            else:
+                for service in self._services:
+                    start = perf_counter_ns()
+                    service.process(action)
+                    self._record(timing, service, perf_counter_ns() - start)
+
+    def _record(
+        self, timing: Dict[Service, Histogram], service: Service, elapsed: int
+    ) -> None:
+        timing[service].add(elapsed)
+        if self._budget_ns and elapsed > self._budget_ns:
+            # logging is only loaded once a budget is exceeded
+            # pylint: disable=import-outside-toplevel
+            from logging import getLogger
+
+            getLogger(__name__).warning(
+                "%s took %.3f ms, over the %.3f ms budget",
+                type(service).__name__,
+                elapsed / 1e6,
+                self._budget_ns / 1e6,
+            )
+
+    def stop(self) -> None:
+        """
+        Make :meth:`run` or :meth:`run_async` return after the current tick.
+        """
+        self._running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self.wakeup()
+
+    def wakeup(self) -> None:
+        """
+        Make :meth:`run` or :meth:`run_async` stop waiting and run a tick, e.g. after
+        an action was put from another thread. Does nothing outside them.
+        """
+        wakeup_fd = self._wakeup_fd
+        if wakeup_fd is not None:
+            try:
+                write(wakeup_fd, b"\0")
+            except (BlockingIOError, OSError):
+                # a wakeup is already pending or the loop just ended
+                pass
+        elif self._async_wakeup is not None:
+            try:
+                self._async_wakeup()
+            except RuntimeError:
+                # the event loop is closed
+                pass
+
+    @property
+    def running(self) -> bool:
+        """
+        :meth:`run` or :meth:`run_async` is looping.
+        """
+        return self._running
+
+    def unwatch(self, fileobj: Any) -> None:
+        """
+        Stop watching one of the :attr:`~pyvlcb.services.service.Service.fileobjs` of
+        a service in :meth:`run`, e.g. at end of file.
+        """
+        if self._selector is not None:
+            try:
+                self._selector.unregister(fileobj)
+            except (KeyError, ValueError):
+                pass
+
+    def run(self) -> None:
+        """
+        Run the controller until :meth:`stop` is called.
+
+        The loop blocks in a single selector on the
+        :attr:`~pyvlcb.services.service.Service.fileobjs` of every service, until one
+        is readable, a timer expires, actions are queued or :meth:`wakeup` is called.
+        Services with a :attr:`~pyvlcb.services.service.Service.poll_interval` bound
+        the wait instead.
+        """
+        polls = [
+            service.poll_interval
+            for service in self._services
+            if service.poll_interval is not None
+        ]
+        poll = min(polls) if polls else None
+        wakeup_r, wakeup_w = pipe()
+        set_blocking(wakeup_r, False)
+        set_blocking(wakeup_w, False)
+        selector = DefaultSelector()
+        selector.register(wakeup_r, EVENT_READ)
+        for service in self._services:
+            for fileobj in service.fileobjs:
+                selector.register(fileobj, EVENT_READ, service)
+        self._selector = selector
+        self._wakeup_fd = wakeup_w
+        self._owner = get_ident()
+        self._running = True
+        self.begin()
+        try:
+            while self._running:
+                timeout = self._run_timers()
+                if self._actions or self._remote_actions:
+                    timeout = 0.0
+                elif poll is not None and (timeout is None or timeout > poll):
+                    timeout = poll
+                for key, _ in selector.select(timeout):
+                    if key.data is None:
+                        read(wakeup_r, 64)
+                    else:
+                        key.data.on_readable(key.fileobj)
+                if not self._running:
+                    break
+                self._tick()
+        finally:
+            self._wakeup_fd = None
+            self._selector = None
+            selector.close()
+            close(wakeup_r)
+            close(wakeup_w)
+            self.shutdown_pools()
+            self._config.flush()
+
+    async def run_async(self) -> None:
+        """
+        Run the controller in the current asyncio event loop until :meth:`stop` is called.
+
+        The loop sleeps until a service reports work through
+        :meth:`~pyvlcb.services.service.Service.wait_ready` or a timer expires, so
+        there is no polling interval.
+        """
+        # pylint: disable=import-outside-toplevel
+        from asyncio import FIRST_COMPLETED, Event, get_running_loop, wait
+
+        loop = get_running_loop()
+        self._stop_event = Event()
+        self._owner = get_ident()
+        self._running = True
+        self.begin()
+        waiters: Dict["Task", Optional[Service]] = {
+            loop.create_task(service.wait_ready()): service
+            for service in self._services
+        }
+        waiters[loop.create_task(self._stop_event.wait())] = None
+        wake = Event()
+        wake_task = loop.create_task(wake.wait())
+        waiters[wake_task] = None
+        self._async_wakeup = partial(loop.call_soon_threadsafe, wake.set)
+        try:
+            while self._running:
+                timeout = self._run_timers()
+                if self._actions or self._remote_actions:
+                    timeout = 0.0
+                done, _ = await wait(
+                    waiters.keys(), timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                for task in done:
+                    service = waiters.pop(task)
+                    task.result()
+                    if service is not None:
+                        waiters[loop.create_task(service.wait_ready())] = service
+                    elif task is wake_task:
+                        wake.clear()
+                        wake_task = loop.create_task(wake.wait())
+                        waiters[wake_task] = None
+                if not self._running:
+                    break
+                self._tick()
+        finally:
+            for task in waiters:
+                task.cancel()
+            self._stop_event = None
+            self._async_wakeup = None
+            self.shutdown_pools()
+            self._config.flush()
@@ -0,0 +1,255 @@
+"""
+EEPROM style storage of the module configuration in a memory mapped file.
+
+Like the EEPROM of a VLCB module, the file has a fixed layout sized from the module
+parameters (number of events, event variables per event and node variables)::
+
+    header | settings | node variable slots | event slots
+
+Event N is slot N, its event variables are stored inline, so reading or writing an
+event or a node variable is a few byte operations on the mapped file; opening the file
+only scans the event slots to index them. Node and event variables are bytes.
+"""
+
+from mmap import mmap
+from os import PathLike
+from struct import Struct
+from typing import Any, Dict, Iterator, Tuple
+
+from .params import Params
+from .storage import DEFAULT_SETTINGS, Event, EventIndex, Storage
+
+#: First bytes of an EEPROM file.
+EEPROM_MAGIC = b"VLCBEEP1"
+
+_HEADER = Struct("<8sHBH")
+#: Layout of the settings: offset and format of each one.
+_SETTINGS: Dict[str, Tuple[int, Struct]] = {
+    "MODE": (0, Struct("<B")),
+    "CAN_ID": (1, Struct("<B")),
+    "NODE_NUMBER": (2, Struct("<H")),
+    "NODE_FLAGS": (4, Struct("<B")),
+    "RESET_FLAG": (5, Struct("<B")),
+    "MANUFACTURER_ID": (6, Struct("<B")),
+    "MODULE_ID": (7, Struct("<B")),
+    "MODULE_NAME": (8, Struct("16s")),
+    "VERSION": (24, Struct("8s")),
+}
+_SETTINGS_SIZE = 32
+# in use flag and value
+_NODE_VAR = Struct("<BB")
+# in use flag, node number, event number and number of event variables
+_EVENT = Struct("<BHHB")
+
+_SLOT_USED = 1
+
+
+class EepromStorage(Storage):
+    """
+    Configuration kept in fixed slots of a memory mapped file.
+
+    Changes are made in place; :meth:`flush` syncs the mapping to the file.
+    """
+
+    def __init__(
+        self,
+        filename: str | PathLike,
+        num_events: int,
+        num_event_vars: int,
+        num_node_vars: int,
+    ) -> None:
+        self._num_evts = num_events
+        self._num_evs = num_event_vars
+        self._num_nvs = num_node_vars
+        self._settings_offset = _HEADER.size
+        self._nvs_offset = self._settings_offset + _SETTINGS_SIZE
+        self._evts_offset = self._nvs_offset + _NODE_VAR.size * num_node_vars
+        self._event_size = _EVENT.size + num_event_vars
+        size = self._evts_offset + self._event_size * num_events
+        header = (EEPROM_MAGIC, num_events, num_event_vars, num_node_vars)
+        # pylint: disable=R1732
+        try:
+            self._file = open(filename, "r+b")
+        except FileNotFoundError:
+            self._file = open(filename, "w+b")
+        file_size = self._file.seek(0, 2)
+        if file_size == 0:
+            self._file.truncate(size)
+        self._mem = mmap(self._file.fileno(), size if file_size in (0, size) else 0)
+        if file_size == 0:
+            _HEADER.pack_into(self._mem, 0, *header)
+            for key, value in DEFAULT_SETTINGS.items():
+                self.write_setting(key, value)
+        elif file_size != size or _HEADER.unpack_from(self._mem) != header:
+            self._mem.close()
+            self._file.close()
+            raise ValueError(f"{filename} does not match the module parameters")
+        self._dirty = file_size == 0
+        self._event_index = EventIndex()
+        self._num_used_events = 0
+        for idx in range(num_events):
+            used, node_number, event_number, _ = _EVENT.unpack_from(
+                self._mem, self._event_offset(idx)
+            )
+            if used == _SLOT_USED:
+                self._event_index.add(idx, node_number, event_number)
+                self._num_used_events += 1
+        self._num_used_nvs = sum(
+            self._mem[self._nvs_offset + _NODE_VAR.size * idx] == _SLOT_USED
+            for idx in range(num_node_vars)
+        )
+
+    @classmethod
+    def from_params(cls, filename: str | PathLike, params: Params) -> "EepromStorage":
+        """Storage sized from the module parameters."""
+        return cls(filename, params.num_evts, params.num_evs, params.num_nvs)
+
+    def _event_offset(self, idx: int) -> int:
+        return self._evts_offset + self._event_size * idx
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> None:
+        if self._dirty:
+            self._mem.flush()
+            self._dirty = False
+
+    def flush_if_due(self) -> bool:
+        if not self._dirty:
+            return False
+        self.flush()
+        return True
+
+    def close(self) -> None:
+        if not self._mem.closed:
+            self.flush()
+            self._mem.close()
+        self._file.close()
+
+    def read_setting(self, key: str) -> Any:
+        offset, fmt = _SETTINGS[key]
+        value = fmt.unpack_from(self._mem, self._settings_offset + offset)[0]
+        if isinstance(value, bytes):
+            return value.rstrip(b"\0").decode()
+        return value
+
+    def write_setting(self, key: str, value: Any) -> None:
+        offset, fmt = _SETTINGS[key]
+        if isinstance(value, str):
+            value = value.encode()
+        if isinstance(value, bytes) and len(value) > fmt.size:
+            # struct would silently truncate it
+            raise ValueError(f"{key} is limited to {fmt.size} bytes")
+        fmt.pack_into(self._mem, self._settings_offset + offset, value)
+        self._dirty = True
+
+    def settings(self) -> Dict[str, Any]:
+        return {key: self.read_setting(key) for key in _SETTINGS}
+
+    @property
+    def num_events(self) -> int:
+        return self._num_used_events
+
+    def read_event(self, idx: int) -> Event | None:
+        if not 0 <= idx < self._num_evts:
+            return None
+        offset = self._event_offset(idx)
+        used, node_number, event_number, num_evs = _EVENT.unpack_from(self._mem, offset)
+        if used != _SLOT_USED:
+            return None
+        offset += _EVENT.size
+        return Event(node_number, event_number, self._mem[offset : offset + num_evs])
+
+    def write_event(self, idx: int, event: Event) -> None:
+        if not 0 <= idx < self._num_evts:
+            raise IndexError(f"event index {idx} out of range")
+        if len(event.event_vars) > self._num_evs:
+            raise ValueError(f"an event has up to {self._num_evs} event variables")
+        offset = self._event_offset(idx)
+        used, node_number, event_number, _ = _EVENT.unpack_from(self._mem, offset)
+        if used == _SLOT_USED:
+            self._event_index.remove(idx, node_number, event_number)
+        else:
+            self._num_used_events += 1
+        _EVENT.pack_into(
+            self._mem,
+            offset,
+            _SLOT_USED,
+            event.node_number,
+            event.event_number,
+            len(event.event_vars),
+        )
+        offset += _EVENT.size
+        self._mem[offset : offset + len(event.event_vars)] = event.event_vars
+        self._event_index.add(idx, event.node_number, event.event_number)
+        self._dirty = True
+
+    def clear_event(self, idx: int) -> None:
+        evt = self.read_event(idx)
+        if evt is None:
+            return
+        self._event_index.remove(idx, evt.node_number, evt.event_number)
+        self._mem[self._event_offset(idx)] = 0
+        self._num_used_events -= 1
+        self._dirty = True
+
+    def clear_all_events(self) -> None:
+        for idx in range(self._num_evts):
+            self._mem[self._event_offset(idx)] = 0
+        self._event_index.clear()
+        self._num_used_events = 0
+        self._dirty = True
+
+    def find_event_index(self, node_number: int, event_number: int) -> int | None:
+        return self._event_index.find(node_number, event_number)
+
+    def node_event_indexes(self, node_number: int) -> Dict[int, int]:
+        return self._event_index.node(node_number)
+
+    def iter_events(self) -> Iterator[Tuple[int, Event]]:
+        for idx in range(self._num_evts):
+            evt = self.read_event(idx)
+            if evt is not None:
+                yield idx, evt
+
+    @property
+    def num_node_vars(self) -> int:
+        return self._num_used_nvs
+
+    def read_node_var(self, idx: int) -> int | None:
+        if not 0 <= idx < self._num_nvs:
+            return None
+        used, val = _NODE_VAR.unpack_from(
+            self._mem, self._nvs_offset + _NODE_VAR.size * idx
+        )
+        return val if used == _SLOT_USED else None
+
+    def write_node_var(self, idx: int, val: int) -> None:
+        if not 0 <= idx < self._num_nvs:
+            raise IndexError(f"node variable index {idx} out of range")
+        offset = self._nvs_offset + _NODE_VAR.size * idx
+        if self._mem[offset] != _SLOT_USED:
+            self._num_used_nvs += 1
+        _NODE_VAR.pack_into(self._mem, offset, _SLOT_USED, val)
+        self._dirty = True
+
+    def clear_node_var(self, idx: int) -> None:
+        if self.read_node_var(idx) is None:
+            return
+        self._mem[self._nvs_offset + _NODE_VAR.size * idx] = 0
+        self._num_used_nvs -= 1
+        self._dirty = True
+
+    def clear_all_node_vars(self) -> None:
+        for idx in range(self._num_nvs):
+            self._mem[self._nvs_offset + _NODE_VAR.size * idx] = 0
+        self._num_used_nvs = 0
+        self._dirty = True
+
+    def iter_node_vars(self) -> Iterator[Tuple[int, int]]:
+        for idx in range(self._num_nvs):
+            val = self.read_node_var(idx)
+            if val is not None:
+                yield idx, val
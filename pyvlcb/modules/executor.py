@@ -0,0 +1,116 @@
+"""
+Pools running message handlers off the controller thread.
+
+A :class:`HandlerPool` submits :meth:`~pyvlcb.services.service.Service.execute` calls to
+a :mod:`concurrent.futures` executor. Messages about the same node number (bytes 1 and 2
+of the message, 0 when it has none) are executed one after the other in arrival order,
+messages about different nodes run in parallel. Outcomes are collected as
+:class:`~pyvlcb.services.service.HandlerResult` actions for the controller.
+"""
+
+from collections import deque
+from concurrent.futures import Executor, Future
+from functools import partial
+from threading import Condition
+from typing import Callable, Deque, Dict, Tuple
+
+from ..services.service import HandlerResult, Service
+from .ring import ActionRing
+
+
+def node_key(data: bytes) -> int:
+    """
+    Node number a message is about, the key of the per-node ordering.
+    """
+    return data[1] << 8 | data[2] if len(data) >= 3 else 0
+
+
+class HandlerPool:
+    """
+    Runs handlers on an executor, one message at a time per node number.
+
+    Args:
+        executor (Executor): the pool.
+        notify (Callable[[], None]): called from the pool when a result is ready.
+    """
+
+    def __init__(self, executor: Executor, notify: Callable[[], None]) -> None:
+        self._executor = executor
+        self._notify = notify
+        self._lock = Condition()
+        # node number -> messages waiting for the one being executed
+        self._waiting: Dict[int, Deque[Tuple[Service, bytes]]] = {}
+        self._depth = 0
+        self._results: Deque[HandlerResult] = deque()
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of messages submitted and not executed yet.
+        """
+        return self._depth
+
+    @property
+    def results(self) -> int:
+        """
+        Number of results waiting for the controller.
+        """
+        return len(self._results)
+
+    def submit(self, service: Service, data: bytes) -> None:
+        """
+        Execute a message with the execute method of service.
+        """
+        key = node_key(data)
+        with self._lock:
+            self._depth += 1
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.append((service, data))
+                return
+            self._waiting[key] = deque()
+        self._start(key, service, data)
+
+    def _start(self, key: int, service: Service, data: bytes) -> None:
+        try:
+            future = self._executor.submit(service.execute, data)
+        except RuntimeError as exc:
+            # the executor was shut down without waiting
+            future = Future()
+            future.set_exception(exc)
+        future.add_done_callback(partial(self._done, key, service, data))
+
+    def _done(self, key: int, service: Service, data: bytes, future: Future) -> None:
+        error = future.exception()
+        result = None if error is not None else future.result()
+        self._results.append(HandlerResult(service, data, result, error))
+        with self._lock:
+            self._depth -= 1
+            if not self._depth:
+                self._lock.notify_all()
+            waiting = self._waiting[key]
+            if waiting:
+                following = waiting.popleft()
+            else:
+                del self._waiting[key]
+                following = None
+        self._notify()
+        if following is not None:
+            self._start(key, *following)
+
+    def move_results(self, actions: ActionRing) -> None:
+        """
+        Queue the waiting results in actions, as long as it has room.
+        """
+        results = self._results
+        for _ in range(min(len(results), actions.free)):
+            actions.put(results.popleft())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the executor, waiting for the submitted messages with wait.
+        """
+        if wait:
+            with self._lock:
+                self._lock.wait_for(lambda: not self._depth)
+        self._executor.shutdown(wait)
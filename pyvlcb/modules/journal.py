@@ -0,0 +1,299 @@
+"""
+Append-only journal storage of the module configuration.
+
+Every change is appended to the journal as a small binary record instead of rewriting
+the whole configuration, which is cheap and kind to flash media. The journal is replayed
+when it is opened; once it grows past a threshold it is compacted, in a background
+thread, into a snapshot holding one record per setting, event and node variable.
+
+The file starts with :data:`JOURNAL_MAGIC`, followed by records framed as::
+
+    length (uint16) | crc32 (uint32) | op-code (uint8) | fields
+
+A torn or corrupted record at the end of the journal (e.g. after a power cut) is
+discarded when the journal is replayed.
+"""
+
+from contextlib import contextmanager
+from json import dumps, loads
+from os import PathLike, fsync, fspath, replace
+from struct import Struct
+from threading import Lock, Thread
+from typing import Any, BinaryIO, Iterator, List, Optional
+from zlib import crc32
+
+from .storage import Event, MemoryStorage
+
+#: First bytes of a journal file.
+JOURNAL_MAGIC = b"VLCBJRN1"
+#: Default journal size in bytes that triggers a compaction.
+COMPACT_SIZE = 64 * 1024
+
+#: Record op-codes.
+OP_SETTING = 1
+OP_EVENT = 2
+OP_CLEAR_EVENT = 3
+OP_CLEAR_EVENTS = 4
+OP_NODE_VAR = 5
+OP_CLEAR_NODE_VAR = 6
+OP_CLEAR_NODE_VARS = 7
+
+_FRAME = Struct("<HI")
+_OP = Struct("<B")
+_SETTING = Struct("<BB")
+_EVENT = Struct("<BHHH")
+_INDEX = Struct("<BH")
+_NODE_VAR = Struct("<BHi")
+
+
+def _setting_record(key: str, value: Any) -> bytes:
+    name = key.encode()
+    return _SETTING.pack(OP_SETTING, len(name)) + name + dumps(value).encode()
+
+
+def _event_record(idx: int, event: Event) -> bytes:
+    return (
+        _EVENT.pack(OP_EVENT, idx, event.node_number, event.event_number)
+        + event.event_vars
+    )
+
+
+def _frame(payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload), crc32(payload)) + payload
+
+
+class JournalStorage(MemoryStorage):
+    """
+    Configuration saved as an append-only journal.
+
+    Records are handed to the operating system as soon as they are appended, and
+    synced to the media by :meth:`flush`, or after every change when sync is set.
+    Changes made within :meth:`batch` are appended with a single write.
+    """
+
+    def __init__(
+        self,
+        filename: str | PathLike,
+        compact_size: int = COMPACT_SIZE,
+        sync: bool = False,
+    ) -> None:
+        super().__init__()
+        self._filename = fspath(filename)
+        self._compact_size = compact_size
+        self._sync = sync
+        self._lock = Lock()
+        self._batch: Optional[bytearray] = None
+        self._pending: Optional[List[bytes]] = None
+        self._compaction: Optional[Thread] = None
+        self._dirty = False
+        self._size = self._replay()
+        # size after the last compaction, the journal is compacted when it doubles
+        self._base_size = self._size
+        self._file: BinaryIO = open(self._filename, "ab")  # pylint: disable=R1732
+        if self._size == 0:
+            self._file.write(JOURNAL_MAGIC)
+            self._file.flush()
+            self._size = len(JOURNAL_MAGIC)
+
+    @property
+    def size(self) -> int:
+        """Size in bytes of the journal."""
+        return self._size
+
+    def _replay(self) -> int:
+        try:
+            with open(self._filename, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        if not data.startswith(JOURNAL_MAGIC):
+            raise ValueError(f"{self._filename} is not a configuration journal")
+        view = memoryview(data)
+        offset = len(JOURNAL_MAGIC)
+        while offset + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, offset)
+            end = offset + _FRAME.size + length
+            payload = view[offset + _FRAME.size : end]
+            if end > len(data) or crc32(payload) != crc:
+                break
+            self._apply(payload)
+            offset = end
+        if offset < len(data):
+            # torn record at the end
+            with open(self._filename, "r+b") as file:
+                file.truncate(offset)
+        return offset
+
+    def _apply(self, payload: memoryview) -> None:
+        # pylint: disable=too-many-branches
+        op = payload[0]
+        if op == OP_SETTING:
+            _, length = _SETTING.unpack_from(payload)
+            key = bytes(payload[2 : 2 + length]).decode()
+            MemoryStorage.write_setting(self, key, loads(bytes(payload[2 + length :])))
+        elif op == OP_EVENT:
+            _, idx, node_number, event_number = _EVENT.unpack_from(payload)
+            event_vars = bytes(payload[_EVENT.size :])
+            MemoryStorage.write_event(
+                self, idx, Event(node_number, event_number, event_vars)
+            )
+        elif op == OP_CLEAR_EVENT:
+            MemoryStorage.clear_event(self, _INDEX.unpack_from(payload)[1])
+        elif op == OP_CLEAR_EVENTS:
+            MemoryStorage.clear_all_events(self)
+        elif op == OP_NODE_VAR:
+            _, idx, val = _NODE_VAR.unpack_from(payload)
+            MemoryStorage.write_node_var(self, idx, val)
+        elif op == OP_CLEAR_NODE_VAR:
+            MemoryStorage.clear_node_var(self, _INDEX.unpack_from(payload)[1])
+        elif op == OP_CLEAR_NODE_VARS:
+            MemoryStorage.clear_all_node_vars(self)
+        else:
+            raise ValueError(f"unknown journal record 0x{op:02X}")
+
+    def _append(self, payload: bytes) -> None:
+        record = _frame(payload)
+        if self._batch is not None:
+            self._batch += record
+            return
+        self._write(record)
+
+    def _write(self, record: bytes) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(record)
+            else:
+                self._file.write(record)
+                self._file.flush()
+                if self._sync:
+                    fsync(self._file.fileno())
+            self._size += len(record)
+            self._dirty = not self._sync
+        if self._size > max(self._compact_size, 2 * self._base_size):
+            self.compact()
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty and self._pending is None:
+                fsync(self._file.fileno())
+                self._dirty = False
+
+    def flush_if_due(self) -> bool:
+        if not self._dirty:
+            return False
+        self.flush()
+        return True
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group changes so they are appended with one write."""
+        if self._batch is not None:
+            yield
+            return
+        self._batch = bytearray()
+        try:
+            yield
+        finally:
+            records, self._batch = bytes(self._batch), None
+            if records:
+                self._write(records)
+
+    def _snapshot(self) -> bytes:
+        snapshot = bytearray(JOURNAL_MAGIC)
+        for key, value in self.settings().items():
+            snapshot += _frame(_setting_record(key, value))
+        for idx, val in self.iter_node_vars():
+            snapshot += _frame(_NODE_VAR.pack(OP_NODE_VAR, idx, val))
+        for idx, evt in self.iter_events():
+            snapshot += _frame(_event_record(idx, evt))
+        return bytes(snapshot)
+
+    def compact(self, wait: bool = False) -> None:
+        """
+        Replace the journal with a snapshot of the configuration.
+
+        The snapshot is taken at once and written by a background thread; records
+        appended meanwhile are added to it before it replaces the journal. With wait,
+        a compaction in progress is finished first and the new one is waited for.
+        """
+        with self._lock:
+            running = self._compaction
+        if running is not None:
+            if not wait:
+                return
+            running.join()
+        with self._lock:
+            self._pending = []
+            compaction = self._compaction = Thread(
+                target=self._write_snapshot,
+                args=(self._snapshot(),),
+                name="config-compaction",
+                daemon=True,
+            )
+            compaction.start()
+        if wait:
+            compaction.join()
+
+    def _write_snapshot(self, snapshot: bytes) -> None:
+        tmp_filename = f"{self._filename}.tmp"
+        with open(tmp_filename, "wb") as file:
+            file.write(snapshot)
+            file.flush()
+            fsync(file.fileno())
+            with self._lock:
+                pending = b"".join(self._pending or ())
+                file.write(pending)
+                file.flush()
+                fsync(file.fileno())
+                replace(tmp_filename, self._filename)
+                self._file.close()
+                self._file = open(self._filename, "ab")  # pylint: disable=R1732
+                self._size = len(snapshot) + len(pending)
+                self._base_size = len(snapshot)
+                self._dirty = False
+                self._pending = None
+                self._compaction = None
+
+    def close(self) -> None:
+        with self._lock:
+            compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        self.flush()
+        self._file.close()
+
+    def write_setting(self, key: str, value: Any) -> None:
+        super().write_setting(key, value)
+        self._append(_setting_record(key, value))
+
+    def write_event(self, idx: int, event: Event) -> None:
+        super().write_event(idx, event)
+        self._append(_event_record(idx, event))
+
+    def clear_event(self, idx: int) -> None:
+        if self.read_event(idx) is None:
+            return
+        super().clear_event(idx)
+        self._append(_INDEX.pack(OP_CLEAR_EVENT, idx))
+
+    def clear_all_events(self) -> None:
+        super().clear_all_events()
+        self._append(_OP.pack(OP_CLEAR_EVENTS))
+
+    def write_node_var(self, idx: int, val: int) -> None:
+        super().write_node_var(idx, val)
+        self._append(_NODE_VAR.pack(OP_NODE_VAR, idx, val))
+
+    def clear_node_var(self, idx: int) -> None:
+        if self.read_node_var(idx) is None:
+            return
+        super().clear_node_var(idx)
+        self._append(_INDEX.pack(OP_CLEAR_NODE_VAR, idx))
+
+    def clear_all_node_vars(self) -> None:
+        super().clear_all_node_vars()
+        self._append(_OP.pack(OP_CLEAR_NODE_VARS))
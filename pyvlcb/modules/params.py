@@ -5,6 +5,7 @@ TODO
 from ctypes import LittleEndianStructure, Union, c_uint8
 from dataclasses import dataclass
 from struct import pack
+from typing import Any, ClassVar, Dict
 from ..vlcbdefs import (
     MANU_DEV,
     CPUM_ARM,
@@ -27,6 +28,25 @@ from ..vlcbdefs import (
     PAR_LOAD,
 )
 
+#: Params attribute of each parameter index.
+_PARAM_ATTRS: Dict[int, str] = {
+    PAR_NUM: "num_params",
+    PAR_MANU: "manufacturer_id",
+    PAR_MTYP: "module_id",
+    PAR_MAJVER: "version_major",
+    PAR_MINVER: "version_minor",
+    PAR_BETA: "version_beta",
+    PAR_EVTNUM: "num_evts",
+    PAR_EVNUM: "num_evs",
+    PAR_NVNUM: "num_nvs",
+    PAR_FLAGS: "flags",
+    PAR_BUSTYPE: "protocol",
+    PAR_CPUID: "cpu_id",
+    PAR_CPUMID: "cpu_name",
+    PAR_CPUMAN: "cpu_code",
+    PAR_LOAD: "load_addr",
+}
+
 
 class ModuleFlagsBits(LittleEndianStructure):
     """Module flags bits."""
@@ -85,6 +105,16 @@ class Params:
     cpu_name: str = "P4B "
     protocol: int = PB_CAN
 
+    #: Incremented on every change, so derived data can tell it is stale.
+    generation: ClassVar[int] = 0
+    _packed: ClassVar[bytes] = b""
+    _packed_generation: ClassVar[int] = -1
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name[0] != "_" and name != "generation":
+            super().__setattr__("generation", self.generation + 1)
+
     @property
     def version(self) -> str:
         """
@@ -109,6 +139,7 @@ class Params:
     @is_normal_mode.setter
     def is_normal_mode(self, on: bool) -> None:
         self.flags.bit.normal = bool(on)
+        self.generation += 1
 
     @property
     def is_learn_mode(self) -> bool:
@@ -120,8 +151,8 @@ class Params:
     @is_learn_mode.setter
     def is_learn_mode(self, on: bool) -> None:
         self.flags.bit.learn = bool(on)
+        self.generation += 1
 
-    # pylint: disable=too-many-branches, too-many-return-statements
     def get_param(self, idx: int) -> int | str | ModuleFlags:
         """
         Get a parameter by index.
@@ -135,45 +166,24 @@ class Params:
         Returns:
             int | str | ModuleFlags: parameter value
         """
-        if idx == PAR_NUM:
-            return self.num_params
-        if idx == PAR_MANU:
-            return self.manufacturer_id
-        if idx == PAR_MTYP:
-            return self.module_id
-        if idx == PAR_MAJVER:
-            return self.version_major
-        if idx == PAR_MINVER:
-            return self.version_minor
-        if idx == PAR_BETA:
-            return self.version_beta
-        if idx == PAR_EVTNUM:
-            return self.num_evts
-        if idx == PAR_EVNUM:
-            return self.num_evs
-        if idx == PAR_NVNUM:
-            return self.num_nvs
-        if idx == PAR_FLAGS:
-            return self.flags
-        if idx == PAR_BUSTYPE:
-            return self.protocol
-        if idx == PAR_CPUID:
-            return self.cpu_id
-        if idx == PAR_CPUMID:
-            return self.cpu_name
-        if idx == PAR_CPUMAN:
-            return self.cpu_code
-        if idx == PAR_LOAD:
-            return self.load_addr
-        raise IndexError
+        try:
+            return getattr(self, _PARAM_ATTRS[idx])
+        except KeyError:
+            raise IndexError from None
 
     def to_bytes(self) -> bytes:
         """
-        Binary version for messaging.
+        Binary version for messaging, packed again only after a change.
 
         Returns:
             bytes: the params object as binary.
         """
+        if self._packed_generation != self.generation:
+            self._packed = self._pack()
+            self._packed_generation = self.generation
+        return self._packed
+
+    def _pack(self) -> bytes:
         return pack(
             ">11bl4s2b",
             self.num_params,
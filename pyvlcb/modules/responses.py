@@ -0,0 +1,109 @@
+"""
+Cache of the replies to the node information requests.
+
+The replies to RQNP (PARAMS), RQMN (NAME), RQNPN (PARAN) and RQSD (SD/ESD) only
+depend on the module parameters and settings, so they are encoded once, keyed by
+op-code and index, and reused until :class:`~pyvlcb.modules.params.Params` or
+:class:`~pyvlcb.modules.config.Configuration` change.
+"""
+
+from typing import Any, Dict, Sequence, Tuple
+
+from ..codec import encode
+from ..services.service import Service
+from ..vlcbdefs import (
+    OPC_ESD,
+    OPC_NAME,
+    OPC_PARAMS,
+    OPC_PARAN,
+    OPC_RQMN,
+    OPC_RQNP,
+    OPC_RQNPN,
+    OPC_RQSD,
+    OPC_SD,
+)
+from .config import Configuration
+from .params import Params
+
+#: Length of the module name in a NAME reply.
+NAME_LENGTH = 7
+
+
+class ResponseCache:
+    """
+    Ready encoded replies to RQNP, RQMN, RQNPN and RQSD.
+
+    The cache does not check the module mode: the caller decides whether a request
+    must be answered.
+    """
+
+    def __init__(
+        self, params: Params, config: Configuration, services: Sequence[Service]
+    ) -> None:
+        self._params = params
+        self._config = config
+        self._services = services
+        self._replies: Dict[int, Tuple[bytes, ...]] = {}
+        self._stamp = (-1, -1)
+
+    def invalidate(self) -> None:
+        """Forget all replies, e.g. after changing the services."""
+        self._replies.clear()
+
+    def reply(self, data: Any) -> Tuple[bytes, ...]:
+        """
+        Replies to a request.
+
+        Args:
+            data (bytes | bytearray | memoryview): the request, starting with the op-code.
+
+        Returns:
+            Tuple[bytes, ...]: the reply messages, none if the request is not cached,
+            addressed to another node or asks for an invalid index.
+        """
+        opcode = data[0]
+        if opcode in (OPC_RQNPN, OPC_RQSD):
+            if len(data) < 4 or (data[1] << 8 | data[2]) != self._config.node_number:
+                return ()
+            idx = data[3]
+        elif opcode in (OPC_RQNP, OPC_RQMN):
+            idx = 0
+        else:
+            return ()
+        stamp = (self._params.generation, self._config.generation)
+        if stamp != self._stamp:
+            self._replies.clear()
+            self._stamp = stamp
+        key = opcode << 8 | idx
+        replies = self._replies.get(key)
+        if replies is None:
+            replies = self._replies[key] = self._encode(opcode, idx)
+        return replies
+
+    def _encode(self, opcode: int, idx: int) -> Tuple[bytes, ...]:
+        node_number = self._config.node_number
+        if opcode == OPC_RQNP:
+            return (encode(OPC_PARAMS, *self._params.to_bytes()[1:8]),)
+        if opcode == OPC_RQMN:
+            name = self._config.settings.module_name[:NAME_LENGTH]
+            return (encode(OPC_NAME, *name.ljust(NAME_LENGTH).encode("ascii")),)
+        if opcode == OPC_RQNPN:
+            packed = self._params.to_bytes()
+            if idx >= len(packed):
+                return ()
+            return (encode(OPC_PARAN, node_number, idx, packed[idx]),)
+        if idx == 0:
+            return (encode(OPC_SD, node_number, 0, 0, len(self._services)),) + tuple(
+                encode(
+                    OPC_SD,
+                    node_number,
+                    i,
+                    service.service_id,
+                    service.service_version_id,
+                )
+                for i, service in enumerate(self._services, 1)
+            )
+        if idx > len(self._services):
+            return ()
+        service = self._services[idx - 1]
+        return (encode(OPC_ESD, node_number, idx, service.service_id, 0, 0, 0),)
@@ -0,0 +1,95 @@
+"""
+Bounded single-producer/single-consumer ring buffer of actions.
+
+The producer only moves the tail and the consumer only moves the head, and a slot is
+filled before the tail moves past it, so one thread may put while another drains
+without a lock. Several producers must be serialized, as
+:meth:`~pyvlcb.modules.controller.Controller.put_action` does for threads other than
+the controller's.
+"""
+
+from typing import List, Optional
+
+from ..services.service import Action
+
+#: Default number of actions the ring holds.
+DEFAULT_CAPACITY = 256
+
+
+class ActionRing:
+    """
+    Fixed capacity FIFO of actions. The capacity is rounded up to a power of two.
+    """
+
+    __slots__ = ("_slots", "_mask", "_head", "_tail", "_dropped")
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        size = 1 << (capacity - 1).bit_length()
+        self._slots: List[Optional[Action]] = [None] * size
+        self._mask = size - 1
+        self._head = 0
+        self._tail = 0
+        self._dropped = 0
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    @property
+    def capacity(self) -> int:
+        """
+        Number of actions the ring holds.
+        """
+        return self._mask + 1
+
+    @property
+    def free(self) -> int:
+        """
+        Number of actions that can be put before the ring is full.
+        """
+        return self._mask + 1 - (self._tail - self._head)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Number of actions refused because the ring was full.
+        """
+        return self._dropped
+
+    def put(self, action: Action) -> bool:
+        """
+        Append an action. Producer side.
+
+        Returns:
+            bool: False if the ring is full and the action was dropped.
+        """
+        tail = self._tail
+        if tail - self._head > self._mask:
+            self._dropped += 1
+            return False
+        self._slots[tail & self._mask] = action
+        self._tail = tail + 1
+        return True
+
+    def drain(self, max_count: int) -> List[Action]:
+        """
+        Remove up to max_count actions, oldest first. Consumer side.
+        """
+        head = self._head
+        count = min(self._tail - head, max_count)
+        if count <= 0:
+            return []
+        slots = self._slots
+        start = head & self._mask
+        end = start + count
+        if end <= len(slots):
+            batch = slots[start:end]
+            slots[start:end] = [None] * count
+        else:
+            end -= len(slots)
+            batch = slots[start:] + slots[:end]
+            slots[start:] = [None] * (len(slots) - start)
+            slots[:end] = [None] * end
+        self._head = head + count
+        return batch  # type: ignore[return-value]
@@ -0,0 +1,155 @@
+"""
+SQLite storage of the module configuration, for modules with very many events.
+
+The database runs in WAL mode; events are indexed on (node number, event number), so
+locating an event or listing the events of a node are index lookups, and listings are
+streamed from a cursor. Changes made within :meth:`SqliteStorage.batch` are committed
+in one transaction.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from json import dumps, loads
+from os import PathLike
+from typing import Any, Dict, Iterator, Tuple
+
+from .storage import DEFAULT_SETTINGS, Event, Storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS node_vars (idx INTEGER PRIMARY KEY, val INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    idx INTEGER PRIMARY KEY,
+    nn INTEGER NOT NULL,
+    en INTEGER NOT NULL,
+    evs BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_nn_en ON events (nn, en);
+"""
+
+# Statements are prepared once and reused from the connection statement cache.
+_READ_SETTING = "SELECT value FROM settings WHERE key = ?"
+_WRITE_SETTING = "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)"
+_ADD_SETTING = "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)"
+_SETTINGS = "SELECT key, value FROM settings"
+_COUNT_EVENTS = "SELECT COUNT(*) FROM events"
+_READ_EVENT = "SELECT nn, en, evs FROM events WHERE idx = ?"
+_WRITE_EVENT = "INSERT OR REPLACE INTO events (idx, nn, en, evs) VALUES (?, ?, ?, ?)"
+_CLEAR_EVENT = "DELETE FROM events WHERE idx = ?"
+_CLEAR_EVENTS = "DELETE FROM events"
+# duplicated events resolve to their highest index, as in EventIndex
+_FIND_EVENT = "SELECT idx FROM events WHERE nn = ? AND en = ? ORDER BY idx DESC LIMIT 1"
+_NODE_EVENTS = "SELECT en, idx FROM events WHERE nn = ? ORDER BY idx"
+_EVENTS = "SELECT idx, nn, en, evs FROM events ORDER BY idx"
+_COUNT_NODE_VARS = "SELECT COUNT(*) FROM node_vars"
+_READ_NODE_VAR = "SELECT val FROM node_vars WHERE idx = ?"
+_WRITE_NODE_VAR = "INSERT OR REPLACE INTO node_vars (idx, val) VALUES (?, ?)"
+_CLEAR_NODE_VAR = "DELETE FROM node_vars WHERE idx = ?"
+_CLEAR_NODE_VARS = "DELETE FROM node_vars"
+_NODE_VARS = "SELECT idx, val FROM node_vars ORDER BY idx"
+
+
+class SqliteStorage(Storage):
+    """
+    Configuration kept in a SQLite database.
+
+    Outside a batch every change is committed at once.
+    """
+
+    def __init__(self, filename: str | PathLike) -> None:
+        self._db = sqlite3.connect(filename, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.executemany(
+            _ADD_SETTING,
+            ((key, dumps(value)) for key, value in DEFAULT_SETTINGS.items()),
+        )
+        self._batch_depth = 0
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group changes in one transaction, committed when the outermost batch ends."""
+        if self._batch_depth == 0:
+            self._db.execute("BEGIN")
+        self._batch_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._db.execute("ROLLBACK")
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._db.execute("COMMIT")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _value(self, sql: str, *args: Any) -> Any:
+        row = self._db.execute(sql, args).fetchone()
+        return None if row is None else row[0]
+
+    def read_setting(self, key: str) -> Any:
+        value = self._value(_READ_SETTING, key)
+        if value is None:
+            raise KeyError(key)
+        return loads(value)
+
+    def write_setting(self, key: str, value: Any) -> None:
+        self._db.execute(_WRITE_SETTING, (key, dumps(value)))
+
+    def settings(self) -> Dict[str, Any]:
+        return {key: loads(value) for key, value in self._db.execute(_SETTINGS)}
+
+    @property
+    def num_events(self) -> int:
+        return self._value(_COUNT_EVENTS)
+
+    def read_event(self, idx: int) -> Event | None:
+        row = self._db.execute(_READ_EVENT, (idx,)).fetchone()
+        if row is None:
+            return None
+        return Event(row[0], row[1], row[2])
+
+    def write_event(self, idx: int, event: Event) -> None:
+        self._db.execute(
+            _WRITE_EVENT,
+            (idx, event.node_number, event.event_number, event.event_vars),
+        )
+
+    def clear_event(self, idx: int) -> None:
+        self._db.execute(_CLEAR_EVENT, (idx,))
+
+    def clear_all_events(self) -> None:
+        self._db.execute(_CLEAR_EVENTS)
+
+    def find_event_index(self, node_number: int, event_number: int) -> int | None:
+        return self._value(_FIND_EVENT, node_number, event_number)
+
+    def node_event_indexes(self, node_number: int) -> Dict[int, int]:
+        return dict(self._db.execute(_NODE_EVENTS, (node_number,)))
+
+    def iter_events(self) -> Iterator[Tuple[int, Event]]:
+        for idx, node_number, event_number, evs in self._db.execute(_EVENTS):
+            yield idx, Event(node_number, event_number, evs)
+
+    @property
+    def num_node_vars(self) -> int:
+        return self._value(_COUNT_NODE_VARS)
+
+    def read_node_var(self, idx: int) -> int | None:
+        return self._value(_READ_NODE_VAR, idx)
+
+    def write_node_var(self, idx: int, val: int) -> None:
+        self._db.execute(_WRITE_NODE_VAR, (idx, val))
+
+    def clear_node_var(self, idx: int) -> None:
+        self._db.execute(_CLEAR_NODE_VAR, (idx,))
+
+    def clear_all_node_vars(self) -> None:
+        self._db.execute(_CLEAR_NODE_VARS)
+
+    def iter_node_vars(self) -> Iterator[Tuple[int, int]]:
+        yield from self._db.execute(_NODE_VARS)
@@ -0,0 +1,460 @@
+"""
+Non volatile storage backends of the module configuration.
+
+A :class:`Storage` keeps the settings, events and node variables of a module;
+:class:`~pyvlcb.modules.config.Configuration` is a thin layer over one. Every backend
+can import and export the ``config.json`` document format::
+
+    {
+        "settings": {"MODE": 255, "CAN_ID": 0, "NODE_NUMBER": 0, ...},
+        "node_vars": {"NV000": 1, ...},
+        "events": {"EVT000": {"NODE_NUMBER": 1, "EVENT_NUMBER": 2, "EVENT_VARS": [...]}}
+    }
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from json import dump, load
+from os import PathLike, fsync, fspath, replace
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Tuple
+
+#: Default seconds a write-behind storage waits after the last change before saving.
+FLUSH_DELAY = 2.0
+#: A write-behind storage changed without pause is saved at the latest this many flush
+#: delays after its first unsaved change.
+FLUSH_MAX_DELAYS = 10
+
+#: Settings of a new, empty configuration.
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "MANUFACTURER_ID": 0,
+    "MODULE_ID": 0,
+    "MODULE_NAME": "",
+    "VERSION": "0.0.0",
+    "MODE": 0xFF,
+    "CAN_ID": 0,
+    "NODE_NUMBER": 0,
+    "NODE_FLAGS": 0,
+    "RESET_FLAG": 0,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """
+    VLCB event.
+
+    Events are immutable, so storages can hand out the same object on every read.
+    The event variables are kept as bytes; any iterable of ints is accepted.
+    """
+
+    node_number: int
+    event_number: int
+    event_vars: bytes = b""
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.event_vars, bytes):
+            object.__setattr__(self, "event_vars", bytes(self.event_vars))
+
+
+def event_key(idx: int) -> str:
+    """Key of an event in the document format."""
+    return f"EVT{idx:03d}"
+
+
+def node_var_key(idx: int) -> str:
+    """Key of a node variable in the document format."""
+    return f"NV{idx:03d}"
+
+
+def empty_document() -> Dict[str, Dict[str, Any]]:
+    """A new configuration document with default settings."""
+    return {"settings": dict(DEFAULT_SETTINGS), "node_vars": {}, "events": {}}
+
+
+def load_document(filename: str | PathLike) -> Dict[str, Dict[str, Any]]:
+    """Read a configuration document from a JSON file."""
+    with open(filename, "rt", encoding="utf-8") as file:
+        return load(file)
+
+
+def save_document(filename: str | PathLike, document: Dict[str, Any]) -> None:
+    """
+    Write a configuration document to a JSON file.
+
+    The document is written to a temporary file which is renamed over filename, so
+    the file is never left half written.
+    """
+    filename = fspath(filename)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wt", encoding="utf-8") as file:
+        dump(document, file, indent=4)
+        file.flush()
+        fsync(file.fileno())
+    replace(tmp_filename, filename)
+
+
+class EventIndex:
+    """
+    Index of events by contents: (node number, event number) -> index, and node
+    number -> {event number -> index}.
+
+    When the same event is stored at several indexes, the highest one is indexed, as
+    by every storage backend, and the others are kept aside in case it is removed.
+    """
+
+    def __init__(self) -> None:
+        self._events: Dict[Tuple[int, int], int] = {}
+        self._nodes: Dict[int, Dict[int, int]] = {}
+        # (node number, event number) -> lower indexes holding the same event
+        self._duplicates: Dict[Tuple[int, int], List[int]] = {}
+
+    def add(self, idx: int, node_number: int, event_number: int) -> None:
+        """Index an event."""
+        key = (node_number, event_number)
+        indexed = self._events.get(key)
+        if indexed is not None and indexed != idx:
+            self._duplicates.setdefault(key, []).append(min(idx, indexed))
+            idx = max(idx, indexed)
+        self._events[key] = idx
+        self._nodes.setdefault(node_number, {})[event_number] = idx
+
+    def remove(self, idx: int, node_number: int, event_number: int) -> None:
+        """Remove an event, indexing the next highest copy of it if there is one."""
+        key = (node_number, event_number)
+        duplicates = self._duplicates.get(key)
+        if self._events.get(key) != idx:
+            if duplicates is not None and idx in duplicates:
+                duplicates.remove(idx)
+                if not duplicates:
+                    del self._duplicates[key]
+            return
+        if duplicates is not None:
+            following = max(duplicates)
+            duplicates.remove(following)
+            if not duplicates:
+                del self._duplicates[key]
+            self._events[key] = following
+            self._nodes[node_number][event_number] = following
+            return
+        del self._events[key]
+        node_events = self._nodes[node_number]
+        del node_events[event_number]
+        if not node_events:
+            del self._nodes[node_number]
+
+    def clear(self) -> None:
+        """Remove all events."""
+        self._events = {}
+        self._nodes = {}
+        self._duplicates = {}
+
+    def find(self, node_number: int, event_number: int) -> int | None:
+        """Index of an event."""
+        return self._events.get((node_number, event_number))
+
+    def node(self, node_number: int) -> Dict[int, int]:
+        """Indexes of the events of a node, keyed by event number."""
+        return dict(self._nodes.get(node_number, {}))
+
+
+class Storage(ABC):
+    """
+    Abstract storage of a module configuration.
+
+    Events and node variables are addressed by index. Changes may be buffered:
+    :meth:`flush` saves them and :meth:`batch` groups them.
+    """
+
+    @property
+    def dirty(self) -> bool:
+        """There are changes not saved yet."""
+        return False
+
+    def flush(self) -> None:
+        """Save pending changes."""
+
+    def flush_if_due(self) -> bool:
+        """Save pending changes if they are old enough, return whether it did."""
+        return False
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group changes so they are saved together."""
+        yield
+
+    def close(self) -> None:
+        """Save pending changes and release the storage."""
+        self.flush()
+
+    @abstractmethod
+    def read_setting(self, key: str) -> Any:
+        """Read a setting."""
+
+    @abstractmethod
+    def write_setting(self, key: str, value: Any) -> None:
+        """Write a setting."""
+
+    @abstractmethod
+    def settings(self) -> Dict[str, Any]:
+        """All the settings."""
+
+    @property
+    @abstractmethod
+    def num_events(self) -> int:
+        """Number of events."""
+
+    @abstractmethod
+    def read_event(self, idx: int) -> Event | None:
+        """Read a stored event."""
+
+    @abstractmethod
+    def write_event(self, idx: int, event: Event) -> None:
+        """Write an event."""
+
+    @abstractmethod
+    def clear_event(self, idx: int) -> None:
+        """Clear an event."""
+
+    @abstractmethod
+    def clear_all_events(self) -> None:
+        """Clear all events."""
+
+    @abstractmethod
+    def find_event_index(self, node_number: int, event_number: int) -> int | None:
+        """Index of an event, located by contents; the highest if it is duplicated."""
+
+    @abstractmethod
+    def node_event_indexes(self, node_number: int) -> Dict[int, int]:
+        """Indexes of the events of a node, keyed by event number."""
+
+    @abstractmethod
+    def iter_events(self) -> Iterator[Tuple[int, Event]]:
+        """Stored events and their indexes."""
+
+    @property
+    @abstractmethod
+    def num_node_vars(self) -> int:
+        """Number of node variables."""
+
+    @abstractmethod
+    def read_node_var(self, idx: int) -> int | None:
+        """Read a stored node variable."""
+
+    @abstractmethod
+    def write_node_var(self, idx: int, val: int) -> None:
+        """Write a node variable."""
+
+    @abstractmethod
+    def clear_node_var(self, idx: int) -> None:
+        """Clear a node variable."""
+
+    @abstractmethod
+    def clear_all_node_vars(self) -> None:
+        """Clear all node variables."""
+
+    @abstractmethod
+    def iter_node_vars(self) -> Iterator[Tuple[int, int]]:
+        """Stored node variables and their indexes."""
+
+    def export_document(self) -> Dict[str, Dict[str, Any]]:
+        """The configuration in the document format."""
+        return {
+            "settings": self.settings(),
+            "node_vars": {node_var_key(idx): val for idx, val in self.iter_node_vars()},
+            "events": {
+                event_key(idx): {
+                    "NODE_NUMBER": evt.node_number,
+                    "EVENT_NUMBER": evt.event_number,
+                    "EVENT_VARS": list(evt.event_vars),
+                }
+                for idx, evt in self.iter_events()
+            },
+        }
+
+    def import_document(self, document: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the configuration with a document."""
+        with self.batch():
+            for key, value in document["settings"].items():
+                self.write_setting(key, value)
+            self.clear_all_node_vars()
+            for key, val in document["node_vars"].items():
+                self.write_node_var(int(key[2:]), val)
+            self.clear_all_events()
+            for key, evt in document["events"].items():
+                self.write_event(
+                    int(key[3:]),
+                    Event(evt["NODE_NUMBER"], evt["EVENT_NUMBER"], evt["EVENT_VARS"]),
+                )
+
+    def export_json(self, filename: str | PathLike) -> None:
+        """Save the configuration as a ``config.json`` file."""
+        save_document(filename, self.export_document())
+
+    def import_json(self, filename: str | PathLike) -> None:
+        """Replace the configuration with a ``config.json`` file."""
+        self.import_document(load_document(filename))
+
+
+class MemoryStorage(Storage):
+    """
+    Configuration kept in memory, with its events indexed by contents.
+
+    Events are kept as :class:`Event` objects, so reading one is a dict lookup.
+    Subclasses persist the configuration: :meth:`_changed` is called after every change.
+    """
+
+    def __init__(self, document: Dict[str, Dict[str, Any]] | None = None) -> None:
+        if document is None:
+            document = empty_document()
+        self._settings: Dict[str, Any] = dict(document["settings"])
+        self._node_vars: Dict[int, int] = {
+            int(nv_key[2:]): int(val) for nv_key, val in document["node_vars"].items()
+        }
+        self._events: Dict[int, Event] = {}
+        self._event_index = EventIndex()
+        for evt_key, data in document["events"].items():
+            idx = int(evt_key[3:])
+            evt = Event(data["NODE_NUMBER"], data["EVENT_NUMBER"], data["EVENT_VARS"])
+            self._events[idx] = evt
+            self._event_index.add(idx, evt.node_number, evt.event_number)
+
+    def _changed(self) -> None:
+        """Called after every change."""
+
+    def read_setting(self, key: str) -> Any:
+        return self._settings[key]
+
+    def write_setting(self, key: str, value: Any) -> None:
+        self._settings[key] = value
+        self._changed()
+
+    def settings(self) -> Dict[str, Any]:
+        return dict(self._settings)
+
+    @property
+    def num_events(self) -> int:
+        return len(self._events)
+
+    def read_event(self, idx: int) -> Event | None:
+        return self._events.get(idx)
+
+    def write_event(self, idx: int, event: Event) -> None:
+        old = self._events.get(idx)
+        if old is not None:
+            self._event_index.remove(idx, old.node_number, old.event_number)
+        self._event_index.add(idx, event.node_number, event.event_number)
+        self._events[idx] = event
+        self._changed()
+
+    def clear_event(self, idx: int) -> None:
+        old = self._events.pop(idx, None)
+        if old is None:
+            return
+        self._event_index.remove(idx, old.node_number, old.event_number)
+        self._changed()
+
+    def clear_all_events(self) -> None:
+        self._events = {}
+        self._event_index.clear()
+        self._changed()
+
+    def find_event_index(self, node_number: int, event_number: int) -> int | None:
+        return self._event_index.find(node_number, event_number)
+
+    def node_event_indexes(self, node_number: int) -> Dict[int, int]:
+        return self._event_index.node(node_number)
+
+    def iter_events(self) -> Iterator[Tuple[int, Event]]:
+        return iter(list(self._events.items()))
+
+    @property
+    def num_node_vars(self) -> int:
+        return len(self._node_vars)
+
+    def read_node_var(self, idx: int) -> int | None:
+        return self._node_vars.get(idx)
+
+    def write_node_var(self, idx: int, val: int) -> None:
+        self._node_vars[idx] = val
+        self._changed()
+
+    def clear_node_var(self, idx: int) -> None:
+        if self._node_vars.pop(idx, None) is None:
+            return
+        self._changed()
+
+    def clear_all_node_vars(self) -> None:
+        self._node_vars = {}
+        self._changed()
+
+    def iter_node_vars(self) -> Iterator[Tuple[int, int]]:
+        return iter(list(self._node_vars.items()))
+
+
+class JsonStorage(MemoryStorage):
+    """
+    Configuration saved as a ``config.json`` document.
+
+    Every change is saved at once, unless write_behind is set: then changes only mark
+    the storage dirty and are saved by :meth:`flush`, called by :meth:`flush_if_due`
+    once no change happened for flush_delay seconds, or :data:`FLUSH_MAX_DELAYS`
+    flush delays after the first unsaved change if changes keep coming.
+    """
+
+    def __init__(
+        self,
+        filename: str | PathLike,
+        write_behind: bool = False,
+        flush_delay: float = FLUSH_DELAY,
+    ) -> None:
+        self._filename = filename
+        self._write_behind = write_behind
+        self._flush_delay = flush_delay
+        self._dirty = False
+        self._dirty_since = 0.0
+        self._changed_at = 0.0
+        self._batch_depth = 0
+        super().__init__(load_document(filename))
+
+    def _changed(self) -> None:
+        self._changed_at = monotonic()
+        if not self._dirty:
+            self._dirty = True
+            self._dirty_since = self._changed_at
+        if not self._write_behind and self._batch_depth == 0:
+            self.flush()
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        save_document(self._filename, self.export_document())
+        self._dirty = False
+
+    def flush_if_due(self) -> bool:
+        if not self._dirty:
+            return False
+        now = monotonic()
+        if (
+            now - self._changed_at >= self._flush_delay
+            or now - self._dirty_since >= self._flush_delay * FLUSH_MAX_DELAYS
+        ):
+            self.flush()
+            return True
+        return False
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group changes so they are saved once, when the outermost batch ends."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and not self._write_behind:
+                self.flush()
@@ -0,0 +1,203 @@
+"""
+Timing and profiling of the services run by the controller.
+
+Durations are kept in :class:`Histogram` objects with logarithmic buckets (four per
+power of two), so recording is constant time and memory while percentiles stay within
+about 20%. :class:`ProfileCapture` runs :mod:`cProfile` and optionally
+:mod:`tracemalloc` for a number of controller ticks.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from cProfile import Profile
+    from pstats import Stats
+    from tracemalloc import Snapshot
+
+#: Sub-buckets per power of two, as a number of bits.
+_SUB_BITS = 2
+#: Number of buckets, enough for durations of several days in nanoseconds.
+_BUCKETS = 64 << _SUB_BITS
+
+
+def _bucket(ns: int) -> int:
+    bits = ns.bit_length()
+    if bits <= _SUB_BITS + 1:
+        return ns
+    shift = bits - _SUB_BITS - 1
+    return (shift << _SUB_BITS) + (ns >> shift)
+
+
+def _bucket_limit(idx: int) -> int:
+    # highest duration in bucket idx
+    shift = (idx >> _SUB_BITS) - 1
+    if shift <= 0:
+        return idx
+    return (((idx & ((1 << _SUB_BITS) - 1)) | (1 << _SUB_BITS)) + 1 << shift) - 1
+
+
+class Histogram:
+    """
+    Distribution of durations in nanoseconds.
+    """
+
+    __slots__ = ("_buckets", "_count", "_total", "_max")
+
+    def __init__(self) -> None:
+        self._buckets = [0] * _BUCKETS
+        self._count = 0
+        self._total = 0
+        self._max = 0
+
+    def add(self, ns: int) -> None:
+        """
+        Record a duration.
+        """
+        self._buckets[_bucket(ns)] += 1
+        self._count += 1
+        self._total += ns
+        if ns > self._max:
+            self._max = ns
+
+    def clear(self) -> None:
+        """
+        Forget all recorded durations.
+        """
+        self._buckets = [0] * _BUCKETS
+        self._count = self._total = self._max = 0
+
+    @property
+    def count(self) -> int:
+        """
+        Number of recorded durations.
+        """
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean duration in nanoseconds, 0 if none was recorded.
+        """
+        return self._total / self._count if self._count else 0.0
+
+    @property
+    def max(self) -> int:
+        """
+        Longest duration in nanoseconds.
+        """
+        return self._max
+
+    def percentile(self, percent: float) -> int:
+        """
+        Duration in nanoseconds not exceeded by percent % of the recorded durations,
+        rounded up to the end of its bucket and capped at :attr:`max`.
+        """
+        if not self._count:
+            return 0
+        rank = self._count * percent / 100.0
+        seen = 0
+        for idx, hits in enumerate(self._buckets):
+            seen += hits
+            if hits and seen >= rank:
+                return min(_bucket_limit(idx), self._max)
+        return self._max
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Count, mean, p50, p99 and max, durations in nanoseconds.
+        """
+        return {
+            "count": self._count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self._max,
+        }
+
+
+class ProfileCapture:
+    """
+    :mod:`cProfile` (and optionally :mod:`tracemalloc`) capture of a number of ticks.
+
+    The profilers are imported and started on creation.
+    """
+
+    def __init__(self, ticks: int, trace_memory: bool = False) -> None:
+        # only loaded when a capture is requested
+        # pylint: disable=import-outside-toplevel
+        from cProfile import Profile
+
+        self._ticks = ticks
+        self._profile: Optional["Profile"] = Profile()
+        self._trace_memory = trace_memory
+        self._stats: Optional["Stats"] = None
+        self._snapshot: Optional["Snapshot"] = None
+        if trace_memory:
+            # pylint: disable=import-outside-toplevel
+            import tracemalloc
+
+            tracemalloc.start()
+        self._profile.enable()
+
+    @property
+    def done(self) -> bool:
+        """
+        The capture ended.
+        """
+        return self._profile is None
+
+    @property
+    def stats(self) -> Optional["Stats"]:
+        """
+        Profile of the captured ticks, None until :attr:`done`.
+        """
+        return self._stats
+
+    @property
+    def snapshot(self) -> Optional["Snapshot"]:
+        """
+        Memory allocated during the captured ticks and still held at the end, None
+        until :attr:`done` or without trace_memory.
+        """
+        return self._snapshot
+
+    def tick(self) -> bool:
+        """
+        Count a tick and stop the capture after the last one.
+
+        Returns:
+            bool: True if the capture ended.
+        """
+        self._ticks -= 1
+        if self._ticks > 0:
+            return False
+        self.stop()
+        return True
+
+    def stop(self) -> None:
+        """
+        End the capture now.
+        """
+        profile = self._profile
+        if profile is None:
+            return
+        profile.disable()
+        self._profile = None
+        # pylint: disable=import-outside-toplevel
+        from pstats import Stats
+
+        self._stats = Stats(profile)
+        if self._trace_memory:
+            # pylint: disable=import-outside-toplevel
+            import tracemalloc
+
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def top_allocations(self, limit: int = 10) -> List[Any]:
+        """
+        Source lines holding the most memory at the end of the capture.
+        """
+        if self._snapshot is None:
+            return []
+        return self._snapshot.statistics("lineno")[:limit]
@@ -3,15 +3,29 @@ TODO
 """
 
 from enum import Enum
-from typing import Any
-from ctypes import c_uint16, LittleEndianStructure, Union
-from can import Message
-from .service import Service
-from ..transports.can import CanTransport
-from ..vlcbdefs import SERVICE_ID_CAN
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from .service import Action, MessageIn, MessageOut, Service
+from ..modules.ring import ActionRing
+from ..transports.rawcan import RawCanTransport, unpack_frame
+from ..vlcbdefs import OPC_CANID, OPC_ENUM, SERVICE_ID_CAN
+
+if TYPE_CHECKING:
+    from can import Message
+
+    from ..transports.can import CanTransport
 
 SERVICE_VERSION_ID = 1
 
+#: Maximum number of frames handled by a single call to :meth:`CanService.process`.
+DEFAULT_MAX_BATCH = 32
+
+#: Lowest CANID a module can take by self enumeration.
+MIN_CAN_ID = 1
+#: Highest CANID a module can take by self enumeration.
+MAX_CAN_ID = 99
+#: Default seconds to collect the replies to an enumeration request.
+ENUM_WINDOW = 0.1
+
 
 # ----- CAN Header -----------------------------------------------------------------------------------------------------
 class MajorPriority(Enum):
@@ -38,31 +52,129 @@ class MinorPriority(Enum):
     LOW = 3
 
 
+#: Bits of the CAN header holding the CANID of the producer.
+CAN_ID_MASK = 0x7F
+#: Remote (RTR) frame flag of socketcan identifiers and filters.
+CAN_RTR_FLAG = 0x40000000
+
 DEFAULT_MINOR_PRIORITY = MinorPriority.LOW
 DEFAULT_MAJOR_PRIORITY = MajorPriority.NORMAL
 
 
-class _CanHeaderIdBits(LittleEndianStructure):
-    _fields_ = [
-        ("can_id", c_uint16, 7),
-        ("minor_priority", c_uint16, 2),
-        ("major_priority", c_uint16, 2),
-    ]
+#: Number of standard CAN identifiers.
+NUM_HEADER_IDS = 0x800
+
+#: CANID of every standard arbitration ID.
+HEADER_CAN_IDS = bytes(i & CAN_ID_MASK for i in range(NUM_HEADER_IDS))
+#: Minor priority of every standard arbitration ID.
+HEADER_MINOR_PRIORITIES = bytes((i >> 7) & 0x3 for i in range(NUM_HEADER_IDS))
+#: Major priority of every standard arbitration ID.
+HEADER_MAJOR_PRIORITIES = bytes(i >> 9 for i in range(NUM_HEADER_IDS))
+
+
+def header_priority(
+    minor_pri: int = DEFAULT_MINOR_PRIORITY.value,
+    major_pri: int = DEFAULT_MAJOR_PRIORITY.value,
+) -> int:
+    """
+    Priority class (major and minor priority bits, 0 to 15) of a CAN header.
+    """
+    return ((major_pri & 0x3) << 2) | (minor_pri & 0x3)
+
 
+def make_header_id(
+    can_id: int,
+    minor_pri: int = DEFAULT_MINOR_PRIORITY.value,
+    major_pri: int = DEFAULT_MAJOR_PRIORITY.value,
+) -> int:
+    """
+    Standard arbitration ID for a CANID and priorities.
+    """
+    return (header_priority(minor_pri, major_pri) << 7) | (can_id & CAN_ID_MASK)
 
-class CanHeaderId(Union):
-    _anonymous_ = ("f",)
-    _fields_ = [("f", _CanHeaderIdBits), ("as_word", c_uint16)]
+
+def decode_header_id(arbitration_id: int) -> Tuple[int, int, int]:
+    """
+    Split a standard arbitration ID.
+
+    Returns:
+        Tuple[int, int, int]: CANID, minor priority and major priority.
+    """
+    return (
+        HEADER_CAN_IDS[arbitration_id],
+        HEADER_MINOR_PRIORITIES[arbitration_id],
+        HEADER_MAJOR_PRIORITIES[arbitration_id],
+    )
+
+
+def lowest_free_can_id(responders: int) -> Optional[int]:
+    """
+    Lowest CANID no module answered an enumeration request with.
+
+    Args:
+        responders (int): bitset of the CANIDs that answered, bit N is CANID N.
+
+    Returns:
+        int | None: the CANID, None if all of them are taken.
+    """
+    for can_id in range(MIN_CAN_ID, MAX_CAN_ID + 1):
+        if not responders >> can_id & 1:
+            return can_id
+    return None
 
 
 class CanService(Service):
     """
     Handles CAN communication
+
+    Received VLCB messages are queued to the controller as
+    :class:`~pyvlcb.services.service.MessageIn` actions, and
+    :class:`~pyvlcb.services.service.MessageOut` actions are sent from this module.
+    When the action queue is full, frames are left in the transport.
+
+    In direct mode the transport passes frames to this service on its receive thread
+    (see :meth:`~pyvlcb.transports.transport.Transport.set_receiver`), skipping the RX
+    queue and the controller loop: messages are handed at once to the services
+    declared :attr:`~pyvlcb.services.service.Service.thread_safe`, the other services
+    get them from the next :meth:`process` on the controller thread. CANID
+    enumeration replies are also sent from the receive thread. Handlers replying with
+    :meth:`~pyvlcb.modules.controller.Controller.put_action` from there go through its
+    locked path for other threads.
+
+    It also implements CANID self enumeration: remote (RTR) frames are answered with an
+    empty frame from this module; a data frame from another module with the same CANID,
+    an ENUM request or :meth:`start_enumeration` make the module send a remote frame,
+    collect the CANIDs of the empty replies for enum_window seconds and take the lowest
+    free CANID.
     """
 
-    def __init__(self, transport: CanTransport, **kwargs: Any) -> None:
+    opcodes = (OPC_ENUM, OPC_CANID)
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        transport: "CanTransport | RawCanTransport",
+        max_batch: int = DEFAULT_MAX_BATCH,
+        can_ids: Optional[Iterable[int]] = None,
+        enum_window: float = ENUM_WINDOW,
+        direct: bool = False,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(**kwargs)
         self._transport = transport
+        self._max_batch = max_batch
+        self._can_ids = None if can_ids is None else sorted(set(can_ids))
+        self._enum_window = enum_window
+        self._enumerating = False
+        self._enumeration_required = False
+        # bit N set: CANID N answered the enumeration request
+        self._responders = 0
+        # messages received in direct mode for services that are not thread-safe
+        self._deferred: Optional[ActionRing] = ActionRing() if direct else None
+        if isinstance(transport, RawCanTransport):
+            self._handle = self._handle_raw_frame
+        else:
+            self._handle = self._handle_message
 
     @property
     def service_id(self) -> int:
@@ -72,8 +184,75 @@ class CanService(Service):
     def service_version_id(self) -> int:
         return SERVICE_VERSION_ID
 
+    @property
+    def can_filters(self) -> List[Dict[str, Any]]:
+        """
+        Acceptance filters for the frames this service consumes.
+
+        Only standard frames are used by VLCB; if the service was given can_ids, only
+        frames produced by those CANIDs are accepted, plus the ones self enumeration
+        needs: remote frames from any CANID and frames using the module's own CANID.
+        Filters are lifted while an enumeration collects the replies.
+
+        The remote frame filter only works where filters are installed in the kernel
+        (socketcan, :class:`~pyvlcb.transports.rawcan.RawCanTransport`); buses
+        filtering in python-can only match identifiers, so there remote frames from
+        other CANIDs are dropped and a clash is only seen once the other module uses
+        the CANID.
+        """
+        if self._can_ids is None:
+            return [{"can_id": 0, "can_mask": 0, "extended": False}]
+        can_ids = set(self._can_ids)
+        if self._controller is not None:
+            can_ids.add(self._controller.can_id & CAN_ID_MASK)
+        filters = [
+            {"can_id": can_id, "can_mask": CAN_ID_MASK, "extended": False}
+            for can_id in sorted(can_ids)
+        ]
+        filters.append(
+            {"can_id": CAN_RTR_FLAG, "can_mask": CAN_RTR_FLAG, "extended": False}
+        )
+        return filters
+
+    @property
+    def direct(self) -> bool:
+        """
+        Frames are handled on the transport receive thread.
+        """
+        return self._deferred is not None
+
     def begin(self) -> None:
-        pass
+        self._transport.set_filters(self.can_filters)
+        if self._deferred is not None:
+            self._transport.set_receiver(self._handle)
+
+    async def wait_ready(self) -> None:
+        if self._deferred is None:
+            await self._transport.wait_ready()
+            return
+        # pylint: disable=import-outside-toplevel
+        from asyncio import sleep
+
+        while not self._deferred:
+            await sleep(self._transport.poll_interval)
+
+    @property
+    def fileobjs(self) -> Tuple[Any, ...]:
+        if self._deferred is not None:
+            return ()
+        try:
+            self._transport.fileno()
+        except OSError:
+            return ()
+        return (self._transport,)
+
+    @property
+    def poll_interval(self) -> Optional[float]:  # type: ignore[override]
+        # transports without a descriptor are polled like in their wait_ready, in
+        # direct mode the receive thread wakes the controller up
+        if self._deferred is not None or self.fileobjs:
+            return None
+        return self._transport.poll_interval
 
     def _make_header_id(
         self,
@@ -81,56 +260,168 @@ class CanService(Service):
         minor_pri: int = DEFAULT_MINOR_PRIORITY.value,
         major_pri: int = DEFAULT_MAJOR_PRIORITY.value,
     ) -> int:
-        header = CanHeaderId()
-        header.f.can_id = can_id
-        header.f.minor_priority = minor_pri
-        header.f.major_priority = major_pri
-        return header.as_word
-
-    def _make_empty_message(self, can_id: int) -> Message:
-        msg = Message()
-        msg.arbitration_id = self._make_header_id(can_id)
-        msg.is_remote_frame = False
-        msg.is_extended_id = False
-        return msg
-
-    def _check_incoming_message(self) -> None:
-        msg = self._transport.recv(0)
-        if msg is None:
+        return make_header_id(can_id, minor_pri, major_pri)
+
+    def _own_header_id(
+        self,
+        minor_pri: int = DEFAULT_MINOR_PRIORITY.value,
+        major_pri: int = DEFAULT_MAJOR_PRIORITY.value,
+    ) -> int:
+        """
+        Arbitration ID for frames produced by this module.
+        """
+        return self.controller.header_ids[header_priority(minor_pri, major_pri)]
+
+    @property
+    def enumerating(self) -> bool:
+        """
+        An enumeration is collecting replies.
+        """
+        return self._enumerating
+
+    @property
+    def enumeration_required(self) -> bool:
+        """
+        A CANID clash was detected, the next :meth:`process` starts an enumeration.
+        """
+        return self._enumeration_required
+
+    def _send_frame(
+        self, arbitration_id: int, data: bytes = b"", is_remote_frame: bool = False
+    ) -> bool:
+        if isinstance(self._transport, RawCanTransport):
+            return self._transport.send_frame(
+                arbitration_id, data, is_remote_frame=is_remote_frame
+            )
+        # python-can is only needed to send through its transports
+        # pylint: disable=import-outside-toplevel
+        from can import Message
+
+        return self._transport.send(
+            Message(
+                arbitration_id=arbitration_id,
+                data=data,
+                is_extended_id=False,
+                is_remote_frame=is_remote_frame,
+            )
+        )
+
+    def start_enumeration(self) -> None:
+        """
+        Ask every module for its CANID and take a free one after the collection window.
+        """
+        if self._enumerating:
             return
-        if msg.is_extended_id:
+        self._enumerating = True
+        self._enumeration_required = False
+        self._responders = 0
+        if self._can_ids is not None:
+            # the replies come from CANIDs the filters would drop
+            self._transport.set_filters(None)
+        self._send_frame(self._own_header_id(), is_remote_frame=True)
+        self.controller.add_timer(
+            self._enum_window, self._finish_enumeration, repeat=False
+        )
+
+    def _finish_enumeration(self) -> None:
+        self._enumerating = False
+        can_id = lowest_free_can_id(self._responders)
+        if can_id is not None:
+            self.controller.can_id = can_id
+        if self._can_ids is not None:
+            self._transport.set_filters(self.can_filters)
+
+    def _set_can_id(self, can_id: int) -> None:
+        self.controller.can_id = can_id
+        if self._can_ids is not None and not self._enumerating:
+            self._transport.set_filters(self.can_filters)
+
+    def handle_message(self, data: bytes | bytearray | memoryview) -> None:
+        if len(data) < 3:
             return
-        if msg.is_remote_frame:
-            self._transport.send(self._make_empty_message(0x1234))
+        if (data[1] << 8 | data[2]) != self.controller.config.node_number:
             return
-        # controller->indicateActivity();
-        # byte remoteCANID = getCANID(canFrame.id);
-        # /// set flag if we find a CANID conflict with the frame's producer
-        # /// doesn't apply to RTR or zero-length frames, so as not to trigger an enumeration loop
-        # if (remoteCANID == controller->getModuleCANID() && canFrame.len > 0)
-        # {
-        #     // DEBUG_SERIAL << F("> CAN id clash, enumeration required") << endl;
-        #     enumeration_required = true;
-        # }
-
-        # // are we enumerating CANIDs ?
-        # if (bCANenum && canFrame.len == 0)
-        # {
-        #     // store this response in the responses array
-        #     if (remoteCANID > 0)
-        #     {
-        #     // fix to correctly record the received CANID
-        #     bitWrite(enum_responses[(remoteCANID / 8)], remoteCANID % 8, 1);
-        #     // DEBUG_SERIAL << F("> stored CANID ") << remoteCANID << F(" at index = ") << (remoteCANID / 8) << F(", bit = ") << (remoteCANID % 8) << endl;
-        #     }
-
-        #     return;
-        # }
-
-        # // The incoming CAN frame is a VLCB message.
-        # Action action = {ACT_MESSAGE_IN, {canFrame.len}};
-        # memcpy(action.vlcbMessage.data, canFrame.data, canFrame.len);
-        # controller->putAction(action);
-
-    def process(self, action) -> None:
-        self._check_incoming_message()
+        if data[0] == OPC_ENUM:
+            self.start_enumeration()
+        elif len(data) >= 4 and MIN_CAN_ID <= data[3] <= MAX_CAN_ID:
+            # CANID
+            self._set_can_id(data[3])
+
+    def _check_incoming_messages(self) -> int:
+        max_count = self._max_batch
+        if self._controller is not None:
+            # frames the action queue cannot take are left in the transport
+            max_count = min(max_count, self._controller.actions.free)
+            if max_count == 0:
+                return 0
+        msgs = self._transport.recv_many(max_count, 0)
+        handle = self._handle
+        for msg in msgs:
+            handle(msg)
+        return len(msgs)
+
+    def _handle_message(self, msg: "Message") -> None:
+        if not msg.is_rx:
+            # our own frame echoed by the bus: not a clash nor an enumeration request
+            return
+        self._handle_frame(
+            msg.arbitration_id, msg.is_extended_id, msg.is_remote_frame, msg.data
+        )
+
+    def _handle_raw_frame(self, frame: memoryview) -> None:
+        self._handle_frame(*unpack_frame(frame))
+
+    def _handle_frame(
+        self,
+        arbitration_id: int,
+        is_extended_id: bool,
+        is_remote_frame: bool,
+        data: bytearray | memoryview,
+    ) -> None:
+        if is_extended_id:
+            return
+        controller = self._controller
+        if controller is None:
+            return
+        if is_remote_frame:
+            # enumeration request from another module
+            self._send_frame(self._own_header_id())
+            return
+        remote_can_id = arbitration_id & CAN_ID_MASK
+        if not data:
+            # enumeration reply, they do not count as clashes to avoid enumeration loops
+            if self._enumerating and remote_can_id:
+                self._responders |= 1 << remote_can_id
+            return
+        if remote_can_id == controller.header_ids[0] & CAN_ID_MASK:
+            self._enumeration_required = True
+        if not controller.handles(data[0]):
+            return
+        # The incoming CAN frame is a VLCB message, copied out of the receive buffer.
+        message = bytes(data)
+        deferred = self._deferred
+        if deferred is None:
+            controller.put_action(MessageIn(message))
+        elif controller.dispatch_direct(message) and deferred.put(MessageIn(message)):
+            # the controller only needs waking for the first message
+            if len(deferred) == 1:
+                controller.wakeup()
+
+    def _process_deferred(self, deferred: ActionRing) -> None:
+        dispatch_deferred = self.controller.dispatch_deferred
+        for action in deferred.drain(self._max_batch):
+            dispatch_deferred(action.data)  # type: ignore[attr-defined]
+        if deferred:
+            # more than a batch was waiting
+            self.controller.wakeup()
+
+    def process(self, action: Action | None) -> None:
+        if action is None:
+            if self._deferred is None:
+                self._check_incoming_messages()
+            else:
+                self._process_deferred(self._deferred)
+            if self._enumeration_required:
+                self.start_enumeration()
+        elif isinstance(action, MessageOut):
+            self._send_frame(self.controller.header_ids[action.priority], action.data)
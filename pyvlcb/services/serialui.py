@@ -2,19 +2,28 @@
 TODO
 """
 
-from selectors import PollSelector, EVENT_READ
+from collections import deque
+from select import select
 from sys import stdin
+from typing import Any, Deque, Tuple
 from .service import Service, Action
 
 
 class ConsoleUIService(Service):
     """
     Console (stdin, stdout, stderr) based user interface service.
+
+    Lines are read from stdin when the controller finds it readable and handled by
+    the next :meth:`process`. When the controller is driven by calling its
+    :meth:`~pyvlcb.modules.controller.Controller.process` instead of
+    :meth:`~pyvlcb.modules.controller.Controller.run` or
+    :meth:`~pyvlcb.modules.controller.Controller.run_async`, :meth:`process` polls
+    stdin itself without blocking.
     """
 
     def __init__(self):
-        self._stdin_selector = PollSelector()
-        self._stdin_selector.register(fileobj=stdin, events=EVENT_READ)
+        self._lines: Deque[str] = deque()
+        self._eof = False
 
     @property
     def service_id(self) -> int:
@@ -27,14 +36,52 @@ class ConsoleUIService(Service):
     def begin(self) -> None:
         pass
 
+    async def wait_ready(self) -> None:
+        if self._eof:
+            await super().wait_ready()
+        # pylint: disable=import-outside-toplevel
+        from asyncio import get_running_loop
+
+        loop = get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(stdin, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(stdin)
+        self.on_readable(stdin)
+
+    @property
+    def fileobjs(self) -> Tuple[Any, ...]:
+        return () if self._eof else (stdin,)
+
+    def on_readable(self, fileobj: Any) -> None:
+        line = fileobj.readline()
+        if not line:
+            # end of input, stop watching it
+            self._eof = True
+            if self._controller is not None:
+                self._controller.unwatch(fileobj)
+            return
+        self._lines.append(line.strip("\n"))
+
     def _handle_action(self, action: Action | None) -> None:
         pass
 
     def _process_input(self) -> None:
-        for key, _ in self._stdin_selector.select(timeout=0):
-            s = key.fileobj.readline().strip("\n")
-            print(s)
+        lines = self._lines
+        while lines:
+            print(lines.popleft())
+
+    def _poll_input(self) -> None:
+        controller = self._controller
+        if self._eof or controller is None or controller.running:
+            return
+        # nobody watches stdin outside the controller loops
+        if select([stdin], [], [], 0)[0]:
+            self.on_readable(stdin)
 
     def process(self, action: Action | None) -> None:
         self._handle_action(action)
+        self._poll_input()
         self._process_input()
@@ -3,19 +3,156 @@ TODO Service
 """
 
 from abc import ABC, abstractmethod
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Mapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    from ..modules.config import Mode
+    from ..modules.controller import Controller
+
+#: Priority class (major << 2 | minor) of messages sent without one: normal, low.
+DEFAULT_PRIORITY = 0b1011
 
 
 class Action:
     """
-    TODO
+    Base class of the actions passed between services through the controller.
+
+    Actions are queued in the controller's :class:`~pyvlcb.modules.ring.ActionRing`
+    and handed to :meth:`Service.process` in batches.
+    """
+
+    __slots__ = ()
+
+
+class MessageIn(Action):
+    """
+    A VLCB message received from the bus, dispatched by op-code to
+    :meth:`Service.handle_message`.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes) -> None:
+        #: The message, starting with the op-code.
+        self.data = data
+
+
+class MessageOut(Action):
+    """
+    A VLCB message to be sent by the transport-facing service.
+    """
+
+    __slots__ = ("data", "priority")
+
+    def __init__(self, data: bytes, priority: int = DEFAULT_PRIORITY) -> None:
+        #: The message, starting with the op-code.
+        self.data = data
+        #: Priority class of the CAN frame, 0 (highest) to 15.
+        self.priority = priority
+
+
+class TimerExpired(Action):
+    """
+    A controller timer created without a callback expired.
     """
 
+    __slots__ = ("timer_id",)
+
+    def __init__(self, timer_id: int) -> None:
+        #: Identifier returned by :meth:`~pyvlcb.modules.controller.Controller.add_timer`.
+        self.timer_id = timer_id
+
+
+class ModeChange(Action):
+    """
+    The module changed its operating mode.
+    """
+
+    __slots__ = ("mode",)
+
+    def __init__(self, mode: "Mode") -> None:
+        #: The new mode.
+        self.mode = mode
+
+
+class HandlerResult(Action):
+    """
+    Outcome of a message handled on a pool by :meth:`Service.execute`, passed back to
+    :meth:`Service.handle_result` on the controller thread.
+    """
+
+    __slots__ = ("service", "data", "result", "error")
+
+    def __init__(
+        self,
+        service: "Service",
+        data: bytes,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        #: The service that handled the message.
+        self.service = service
+        #: The message, starting with the op-code.
+        self.data = data
+        #: Value returned by :meth:`Service.execute`.
+        self.result = result
+        #: Exception raised by :meth:`Service.execute`, None if it returned.
+        self.error = error
+
+
+class ExecutionPolicy(Enum):
+    """Where the controller runs the handler of a message."""
+
+    #: :meth:`Service.handle_message` on the controller thread.
+    INLINE = 0
+    #: :meth:`Service.execute` on the controller's thread pool.
+    THREAD = 1
+    #: :meth:`Service.execute` on the controller's process pool.
+    PROCESS = 2
+
 
 class Service(ABC):
     """
     Abstract Service class.
     """
 
+    #: VLCB op-codes (``OPC_*`` from :mod:`pyvlcb.vlcbdefs`) passed to :meth:`handle_message`.
+    opcodes: Tuple[int, ...] = ()
+
+    #: Seconds between :meth:`process` calls the service needs from
+    #: :meth:`~pyvlcb.modules.controller.Controller.run` when it has no :attr:`fileobjs`
+    #: to wait on, None if it only has work after a message, action or timer.
+    poll_interval: Optional[float] = None
+
+    #: :meth:`handle_message` may be called from a transport receive thread, see the
+    #: direct mode of :class:`~pyvlcb.services.can.CanService`. It may still queue
+    #: actions with :meth:`~pyvlcb.modules.controller.Controller.put_action`.
+    thread_safe: bool = False
+
+    #: How the messages of :attr:`opcodes` are handled, see :class:`ExecutionPolicy`.
+    execution: ExecutionPolicy = ExecutionPolicy.INLINE
+
+    #: Per op-code exceptions to :attr:`execution`.
+    opcode_execution: Mapping[int, ExecutionPolicy] = {}
+
+    _controller: Optional["Controller"] = None
+
+    @property
+    def controller(self) -> "Controller":
+        """
+        The controller this service belongs to.
+        """
+        if self._controller is None:
+            raise RuntimeError("service is not attached to a controller")
+        return self._controller
+
+    def set_controller(self, controller: "Controller") -> None:
+        """
+        Attach the service to its controller. Called by the controller.
+        """
+        self._controller = controller
+
     @property
     @abstractmethod
     def service_id(self) -> int:
@@ -45,12 +182,86 @@ class Service(ABC):
         """
         raise NotImplementedError
 
+    async def wait_ready(self) -> None:
+        """
+        Wait until the service has something to process.
+
+        Services without asynchronous sources of work never become ready by
+        themselves; they are still called on every controller tick.
+        """
+        # pylint: disable=import-outside-toplevel
+        from asyncio import get_running_loop
+
+        await get_running_loop().create_future()
+
+    @property
+    def fileobjs(self) -> Tuple[Any, ...]:
+        """
+        File objects or descriptors that become readable when the service has work,
+        watched by :meth:`~pyvlcb.modules.controller.Controller.run`.
+        """
+        return ()
+
+    def on_readable(self, fileobj: Any) -> None:
+        """
+        Called by :meth:`~pyvlcb.modules.controller.Controller.run` when one of
+        :attr:`fileobjs` is readable, before the services are processed.
+        """
+
+    def handle_message(self, data: bytes | bytearray | memoryview) -> None:
+        """
+        Handle a received VLCB message whose op-code is one of :attr:`opcodes`.
+
+        Args:
+            data (bytes | bytearray | memoryview): the message, starting with the op-code.
+        """
+
+    def execute(self, data: bytes) -> Any:
+        """
+        Handle a message whose execution policy is a pool, off the controller thread.
+
+        Messages about the same node number are executed one at a time and in order.
+        With :attr:`ExecutionPolicy.PROCESS` the method is pickled with its arguments,
+        so it must be overridden by a staticmethod (or replaced by a module-level
+        function); the controller refuses the default. By default it calls
+        :meth:`handle_message`.
+
+        Returns:
+            Any: the result passed back in a :class:`HandlerResult`.
+        """
+        self.handle_message(data)
+
+    def handle_result(self, result: HandlerResult) -> None:
+        """
+        Receive the outcome of :meth:`execute` on the controller thread.
+
+        By default exceptions raised by :meth:`execute` are logged, so a failing
+        handler does not stop the controller; services that want it to override this
+        and raise ``result.error``.
+        """
+        error = result.error
+        if error is None:
+            return
+        # logging is only loaded once a handler failed
+        # pylint: disable=import-outside-toplevel
+        from logging import getLogger
+
+        getLogger(__name__).error(
+            "%s failed to execute %s",
+            type(self).__name__,
+            result.data.hex(),
+            exc_info=(type(error), error, error.__traceback__),
+        )
+
     @abstractmethod
     def process(self, action: Action | None) -> None:
         """
         Process an action.
 
+        Called once per controller tick with None, and with every queued action that
+        is not a :class:`MessageIn` or :class:`HandlerResult`.
+
         Args:
-            _action (_type_): action to be performed. Could be None.
+            action (Action | None): action to be performed. Could be None.
         """
         raise NotImplementedError
@@ -2,26 +2,286 @@
 CAN Transport based on python-can package.
 """
 
-from typing import Any, Optional
+from asyncio import AbstractEventLoop, QueueEmpty, get_running_loop, wait_for
+from asyncio import TimeoutError as AsyncTimeoutError
+from collections import deque
+from enum import Enum
+from io import UnsupportedOperation
+from os import close, pipe, read, set_blocking, write
+from queue import Empty, Full, Queue
+from threading import Condition, Event, Thread
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 from can import (
+    AsyncBufferedReader,
     Bus,
     Notifier,
     SizedRotatingLogger,
-    BufferedReader,
     Message,
     Listener,
     BusABC,
 )
 from can.exceptions import CanOperationError
-from can.interfaces.serial.serial_can import SerialBus
+from .scheduler import TxDelayStats, TxScheduler
 from .transport import Transport
 
 BITRATE = 125000
 
+#: Default CAN traffic log file.
+LOG_FILENAME = "canlog.txt"
+#: Default size in bytes of a log file before it is rotated.
+LOG_MAX_BYTES = 10 * 1024**2
+#: Default number of frames the asynchronous logger can hold before dropping.
+LOG_QUEUE_SIZE = 4096
+#: Default seconds between writes of the asynchronous logger.
+LOG_FLUSH_INTERVAL = 1.0
+#: Default number of received messages the RX queue can hold.
+RX_QUEUE_SIZE = 1024
+
+
+class OverflowPolicy(Enum):
+    """What a full RX queue does with a newly received message."""
+
+    #: Discard the oldest queued message to make room.
+    DROP_OLDEST = 0
+    #: Discard the new message.
+    DROP_NEWEST = 1
+    #: Wait until the consumer makes room (back pressure into the bus).
+    BLOCK = 2
+
+
+class BoundedBufferedReader(Listener):
+    """
+    Listener queueing received messages in a bounded FIFO.
+
+    Keeps the current depth, the high-water mark and the number of messages dropped
+    by the overflow policy. Once :meth:`fileno` was called, a pipe is readable while
+    messages are queued, so the queue can be waited on with :mod:`selectors`.
+    """
+
+    def __init__(
+        self,
+        capacity: int = RX_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ) -> None:
+        super().__init__()
+        self._buffer: Deque[Message] = deque()
+        self._capacity = capacity
+        self._policy = policy
+        self._not_empty = Condition()
+        self._not_full = Condition(self._not_empty)
+        self._high_water_mark = 0
+        self._dropped_count = 0
+        self._is_stopped = False
+        self._wakeup: Optional[Tuple[int, int]] = None
+
+    @property
+    def capacity(self) -> int:
+        """
+        Maximum number of queued messages.
+        """
+        return self._capacity
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of queued messages.
+        """
+        return len(self._buffer)
+
+    @property
+    def high_water_mark(self) -> int:
+        """
+        Highest number of queued messages so far.
+        """
+        return self._high_water_mark
+
+    @property
+    def dropped_count(self) -> int:
+        """
+        Number of messages dropped because the queue was full.
+        """
+        return self._dropped_count
+
+    def fileno(self) -> int:
+        """
+        Read end of a pipe holding a byte while messages are queued.
+        """
+        with self._not_empty:
+            if self._wakeup is None:
+                self._wakeup = pipe()
+                set_blocking(self._wakeup[0], False)
+                set_blocking(self._wakeup[1], False)
+                if self._buffer:
+                    write(self._wakeup[1], b"\0")
+            return self._wakeup[0]
+
+    def _emptied(self) -> None:
+        # called with the lock held while the queue is empty, the pipe must not stay
+        # readable or selector loops would spin
+        if self._wakeup is not None:
+            try:
+                while read(self._wakeup[0], 64):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def on_message_received(self, msg: Message) -> None:
+        with self._not_empty:
+            buffer = self._buffer
+            was_empty = not buffer
+            if len(buffer) >= self._capacity:
+                if self._policy is OverflowPolicy.DROP_NEWEST:
+                    self._dropped_count += 1
+                    return
+                if self._policy is OverflowPolicy.DROP_OLDEST:
+                    buffer.popleft()
+                    self._dropped_count += 1
+                else:
+                    while len(buffer) >= self._capacity and not self._is_stopped:
+                        self._not_full.wait()
+                    was_empty = not buffer
+            buffer.append(msg)
+            # one byte per empty to non-empty transition, not per message
+            if was_empty and self._wakeup is not None:
+                write(self._wakeup[1], b"\0")
+            if len(buffer) > self._high_water_mark:
+                self._high_water_mark = len(buffer)
+            self._not_empty.notify()
+
+    def get_messages(
+        self, max_count: int, timeout: Optional[float] = 0.5
+    ) -> List[Message]:
+        """
+        Return up to max_count queued messages.
+
+        Only waits (up to timeout, None waits forever) if the queue is empty.
+        """
+        with self._not_empty:
+            buffer = self._buffer
+            if not buffer and not self._is_stopped:
+                if timeout is not None and timeout <= 0:
+                    self._emptied()
+                    return []
+                self._not_empty.wait_for(lambda: buffer or self._is_stopped, timeout)
+            count = min(max_count, len(buffer))
+            msgs = [buffer.popleft() for _ in range(count)]
+            if not buffer:
+                self._emptied()
+            if count and self._policy is OverflowPolicy.BLOCK:
+                self._not_full.notify_all()
+            return msgs
+
+    def get_message(self, timeout: Optional[float] = 0.5) -> Optional[Message]:
+        """
+        Return the oldest queued message, waiting up to timeout if there is none.
+        """
+        msgs = self.get_messages(1, timeout)
+        return msgs[0] if msgs else None
+
+    def clear(self) -> None:
+        """
+        Discard all queued messages.
+        """
+        with self._not_empty:
+            if self._buffer:
+                self._buffer.clear()
+                self._emptied()
+            self._not_full.notify_all()
+
+    def stop(self) -> None:
+        """
+        Stops waiting producers and consumers and closes the pipe.
+        """
+        with self._not_empty:
+            self._is_stopped = True
+            if self._wakeup is not None:
+                close(self._wakeup[0])
+                close(self._wakeup[1])
+                self._wakeup = None
+            self._not_empty.notify_all()
+            # producers blocked on a full queue by OverflowPolicy.BLOCK
+            self._not_full.notify_all()
+
+
+class BackgroundLogger(Listener):
+    """
+    Listener that writes messages to another listener from a background thread.
+
+    Messages are queued in a bounded in-memory queue and written in batches every
+    flush_interval seconds, so the receiving thread never waits on file I/O.
+    When the queue is full new messages are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        logger: Listener,
+        queue_size: int = LOG_QUEUE_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+    ) -> None:
+        super().__init__()
+        self._logger = logger
+        self._queue: Queue[Message] = Queue(maxsize=queue_size)
+        self._flush_interval = flush_interval
+        self._dropped_count = 0
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, name="can-logger", daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped_count(self) -> int:
+        """
+        Number of messages not logged because the queue was full.
+        """
+        return self._dropped_count
+
+    def on_message_received(self, msg: Message) -> None:
+        try:
+            self._queue.put_nowait(msg)
+        except Full:
+            self._dropped_count += 1
+
+    def _write_pending(self) -> None:
+        get_nowait = self._queue.get_nowait
+        write = self._logger.on_message_received
+        written = False
+        try:
+            while True:
+                write(get_nowait())
+                written = True
+        except Empty:
+            pass
+        if written:
+            writer = getattr(self._logger, "writer", self._logger)
+            file = getattr(writer, "file", None)
+            if file is not None:
+                file.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._flush_interval):
+            self._write_pending()
+        self._write_pending()
+
+    def stop(self) -> None:
+        """
+        Writes the pending messages and stops the logger.
+        """
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+            self._logger.stop()
+
 
 class CanTransport(Transport):
     """
     CAN Transport.
+
+    Received messages are queued in a :class:`BoundedBufferedReader` of rx_queue_size
+    messages handling overflows as rx_overflow says.
+    Received traffic is logged to log_filename (disabled if None). With log_async the
+    log is written by a :class:`BackgroundLogger` instead of the receiving thread.
+    With tx_scheduler, sent messages go through a :class:`TxScheduler` that orders them
+    by priority, retries them when the bus is busy and caps the rate to tx_rate frames
+    per second (see :func:`~pyvlcb.transports.scheduler.max_frame_rate`).
     """
 
     class CanRxCounter(Listener):
@@ -39,17 +299,84 @@ class CanTransport(Transport):
         def on_message_received(self, msg: Message) -> None:
             self._transport._rx_count += 1
 
-    def __init__(self, **kwargs: Any) -> None:
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        log_filename: Optional[str] = LOG_FILENAME,
+        log_async: bool = False,
+        log_queue_size: int = LOG_QUEUE_SIZE,
+        log_flush_interval: float = LOG_FLUSH_INTERVAL,
+        rx_queue_size: int = RX_QUEUE_SIZE,
+        rx_overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        tx_scheduler: bool = False,
+        tx_rate: Optional[float] = None,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(**kwargs)
         self._bus: BusABC
-        self._logger = SizedRotatingLogger(
-            base_filename="canlog.txt", max_bytes=10 * 1024**2, append="True"
-        )
-        self._buf_reader = BufferedReader()
+        self._rx_queue_size = rx_queue_size
+        self._rx_overflow = rx_overflow
+        self._tx_scheduler: Optional[TxScheduler] = None
+        if tx_scheduler:
+            self._tx_scheduler = TxScheduler(
+                self._send_now, max_rate=tx_rate, on_drop=self._on_tx_drop
+            )
+        self._logger: Optional[Listener] = None
+        if log_filename is not None:
+            self._logger = SizedRotatingLogger(
+                base_filename=log_filename, max_bytes=LOG_MAX_BYTES, append="True"
+            )
+            if log_async:
+                self._logger = BackgroundLogger(
+                    self._logger, log_queue_size, log_flush_interval
+                )
+        self._buf_reader = self._make_reader()
+        self._receiver: Optional[Callable[[Message], None]] = None
         self._rx_counter = self.CanRxCounter(self)
-        self._notifier = Notifier(
-            bus=self._bus, listeners=[self._logger, self._buf_reader, self._rx_counter]
+        listeners: List[Listener] = [self._buf_reader, self._rx_counter]
+        if self._logger is not None:
+            listeners.insert(0, self._logger)
+        self._notifier = self._make_notifier(listeners)
+
+    @property
+    def log_dropped_count(self) -> int:
+        """
+        Number of received messages the asynchronous logger had to drop.
+        """
+        if isinstance(self._logger, BackgroundLogger):
+            return self._logger.dropped_count
+        return 0
+
+    @property
+    def rx_queue_depth(self) -> int:
+        return self._buf_reader.depth
+
+    @property
+    def rx_queue_high_water_mark(self) -> int:
+        return self._buf_reader.high_water_mark
+
+    @property
+    def rx_drop_count(self) -> int:
+        return self._buf_reader.dropped_count
+
+    def _make_reader(self) -> Listener:
+        return BoundedBufferedReader(self._rx_queue_size, self._rx_overflow)
+
+    def _make_notifier(self, listeners: List[Listener]) -> Notifier:
+        return Notifier(bus=self._bus, listeners=listeners)
+
+    def set_receiver(self, receiver: Optional[Callable[[Message], None]]) -> None:
+        """
+        Pass received messages to receiver on the notifier thread instead of queueing
+        them. Messages received while switching may be lost, so switch before traffic
+        is expected.
+        """
+        notifier = self._notifier
+        notifier.remove_listener(
+            self._buf_reader if self._receiver is None else self._receiver
         )
+        self._receiver = receiver
+        notifier.add_listener(self._buf_reader if receiver is None else receiver)
 
     def reset(self) -> None:
         """
@@ -59,21 +386,61 @@ class CanTransport(Transport):
         self._bus.flush_tx_buffer()
         # remove rx messages
         while True:
-            if self._buf_reader.get_message(0) is None:
+            if self.recv(0) is None:
                 break
         # issue a bus reset (if exists)
         reset = getattr(self._bus, "reset")
         if reset and callable(reset):
             reset()
 
+    def set_filters(self, filters: Optional[Sequence[Dict[str, Any]]]) -> None:
+        """
+        Install acceptance filters on the bus.
+
+        On socketcan they are installed in the kernel, other interfaces filter in
+        the bus before the notifier listeners are called.
+        """
+        self._bus.set_filters(filters)  # type: ignore
+
+    def shutdown(self) -> None:
+        """
+        Stops reception and transmission and releases the bus.
+        """
+        if self._tx_scheduler is not None:
+            self._tx_scheduler.stop()
+        self._notifier.stop()
+        self._bus.shutdown()
+
+    @property
+    def tx_queue_depth(self) -> int:
+        """
+        Number of messages waiting in the TX scheduler.
+        """
+        return 0 if self._tx_scheduler is None else self._tx_scheduler.depth
+
+    @property
+    def tx_queue_delays(self) -> List[TxDelayStats]:
+        """
+        TX scheduler queueing delays indexed by priority class (empty without scheduler).
+        """
+        return [] if self._tx_scheduler is None else self._tx_scheduler.delays
+
     def status(self) -> int:
         return self._bus.state.value
 
+    def fileno(self) -> int:
+        """
+        Descriptor readable while the RX queue holds messages.
+        """
+        if not isinstance(self._buf_reader, BoundedBufferedReader):
+            raise UnsupportedOperation("fileno")
+        return self._buf_reader.fileno()
+
     def available(self) -> bool:
         """
         Check if there is at least one message in the RX queue.
         """
-        return not self._buf_reader.buffer.empty()
+        return self._buf_reader.depth > 0
 
     def recv(self, timeout: Optional[float] = 0.0) -> Optional[Message]:
         """
@@ -81,18 +448,42 @@ class CanTransport(Transport):
         """
         return self._buf_reader.get_message(timeout)  # type: ignore
 
-    def send(self, msg: Message, timeout: int = 0) -> bool:
+    def recv_many(
+        self, max_frames: int, timeout: Optional[float] = 0.0
+    ) -> List[Message]:
         """
-        Sends a message.
+        Return up to max_frames messages from the RX queue.
+
+        The first message is waited for up to timeout, the remaining ones are drained
+        straight from the queue without blocking.
         """
+        if max_frames <= 0:
+            return []
+        return self._buf_reader.get_messages(max_frames, timeout)
+
+    def _send_now(self, msg: Message, timeout: int = 0) -> bool:
         try:
             self._bus.send(msg, timeout)
             self._tx_count += 1
             return True
         except CanOperationError:
-            self._tx_error_count += 1
             return False
 
+    def _on_tx_drop(self, _msg: Message) -> None:
+        self._tx_error_count += 1
+
+    def send(self, msg: Message, timeout: int = 0) -> bool:
+        """
+        Sends a message, or queues it if the TX scheduler is enabled.
+        """
+        if self._tx_scheduler is not None:
+            self._tx_scheduler.put(msg)
+            return True
+        if self._send_now(msg, timeout):
+            return True
+        self._tx_error_count += 1
+        return False
+
 
 class CanTransportOverSerial(CanTransport):
     """
@@ -100,8 +491,11 @@ class CanTransportOverSerial(CanTransport):
     """
 
     def __init__(self, device: str, **kwargs: Any) -> None:
+        # pylint: disable=import-outside-toplevel
+        from can.interfaces.serial.serial_can import SerialBus
+
+        self._bus: BusABC = SerialBus(device, bitrate=BITRATE)
         super().__init__(**kwargs)
-        self._bus = SerialBus(device, bitrate=BITRATE)
 
 
 class CanTransportOverSocketcan(CanTransport):
@@ -128,3 +522,113 @@ class CanTransportOverVirtual(CanTransport):
             "test", interface="virtual", bitrate=BITRATE, receive_own_messages=True
         )
         super().__init__(**kwargs)
+
+
+class AsyncCanTransport(CanTransport):
+    """
+    CAN Transport for use with :mod:`asyncio`.
+
+    Received messages are delivered inside the event loop: buses with a file descriptor
+    (socketcan) are watched with ``loop.add_reader``, the rest are read by the notifier
+    thread and handed over to an :class:`~can.AsyncBufferedReader`, whose queue is not
+    bounded.
+    """
+
+    def __init__(
+        self, *args: Any, loop: Optional[AbstractEventLoop] = None, **kwargs: Any
+    ) -> None:
+        self._loop = loop if loop is not None else get_running_loop()
+        self._pending: Deque[Message] = deque()
+        super().__init__(*args, **kwargs)
+
+    def _make_reader(self) -> Listener:
+        return AsyncBufferedReader()
+
+    def _make_notifier(self, listeners: List[Listener]) -> Notifier:
+        return Notifier(bus=self._bus, listeners=listeners, loop=self._loop)
+
+    @property
+    def rx_queue_depth(self) -> int:
+        return len(self._pending) + self._buf_reader.buffer.qsize()
+
+    @property
+    def rx_queue_high_water_mark(self) -> int:
+        return 0
+
+    @property
+    def rx_drop_count(self) -> int:
+        return 0
+
+    def available(self) -> bool:
+        return bool(self._pending) or not self._buf_reader.buffer.empty()
+
+    def recv(self, timeout: Optional[float] = 0.0) -> Optional[Message]:
+        """
+        Return the first message in the RX queue without waiting.
+
+        Use :meth:`recv_async` to wait for a message.
+        """
+        if self._pending:
+            return self._pending.popleft()
+        try:
+            return self._buf_reader.buffer.get_nowait()
+        except QueueEmpty:
+            return None
+
+    def recv_many(
+        self, max_frames: int, timeout: Optional[float] = 0.0
+    ) -> List[Message]:
+        """
+        Return up to max_frames messages from the RX queue without waiting.
+        """
+        msgs: List[Message] = []
+        pending = self._pending
+        while pending and len(msgs) < max_frames:
+            msgs.append(pending.popleft())
+        get_nowait = self._buf_reader.buffer.get_nowait
+        try:
+            while len(msgs) < max_frames:
+                msgs.append(get_nowait())
+        except QueueEmpty:
+            pass
+        return msgs
+
+    async def recv_async(self, timeout: Optional[float] = None) -> Optional[Message]:
+        """
+        Wait for the first message in the RX queue.
+
+        Args:
+            timeout (float | None): seconds to wait, None waits forever.
+
+        Returns:
+            Message | None: the message or None if timeout expired.
+        """
+        if self._pending:
+            return self._pending.popleft()
+        try:
+            return await wait_for(self._buf_reader.get_message(), timeout)
+        except AsyncTimeoutError:
+            return None
+
+    async def wait_ready(self) -> None:
+        if self.available():
+            return
+        self._pending.append(await self._buf_reader.get_message())
+
+
+class AsyncCanTransportOverSerial(AsyncCanTransport, CanTransportOverSerial):
+    """
+    Asyncio CAN transport using serial device.
+    """
+
+
+class AsyncCanTransportOverSocketcan(AsyncCanTransport, CanTransportOverSocketcan):
+    """
+    Asyncio CAN transport using socketcan.
+    """
+
+
+class AsyncCanTransportOverVirtual(AsyncCanTransport, CanTransportOverVirtual):
+    """
+    Asyncio CAN transport using a virtual bus.
+    """
@@ -0,0 +1,235 @@
+"""
+CAN Transport reading raw frames from a Linux AF_CAN socket.
+
+It avoids python-can's bus, notifier thread and per frame :class:`can.Message` objects:
+frames are received straight into a preallocated buffer and handed out as
+``memoryview`` slices of ``struct can_frame``.
+"""
+
+from select import select
+from socket import (
+    AF_CAN,
+    CAN_EFF_FLAG,
+    CAN_EFF_MASK,
+    CAN_RAW,
+    CAN_RAW_FILTER,
+    CAN_RTR_FLAG,
+    CAN_SFF_MASK,
+    SOCK_RAW,
+    SOL_CAN_RAW,
+    socket,
+)
+from struct import Struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .transport import Transport
+
+#: Layout of a classic ``struct can_frame``: id, length, padding and data.
+CAN_FRAME = Struct("<IB3x8s")
+#: Size in bytes of a ``struct can_frame``.
+CAN_FRAME_SIZE = CAN_FRAME.size
+#: Maximum payload length of a classic CAN frame.
+CAN_MAX_DLEN = 8
+#: Number of frames that fit the receive buffer by default.
+DEFAULT_RX_FRAMES = 64
+
+_CAN_ID = Struct("<I")
+_CAN_FILTER = Struct("<II")
+
+
+def pack_filters(filters: Optional[Sequence[Dict[str, Any]]]) -> bytes:
+    """
+    Pack python-can style filters as an array of ``struct can_filter``.
+
+    Args:
+        filters (Sequence[Dict[str, Any]] | None): the filters, None accepts everything.
+
+    Returns:
+        bytes: value for the ``CAN_RAW_FILTER`` socket option.
+    """
+    if not filters:
+        return _CAN_FILTER.pack(0, 0)
+    packed = bytearray()
+    for can_filter in filters:
+        can_id = can_filter["can_id"]
+        can_mask = can_filter["can_mask"]
+        if "extended" in can_filter:
+            can_mask |= CAN_EFF_FLAG
+            if can_filter["extended"]:
+                can_id |= CAN_EFF_FLAG
+        packed += _CAN_FILTER.pack(can_id, can_mask)
+    return bytes(packed)
+
+
+def unpack_frame(frame: memoryview) -> Tuple[int, bool, bool, memoryview]:
+    """
+    Split a raw ``struct can_frame`` without copying its payload.
+
+    Args:
+        frame (memoryview): the raw frame.
+
+    Returns:
+        Tuple[int, bool, bool, memoryview]: arbitration id, extended flag, remote flag and data.
+    """
+    can_id = _CAN_ID.unpack_from(frame)[0]
+    if can_id & CAN_EFF_FLAG:
+        arbitration_id = can_id & CAN_EFF_MASK
+    else:
+        arbitration_id = can_id & CAN_SFF_MASK
+    return (
+        arbitration_id,
+        bool(can_id & CAN_EFF_FLAG),
+        bool(can_id & CAN_RTR_FLAG),
+        frame[8 : 8 + frame[4]],
+    )
+
+
+class RawCanTransport(Transport):
+    """
+    CAN transport over a raw socketcan socket.
+
+    Received frames are ``memoryview`` slices of an internal buffer; they are only valid
+    until the next receive call, so copy them if they must be kept.
+    """
+
+    def __init__(
+        self,
+        channel: Optional[str] = None,
+        rx_frames: int = DEFAULT_RX_FRAMES,
+        sock: Optional[socket] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        if sock is None:
+            sock = socket(AF_CAN, SOCK_RAW, CAN_RAW)
+            sock.bind((channel,))
+        sock.setblocking(False)
+        self._sock = sock
+        self._rx_buffer = bytearray(CAN_FRAME_SIZE * rx_frames)
+        view = memoryview(self._rx_buffer)
+        self._rx_slots: List[memoryview] = [
+            view[i * CAN_FRAME_SIZE : (i + 1) * CAN_FRAME_SIZE]
+            for i in range(rx_frames)
+        ]
+        self._tx_buffer = bytearray(CAN_FRAME_SIZE)
+
+    def fileno(self) -> int:
+        """
+        File descriptor of the socket.
+        """
+        return self._sock.fileno()
+
+    def reset(self) -> None:
+        """
+        Discards all received frames.
+        """
+        while self.recv_many(len(self._rx_slots)):
+            pass
+
+    def set_filters(self, filters: Optional[Sequence[Dict[str, Any]]]) -> None:
+        """
+        Install acceptance filters in the kernel.
+        """
+        self._sock.setsockopt(SOL_CAN_RAW, CAN_RAW_FILTER, pack_filters(filters))
+
+    def shutdown(self) -> None:
+        """
+        Closes the socket.
+        """
+        self._sock.close()
+
+    def status(self) -> int:
+        return 0
+
+    def available(self) -> bool:
+        return bool(select([self._sock], [], [], 0)[0])
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        if timeout is not None and timeout <= 0:
+            return True
+        return bool(select([self._sock], [], [], timeout)[0])
+
+    def recv(self, timeout: Optional[float] = 0.0) -> Optional[memoryview]:
+        """
+        Return the next raw frame.
+        """
+        frames = self.recv_many(1, timeout)
+        return frames[0] if frames else None
+
+    def recv_many(
+        self, max_frames: int, timeout: Optional[float] = 0.0
+    ) -> List[memoryview]:
+        """
+        Return up to max_frames raw frames, limited by the size of the receive buffer.
+
+        The first frame is waited for up to timeout, the rest are read while the socket
+        has frames queued.
+        """
+        frames: List[memoryview] = []
+        if max_frames <= 0 or not self._wait(timeout):
+            return frames
+        recv_into = self._sock.recv_into
+        for slot in self._rx_slots[:max_frames]:
+            try:
+                nbytes = recv_into(slot)
+            except BlockingIOError:
+                break
+            except OSError:
+                self._rx_error_count += 1
+                break
+            if nbytes == CAN_FRAME_SIZE:
+                frames.append(slot)
+        self._rx_count += len(frames)
+        return frames
+
+    async def wait_ready(self) -> None:
+        if self.available():
+            return
+        # pylint: disable=import-outside-toplevel
+        from asyncio import get_running_loop
+
+        loop = get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self._sock, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(self._sock)
+
+    def send_frame(
+        self,
+        arbitration_id: int,
+        data: bytes | bytearray | memoryview = b"",
+        is_extended_id: bool = False,
+        is_remote_frame: bool = False,
+    ) -> bool:
+        """
+        Sends a frame.
+
+        Raises:
+            ValueError: data is longer than :data:`CAN_MAX_DLEN` bytes.
+        """
+        if len(data) > CAN_MAX_DLEN:
+            raise ValueError(
+                f"data length {len(data)} exceeds the {CAN_MAX_DLEN} bytes of a CAN frame"
+            )
+        can_id = arbitration_id
+        if is_extended_id:
+            can_id |= CAN_EFF_FLAG
+        if is_remote_frame:
+            can_id |= CAN_RTR_FLAG
+        CAN_FRAME.pack_into(self._tx_buffer, 0, can_id, len(data), bytes(data))
+        try:
+            self._sock.send(self._tx_buffer)
+            self._tx_count += 1
+            return True
+        except OSError:
+            self._tx_error_count += 1
+            return False
+
+    def send(self, msg: Any, timeout: int = 0) -> bool:
+        """
+        Sends a :class:`can.Message` (or any object with the same attributes).
+        """
+        return self.send_frame(
+            msg.arbitration_id, msg.data, msg.is_extended_id, msg.is_remote_frame
+        )
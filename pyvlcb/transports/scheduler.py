@@ -0,0 +1,161 @@
+"""
+Priority aware transmit scheduler for CAN transports.
+"""
+
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Any, Callable, List, Optional, Tuple
+
+#: Number of priority classes: 2 bits of major and 2 bits of minor priority.
+NUM_PRIORITIES = 16
+#: Seconds to wait before retrying a frame the bus did not accept.
+TX_RETRY_DELAY = 0.001
+#: Number of retries before a frame is dropped.
+TX_RETRY_LIMIT = 100
+#: Worst case length in bits of a standard frame with 8 data bytes and bit stuffing.
+MAX_FRAME_BITS = 135
+
+
+def max_frame_rate(bitrate: int) -> float:
+    """
+    Frames per second a bus can carry in the worst case.
+
+    Args:
+        bitrate (int): bus bitrate.
+
+    Returns:
+        float: frames per second.
+    """
+    return bitrate / MAX_FRAME_BITS
+
+
+def frame_priority(msg: Any) -> int:
+    """
+    Priority class of a frame, 0 is the highest.
+
+    The major and minor priorities are the top 4 bits of the standard identifier,
+    which are also the top bits of an extended one.
+    """
+    if msg.is_extended_id:
+        return (msg.arbitration_id >> 25) & 0xF
+    return (msg.arbitration_id >> 7) & 0xF
+
+
+@dataclass
+class TxDelayStats:
+    """Queueing delay of a priority class."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """Mean delay in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, delay: float) -> None:
+        """Account for a frame sent after waiting delay seconds."""
+        self.count += 1
+        self.total += delay
+        if delay > self.max:
+            self.max = delay
+
+
+class TxScheduler:
+    """
+    Sends frames from a background thread in priority order.
+
+    Frames wait in a priority queue keyed on their 4 bit priority, so emergency
+    traffic overtakes queued bulk traffic. A frame the bus does not accept (send
+    returns False, e.g. ENOBUFS) is put back in the queue and retried after
+    retry_delay seconds; it is dropped after retry_limit retries. The sending rate
+    can be capped to max_rate frames per second.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        send: Callable[[Any], bool],
+        max_rate: Optional[float] = None,
+        retry_delay: float = TX_RETRY_DELAY,
+        retry_limit: int = TX_RETRY_LIMIT,
+        on_drop: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self._send = send
+        self._interval = 1.0 / max_rate if max_rate else 0.0
+        self._retry_delay = retry_delay
+        self._retry_limit = retry_limit
+        self._on_drop = on_drop
+        self._queue: List[Tuple[int, int, float, int, Any]] = []
+        self._seq = count()
+        self._cond = Condition()
+        self._stopped = False
+        self._delays = [TxDelayStats() for _ in range(NUM_PRIORITIES)]
+        self._thread = Thread(target=self._run, name="can-tx", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of frames waiting to be sent.
+        """
+        return len(self._queue)
+
+    @property
+    def delays(self) -> List[TxDelayStats]:
+        """
+        Queueing delay statistics indexed by priority class.
+        """
+        return self._delays
+
+    def put(self, msg: Any) -> None:
+        """
+        Queue a frame for transmission.
+        """
+        with self._cond:
+            heappush(
+                self._queue, (frame_priority(msg), next(self._seq), monotonic(), 0, msg)
+            )
+            self._cond.notify()
+
+    def _next(self) -> Optional[Tuple[int, int, float, int, Any]]:
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            return heappop(self._queue)
+
+    def _run(self) -> None:
+        next_time = 0.0
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            priority, seq, queued, retries, msg = item
+            if self._interval:
+                delay = next_time - monotonic()
+                if delay > 0:
+                    sleep(delay)
+            if self._send(msg):
+                self._delays[priority].add(monotonic() - queued)
+                next_time = monotonic() + self._interval
+            elif retries < self._retry_limit:
+                with self._cond:
+                    heappush(self._queue, (priority, seq, queued, retries + 1, msg))
+                sleep(self._retry_delay)
+            elif self._on_drop is not None:
+                self._on_drop(msg)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Send the queued frames and stop the sending thread.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
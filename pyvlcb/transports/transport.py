@@ -1,8 +1,26 @@
 """
-TODO
+Base class of the transports carrying VLCB messages.
+
+A transport has to implement :meth:`Transport.reset`, :meth:`Transport.available`,
+:meth:`Transport.recv` and :meth:`Transport.status`; the rest of the receive API is
+built on them and overridden where the transport can do better:
+
+* :meth:`Transport.recv_many` and :meth:`Transport.iter_recv` return the messages
+  already waiting in batches, waiting only for the first one;
+* :meth:`Transport.wait_ready` awaits a message from :mod:`asyncio`, polling
+  :meth:`Transport.available` unless the transport can be awaited natively;
+* :meth:`Transport.fileno` gives a descriptor for :mod:`selectors` and
+  :meth:`Transport.set_receiver` hands messages over on the receive thread, for
+  transports having one or the other;
+* :meth:`Transport.set_filters` drops unwanted messages as early as possible.
+
+The counters and RX queue metrics (depth, high-water mark, drops) report zero for
+transports without a queue.
 """
 
 from abc import ABC, abstractmethod
+from io import UnsupportedOperation
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
 
 class Transport(ABC):
@@ -10,6 +28,9 @@ class Transport(ABC):
     Abstract Transport class.
     """
 
+    #: Seconds between checks of :meth:`available` in the default :meth:`wait_ready`.
+    poll_interval: float = 0.01
+
     def __init__(self) -> None:
         super().__init__()
         self._rx_count: int = 0
@@ -24,6 +45,95 @@ class Transport(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def available(self) -> bool:
+        """
+        Check if there is at least one message waiting to be received.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def recv(self, timeout: Optional[float] = 0.0) -> Optional[Any]:
+        """
+        Return the first received message, or None if nothing arrived within timeout.
+        """
+        raise NotImplementedError
+
+    def fileno(self) -> int:
+        """
+        File descriptor that is readable while messages are waiting to be received,
+        for use with :mod:`selectors`.
+
+        Raises:
+            UnsupportedOperation: the transport has no such descriptor.
+        """
+        raise UnsupportedOperation("fileno")
+
+    def set_receiver(self, receiver: Optional[Callable[[Any], None]]) -> None:
+        """
+        Pass received messages to receiver on the transport's receive thread instead
+        of queueing them for :meth:`recv`. None queues them again.
+
+        Raises:
+            NotImplementedError: the transport has no receive thread.
+        """
+        raise NotImplementedError("transport has no receive thread")
+
+    def recv_many(self, max_frames: int, timeout: Optional[float] = 0.0) -> List[Any]:
+        """
+        Return up to max_frames received messages in arrival order.
+
+        Only the first message is waited for (up to timeout); the rest of the batch
+        is whatever is already queued, so the call never blocks once a message arrived.
+
+        Args:
+            max_frames (int): maximum number of messages to return.
+            timeout (float | None): seconds to wait for the first message.
+
+        Returns:
+            List[Any]: the received messages, empty if none arrived in time.
+        """
+        msgs: List[Any] = []
+        if max_frames <= 0:
+            return msgs
+        msg = self.recv(timeout)
+        while msg is not None:
+            msgs.append(msg)
+            if len(msgs) >= max_frames:
+                break
+            msg = self.recv(0)
+        return msgs
+
+    def set_filters(self, filters: Optional[Sequence[Dict[str, Any]]]) -> None:
+        """
+        Install acceptance filters, so unwanted messages are dropped as early as possible.
+
+        Filters use python-can's format: a sequence of dictionaries with ``can_id``,
+        ``can_mask`` and optional ``extended`` keys. None accepts every message.
+        Transports without filtering support accept every message.
+        """
+
+    async def wait_ready(self) -> None:
+        """
+        Wait until there is at least one message waiting to be received.
+
+        Transports that can be awaited natively override this; the default polls
+        :meth:`available` every :attr:`poll_interval` seconds.
+        """
+        # pylint: disable=import-outside-toplevel
+        from asyncio import sleep
+
+        while not self.available():
+            await sleep(self.poll_interval)
+
+    def iter_recv(
+        self, max_frames: int, timeout: Optional[float] = 0.0
+    ) -> Iterator[Any]:
+        """
+        Iterate over the messages returned by :meth:`recv_many`.
+        """
+        yield from self.recv_many(max_frames, timeout)
+
     @property
     def rx_count(self) -> int:
         """
@@ -45,6 +155,27 @@ class Transport(ABC):
         """
         return self._rx_error_count
 
+    @property
+    def rx_queue_depth(self) -> int:
+        """
+        Number of received messages waiting to be processed.
+        """
+        return 0
+
+    @property
+    def rx_queue_high_water_mark(self) -> int:
+        """
+        Highest number of received messages that have been waiting at once.
+        """
+        return 0
+
+    @property
+    def rx_drop_count(self) -> int:
+        """
+        Number of received messages dropped because the RX queue was full.
+        """
+        return 0
+
     @property
     def tx_error_count(self) -> int:
         """
@@ -1,12 +1,43 @@
 #!/usr/bin/env python
 """Tests for `pyvlcb` package."""
+
 # pylint: disable=redefined-outer-name
 
 
 import time
+from asyncio import run, wait_for
+from shutil import copyfile
+from select import select
+from socket import AF_UNIX, SOCK_DGRAM, socketpair
+from threading import Event, Thread
+
+import pytest
 from can import Message
-from pyvlcb.transports.can import CanTransportOverVirtual
-from pyvlcb.services.can import CanService
+from pyvlcb.transports.can import (
+    AsyncCanTransportOverVirtual,
+    BoundedBufferedReader,
+    CanTransportOverVirtual,
+    OverflowPolicy,
+)
+from pyvlcb.transports.scheduler import TxScheduler, frame_priority, max_frame_rate
+from pyvlcb.transports.rawcan import (
+    CAN_FRAME,
+    RawCanTransport,
+    pack_filters,
+    unpack_frame,
+)
+from pyvlcb.modules.controller import Controller
+from pyvlcb.services.service import MessageOut
+from pyvlcb.services.can import (
+    CAN_RTR_FLAG,
+    MAX_CAN_ID,
+    CanService,
+    decode_header_id,
+    header_priority,
+    lowest_free_can_id,
+    make_header_id,
+)
+from pyvlcb.vlcbdefs import OPC_ACON, OPC_CANID, OPC_ENUM
 
 
 class TestCan:
@@ -32,6 +63,151 @@ class TestCan:
         assert msg_in.arbitration_id == msg_out.arbitration_id
         assert msg_in.data == msg_out.data
 
+    def test_bounded_reader(self) -> None:
+        """
+        Bounded RX queue policies test
+        """
+        reader = BoundedBufferedReader(2, OverflowPolicy.DROP_OLDEST)
+        for i in range(3):
+            reader.on_message_received(Message(arbitration_id=i))
+        assert reader.depth == 2
+        assert reader.high_water_mark == 2
+        assert reader.dropped_count == 1
+        assert [msg.arbitration_id for msg in reader.get_messages(8, 0)] == [1, 2]
+        assert reader.get_message(0) is None
+        reader = BoundedBufferedReader(2, OverflowPolicy.DROP_NEWEST)
+        for i in range(3):
+            reader.on_message_received(Message(arbitration_id=i))
+        assert reader.dropped_count == 1
+        assert [msg.arbitration_id for msg in reader.get_messages(8, 0)] == [0, 1]
+        reader = BoundedBufferedReader(1, OverflowPolicy.BLOCK)
+        reader.on_message_received(Message(arbitration_id=0))
+        producer = Thread(
+            target=reader.on_message_received, args=(Message(arbitration_id=1),)
+        )
+        producer.start()
+        producer.join(0.05)
+        assert producer.is_alive()
+        assert reader.get_message(0).arbitration_id == 0
+        producer.join(1.0)
+        assert reader.get_message(0).arbitration_id == 1
+        assert reader.dropped_count == 0
+        reader.stop()
+        assert reader.get_message(None) is None
+        # stopping releases a producer blocked on a full queue
+        reader = BoundedBufferedReader(1, OverflowPolicy.BLOCK)
+        reader.on_message_received(Message(arbitration_id=0))
+        producer = Thread(
+            target=reader.on_message_received, args=(Message(arbitration_id=1),)
+        )
+        producer.start()
+        producer.join(0.05)
+        assert producer.is_alive()
+        reader.stop()
+        producer.join(1.0)
+        assert not producer.is_alive()
+
+    def test_bounded_reader_fileno(self) -> None:
+        """
+        RX queue wakeup pipe test
+        """
+        reader = BoundedBufferedReader(4)
+        reader.on_message_received(Message(arbitration_id=0))
+        fd = reader.fileno()
+        assert select([fd], [], [], 0)[0]
+        reader.on_message_received(Message(arbitration_id=1))
+        assert len(reader.get_messages(1, 0)) == 1
+        assert select([fd], [], [], 0)[0]
+        assert len(reader.get_messages(8, 0)) == 1
+        assert not select([fd], [], [], 0)[0]
+        reader.on_message_received(Message(arbitration_id=2))
+        assert select([fd], [], [], 0)[0]
+        reader.clear()
+        assert not select([fd], [], [], 0)[0]
+        reader.stop()
+        # overflowing a full queue does not add wakeups
+        reader = BoundedBufferedReader(1, OverflowPolicy.DROP_OLDEST)
+        fd = reader.fileno()
+        for i in range(100):
+            reader.on_message_received(Message(arbitration_id=i))
+        assert reader.dropped_count == 99
+        assert [msg.arbitration_id for msg in reader.get_messages(8, 0)] == [99]
+        assert not select([fd], [], [], 0)[0]
+        assert reader.get_messages(8, 0) == []
+        assert not select([fd], [], [], 0)[0]
+        reader.stop()
+
+    def test_can_transport_rx_queue(self) -> None:
+        """
+        RX queue metrics test
+        """
+        transport = CanTransportOverVirtual(
+            rx_queue_size=2, rx_overflow=OverflowPolicy.DROP_NEWEST
+        )
+        for i in range(3):
+            transport.send(Message(arbitration_id=i))
+        time.sleep(0.01)
+        assert transport.rx_count == 3
+        assert transport.rx_queue_depth == 2
+        assert transport.rx_queue_high_water_mark == 2
+        assert transport.rx_drop_count == 1
+        assert len(transport.recv_many(8)) == 2
+        assert transport.rx_queue_depth == 0
+
+    def test_tx_scheduler(self) -> None:
+        """
+        Priority TX scheduler test
+        """
+        assert (
+            frame_priority(Message(arbitration_id=0x585, is_extended_id=False))
+            == 0b1011
+        )
+        assert (
+            frame_priority(Message(arbitration_id=0b0110 << 25, is_extended_id=True))
+            == 0b0110
+        )
+        assert 900 < max_frame_rate(125000) < 1000
+        gate = Event()
+        sent = []
+        failures = [2]
+
+        def send(msg: Message) -> bool:
+            gate.wait()
+            if msg.arbitration_id == 0x580 and failures[0]:
+                failures[0] -= 1
+                return False
+            sent.append(msg.arbitration_id)
+            return True
+
+        dropped = []
+        scheduler = TxScheduler(send, retry_delay=0.0, on_drop=dropped.append)
+        scheduler.put(Message(arbitration_id=0x500, is_extended_id=False))
+        time.sleep(0.01)
+        for arbitration_id in (0x580, 0x100, 0x000, 0x300):
+            scheduler.put(Message(arbitration_id=arbitration_id, is_extended_id=False))
+        assert scheduler.depth == 4
+        gate.set()
+        scheduler.stop(1.0)
+        assert sent == [0x500, 0x000, 0x100, 0x300, 0x580]
+        assert not dropped
+        assert scheduler.delays[0b1011].count == 1
+        assert scheduler.delays[0].count == 1
+        assert scheduler.delays[0].max >= scheduler.delays[0].mean > 0
+
+    def test_can_transport_tx_scheduler(self) -> None:
+        """
+        CAN transport with TX scheduler test
+        """
+        transport = CanTransportOverVirtual(tx_scheduler=True, tx_rate=1000)
+        for i in range(3):
+            assert transport.send(Message(arbitration_id=i))
+        time.sleep(0.05)
+        assert transport.tx_count == 3
+        assert transport.tx_queue_depth == 0
+        assert transport.tx_queue_delays[0].count == 3
+        assert len(transport.recv_many(8)) == 3
+        transport.shutdown()
+
     # pylint: disable=protected-access
     def test_can_service(self) -> None:
         """
@@ -42,10 +218,292 @@ class TestCan:
         assert can_service is not None
         header = can_service._make_header_id(0x12, 0b01, 0b10)
         assert header == (0b10 << 9) | (0b01 << 7) | 0x12
-        empty_header = can_service._make_header_id(0x12)
-        msg = can_service._make_empty_message(0x12)
-        assert msg.arbitration_id == empty_header
-        assert msg.is_extended_id is False
-        assert msg.is_error_frame is False
-        assert msg.is_remote_frame is False
-        assert msg.data == bytearray()
+        assert can_service._make_header_id(0x12) == (0b1011 << 7) | 0x12
+
+    def test_can_transport_recv_many(self) -> None:
+        """
+        Batched receive test
+        """
+        transport = CanTransportOverVirtual()
+        assert transport.recv_many(8) == []
+        for i in range(5):
+            transport.send(Message(arbitration_id=i, data=[i]))
+        time.sleep(0.01)
+        msgs = transport.recv_many(3)
+        assert [msg.arbitration_id for msg in msgs] == [0, 1, 2]
+        msgs = list(transport.iter_recv(8))
+        assert [msg.arbitration_id for msg in msgs] == [3, 4]
+        assert not transport.available()
+        assert transport.recv_many(0) == []
+
+    def test_header_tables(self) -> None:
+        """
+        CAN header encode/decode tables test
+        """
+        for arbitration_id in range(0x600):
+            fields = (
+                arbitration_id & 0x7F,
+                (arbitration_id >> 7) & 0x3,
+                (arbitration_id >> 9) & 0x3,
+            )
+            assert decode_header_id(arbitration_id) == fields
+            assert make_header_id(*fields) == arbitration_id
+        assert make_header_id(0x1234, 0b111, 0b110) == make_header_id(0x34, 0b11, 0b10)
+        assert header_priority(0b01, 0b10) == 0b1001
+
+    # pylint: disable=protected-access
+    def test_can_service_batch(self) -> None:
+        """
+        CAN Service batched processing test
+        """
+        transport = CanTransportOverVirtual()
+        can_service = CanService(transport, max_batch=4)
+        for i in range(6):
+            transport.send(Message(arbitration_id=i, data=[i], is_extended_id=True))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 4
+        assert can_service._check_incoming_messages() == 2
+        assert can_service._check_incoming_messages() == 0
+
+    def test_can_transport_logging(self, tmp_path) -> None:
+        """
+        CAN traffic logging modes test
+        """
+        transport = CanTransportOverVirtual(log_filename=None)
+        assert transport._logger is None  # pylint: disable=protected-access
+        assert transport.log_dropped_count == 0
+        transport.shutdown()
+        log_file = tmp_path / "canlog.txt"
+        transport = CanTransportOverVirtual(
+            log_filename=str(log_file), log_async=True, log_flush_interval=0.01
+        )
+        for i in range(3):
+            transport.send(Message(arbitration_id=i, data=[i]))
+        time.sleep(0.05)
+        assert len(log_file.read_text().splitlines()) == 3
+        transport.shutdown()
+        assert transport.log_dropped_count == 0
+        transport = CanTransportOverVirtual(
+            log_filename=str(log_file), log_async=True, log_queue_size=2
+        )
+        for i in range(5):
+            transport.send(Message(arbitration_id=i, data=[i]))
+        time.sleep(0.01)
+        assert transport.log_dropped_count == 3
+        transport.shutdown()
+        assert len(log_file.read_text().splitlines()) == 5
+
+    def test_async_can_transport(self) -> None:
+        """
+        Asyncio transport test
+        """
+
+        async def exchange() -> None:
+            transport = AsyncCanTransportOverVirtual()
+            assert transport.recv() is None
+            assert await transport.recv_async(0.01) is None
+            transport.send(Message(arbitration_id=0x10, data=[1]))
+            transport.send(Message(arbitration_id=0x11, data=[2]))
+            await wait_for(transport.wait_ready(), 1.0)
+            assert transport.available()
+            msgs = transport.recv_many(8)
+            if len(msgs) < 2:
+                msgs.append(await transport.recv_async(1.0))
+            assert [msg.arbitration_id for msg in msgs] == [0x10, 0x11]
+            assert transport.rx_count == 2
+            transport.shutdown()
+
+        run(exchange())
+
+    def test_raw_can_transport(self) -> None:
+        """
+        Raw socket transport test
+        """
+        sock, peer = socketpair(AF_UNIX, SOCK_DGRAM)
+        transport = RawCanTransport(sock=sock, rx_frames=4)
+        assert transport.recv() is None
+        assert not transport.available()
+        for i in range(6):
+            peer.send(CAN_FRAME.pack(0x100 + i, 2, bytes([i, i + 1])))
+        assert transport.available()
+        frames = transport.recv_many(8)
+        assert len(frames) == 4
+        assert all(isinstance(frame, memoryview) for frame in frames)
+        arbitration_id, is_extended_id, is_remote_frame, data = unpack_frame(frames[3])
+        assert arbitration_id == 0x103
+        assert not is_extended_id and not is_remote_frame
+        assert bytes(data) == bytes([3, 4])
+        frame = transport.recv(0)
+        assert unpack_frame(frame)[0] == 0x104
+        assert transport.rx_count == 5
+        assert transport.send(
+            Message(arbitration_id=0x1FFFF, data=[9], is_extended_id=True)
+        )
+        can_id, length, data = CAN_FRAME.unpack(peer.recv(64))
+        assert can_id == 0x1FFFF | 0x80000000
+        assert data[:length] == bytes([9])
+        assert transport.tx_count == 1
+        with pytest.raises(ValueError):
+            transport.send_frame(0x100, bytes(9))
+        assert transport.tx_count == 1
+        transport.reset()
+        assert not transport.available()
+        transport.shutdown()
+        peer.close()
+
+    # pylint: disable=protected-access
+    def test_can_service_raw(self, tmp_path) -> None:
+        """
+        CAN Service over raw socket transport test
+        """
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        sock, peer = socketpair(AF_UNIX, SOCK_DGRAM)
+        can_service = CanService(RawCanTransport(sock=sock))
+        controller = Controller([can_service], tmp_path / "config.json")
+        controller.can_id = 5
+        peer.send(CAN_FRAME.pack(0x12 | 0x80000000, 0, bytes(8)))
+        peer.send(CAN_FRAME.pack(0x12 | 0x40000000, 0, bytes(8)))
+        assert can_service._check_incoming_messages() == 2
+        can_id, length, _ = CAN_FRAME.unpack(peer.recv(64))
+        assert length == 0
+        assert can_id == (0b1011 << 7) | 5
+        peer.close()
+
+    def test_can_enumeration(self, tmp_path) -> None:
+        """
+        CANID self enumeration test
+        """
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        sock, peer = socketpair(AF_UNIX, SOCK_DGRAM)
+        can_service = CanService(RawCanTransport(sock=sock), enum_window=0.0)
+        controller = Controller([can_service], tmp_path / "config.json")
+        controller.can_id = 5
+        controller.config.node_number = 0x0102
+        # empty frames and frames from other CANIDs do not clash
+        peer.send(CAN_FRAME.pack(0x585, 0, bytes(8)))
+        peer.send(CAN_FRAME.pack(0x586, 1, bytes([OPC_ACON]) + bytes(7)))
+        can_service.process(None)
+        assert not can_service.enumerating
+        peer.send(CAN_FRAME.pack(0x585, 5, bytes([OPC_ACON, 0, 1, 0, 2, 0, 0, 0])))
+        can_service._check_incoming_messages()
+        assert can_service.enumeration_required
+        can_service.process(None)
+        assert can_service.enumerating
+        can_id, length, _ = CAN_FRAME.unpack(peer.recv(64))
+        assert can_id == 0x40000000 | 0x585
+        assert length == 0
+        for responder in (1, 2, 3, 5):
+            peer.send(CAN_FRAME.pack(0x580 | responder, 0, bytes(8)))
+        can_service._check_incoming_messages()
+        assert controller._run_timers() is None
+        assert not can_service.enumerating
+        assert controller.can_id == 4
+        assert controller.config.can_id == 4
+        controller.dispatch(bytes([OPC_ENUM, 1, 3]))
+        assert not can_service.enumerating
+        controller.dispatch(bytes([OPC_ENUM, 1, 2]))
+        assert can_service.enumerating
+        controller._run_timers()
+        assert controller.can_id == 1
+        controller.dispatch(bytes([OPC_CANID, 1, 2, 100]))
+        assert controller.can_id == 1
+        controller.dispatch(bytes([OPC_CANID, 1, 2, 42]))
+        assert controller.can_id == 42
+        peer.close()
+
+    # pylint: disable=protected-access
+    def test_can_own_frames(self, tmp_path) -> None:
+        """
+        Frames echoed back by the bus are ignored test
+        """
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        transport = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport, enum_window=0.0)
+        controller = Controller([can_service], tmp_path / "config.json")
+        controller.can_id = 5
+        controller.config.node_number = 0x0102
+        # an echo of our own frame is not a CANID clash
+        can_service.process(MessageOut(bytes([OPC_ACON, 0, 1, 0, 2])))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 1
+        assert not can_service.enumeration_required
+        # nor is our own enumeration request answered
+        controller.dispatch(bytes([OPC_ENUM, 1, 2]))
+        assert can_service.enumerating
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 1
+        assert transport.tx_count == 2
+        controller._run_timers()
+        assert not can_service.enumerating
+        assert controller.can_id == 1
+        transport.shutdown()
+
+    def test_lowest_free_can_id(self) -> None:
+        """
+        CANID selection test
+        """
+        assert lowest_free_can_id(0) == 1
+        assert lowest_free_can_id(0b1110) == 4
+        assert lowest_free_can_id((1 << (MAX_CAN_ID + 1)) - 2) is None
+        assert lowest_free_can_id(1 << 127) == 1
+
+    def test_can_filters(self) -> None:
+        """
+        Acceptance filters test
+        """
+        transport = CanTransportOverVirtual()
+        can_service = CanService(transport)
+        assert can_service.can_filters == [
+            {"can_id": 0, "can_mask": 0, "extended": False}
+        ]
+        can_service = CanService(transport, can_ids=[0x13, 0x12, 0x12])
+        can_service.begin()
+        transport.send(Message(arbitration_id=0x12, is_extended_id=True))
+        transport.send(Message(arbitration_id=0x113, is_extended_id=False))
+        transport.send(Message(arbitration_id=0x114, is_extended_id=False))
+        transport.send(Message(arbitration_id=0x112, is_extended_id=False))
+        time.sleep(0.01)
+        msgs = transport.recv_many(8)
+        assert [msg.arbitration_id for msg in msgs] == [0x113, 0x112]
+        assert pack_filters(None) == bytes(8)
+        assert pack_filters(can_service.can_filters) == bytes.fromhex(
+            "120000007f000080130000007f00008000000040000000c0"
+        )
+        transport.shutdown()
+
+    # pylint: disable=protected-access
+    def test_can_filters_enumeration(self, tmp_path) -> None:
+        """
+        Acceptance filters and self enumeration test
+        """
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        transport = CanTransportOverVirtual(log_filename=None)
+        peer = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport, can_ids=[0x12], enum_window=0.0)
+        controller = Controller([can_service], tmp_path / "config.json")
+        controller.can_id = 5
+        controller.begin()
+        assert [f["can_id"] for f in can_service.can_filters] == [5, 0x12, CAN_RTR_FLAG]
+        event = [OPC_ACON, 0, 1, 0, 2]
+        # frames using our CANID pass the filters
+        peer.send(Message(arbitration_id=0x585, data=event, is_extended_id=False))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 1
+        assert can_service.enumeration_required
+        can_service.process(None)
+        assert can_service.enumerating
+        # replies from any CANID are collected during the enumeration
+        for responder in (1, 2, 0x14):
+            peer.send(Message(arbitration_id=0x580 | responder, is_extended_id=False))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 4
+        controller._run_timers()
+        assert controller.can_id == 3
+        # then the filters are back, following the new CANID
+        peer.send(Message(arbitration_id=0x585, data=event, is_extended_id=False))
+        peer.send(Message(arbitration_id=0x583, data=event, is_extended_id=False))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 1
+        assert can_service.enumeration_required
+        transport.shutdown()
+        peer.shutdown()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Tests for `pyvlcb` package."""
+
+# pylint: disable=redefined-outer-name
+
+from pytest import raises
+
+from pyvlcb import codec, vlcbdefs
+from pyvlcb.vlcbdefs import (
+    OPC_ACON,
+    OPC_CMDERR,
+    OPC_DDES,
+    OPC_ENACK,
+    OPC_ENRSP,
+    OPC_PARAMS,
+    OPC_QNN,
+    OPC_RQDDS,
+)
+
+
+class TestCodec:
+    """
+    VLCB message codec tests.
+    """
+
+    def test_table(self) -> None:
+        """
+        Generated codec table test.
+        """
+        for attr, opcode in vars(vlcbdefs).items():
+            if attr.startswith("OPC_"):
+                opc_codec = codec.CODECS[opcode]
+                assert opc_codec is not None
+                assert opc_codec.length == codec.message_length(opcode)
+                assert opc_codec.struct.size == opc_codec.length
+        # pylint: disable=protected-access
+        for name in (
+            codec._EVENT_OPCODES
+            | codec._NODE_OPCODES
+            | codec._DEVICE_OPCODES
+            | codec._LAYOUTS.keys()
+        ):
+            assert name in codec.CODECS_BY_NAME
+
+    def test_decode(self) -> None:
+        """
+        Decoding test.
+        """
+        data = bytearray([0, OPC_ACON, 0x01, 0x02, 0x03, 0x04, 0xFF])
+        msg = codec.decode(memoryview(data)[1:])
+        assert msg == (OPC_ACON, 0x0102, 0x0304)
+        assert (msg.nn, msg.en) == (0x0102, 0x0304)
+        assert type(msg).__name__ == "ACON"
+        msg = codec.decode(bytes([OPC_DDES, 0, 7, 1, 2, 3, 4, 5]))
+        assert msg.dn == 7 and msg.d5 == 5
+        assert codec.decode(bytes([OPC_PARAMS] + list(range(7)))).d7 == 6
+        msg = codec.decode(bytes([OPC_ENRSP, 0, 1, 0, 2, 0, 3, 4]))
+        assert (msg.nn, msg.event_nn, msg.event_en, msg.index) == (1, 2, 3, 4)
+        msg = codec.decode(bytes([OPC_ENACK, 0, 1, OPC_ACON, 0, 2, 0, 3]))
+        assert (msg.nn, msg.ack_opc, msg.event_nn, msg.event_en) == (1, OPC_ACON, 2, 3)
+        assert codec.decode(bytes([OPC_RQDDS, 1, 2])).dn == 0x0102
+        assert codec.decode(bytes([OPC_QNN])) == (OPC_QNN,)
+        with raises(ValueError):
+            codec.decode(bytes([OPC_ACON, 1, 2]))
+        with raises(ValueError):
+            codec.decode(bytes([0x0B]))
+
+    def test_encode(self) -> None:
+        """
+        Encoding test.
+        """
+        buffer = bytearray(16)
+        assert codec.encode_into(buffer, OPC_CMDERR, 0x1234, 9, offset=2) == 4
+        assert buffer[:6] == bytes([0, 0, OPC_CMDERR, 0x12, 0x34, 9])
+        assert codec.encode(OPC_ACON, 1, 2) == bytes([OPC_ACON, 0, 1, 0, 2])
+        assert codec.decode(codec.encode(OPC_ACON, 1, 2)) == (OPC_ACON, 1, 2)
@@ -1,11 +1,20 @@
 #!/usr/bin/env python
 """Tests for `pyvlcb` package."""
+
 # pylint: disable=redefined-outer-name
 
 
 from json import dump, load
+from shutil import copyfile
+
+import pytest
 
 from pyvlcb.modules.config import Configuration, Mode, Event
+from pyvlcb.modules.eeprom import EepromStorage
+from pyvlcb.modules.journal import JournalStorage
+from pyvlcb.modules.params import Params
+from pyvlcb.modules.sqlite import SqliteStorage
+from pyvlcb.modules.storage import JsonStorage, MemoryStorage
 
 
 class TestConfiguration:
@@ -54,6 +63,25 @@ class TestConfiguration:
         assert config.mode == Mode.NORMAL
         assert config.node_number == 120
 
+    def test_node_flags(self):
+        """
+        Node flags are changed and saved.
+        """
+        # pylint: disable=R0201
+        filename = "pyvlcb/config_factory.json"
+        config = Configuration(filename)
+        config.heartbeat = True
+        assert config.heartbeat is True
+        assert config.event_ack is False
+        config.event_ack = True
+        config.heartbeat = False
+        config = Configuration(filename)
+        assert config.heartbeat is False
+        assert config.event_ack is True
+        assert config.settings.node_flags == 0x02
+        assert config.node_flags.event_ack == 1
+        config.event_ack = False
+
     def test_events(self):
         """
         Event configuration handling test.
@@ -68,7 +96,7 @@ class TestConfiguration:
         evt = config.read_event(0)
         assert evt.node_number == 100
         assert evt.event_number == 200
-        assert evt.event_vars == [10, 20, 30]
+        assert evt.event_vars == bytes([10, 20, 30])
         assert config.num_events == 1
         config.write_event(2, Event(102, 202, [12, 22, 32]))
         assert config.num_events == 2
@@ -86,6 +114,51 @@ class TestConfiguration:
         assert config.read_event(3) is None
         assert config.clear_event(3) is None
 
+    def test_event_index(self):
+        """
+        Event index handling test.
+        """
+        # pylint: disable=R0201
+        filename = "pyvlcb/config_factory.json"
+        config = Configuration(filename)
+        config.write_event(0, Event(100, 200, [1]))
+        config.write_event(1, Event(0, 7, [2]))
+        config.write_event(2, Event(100, 201, [3]))
+        assert config.find_event_index(100, 201) == 2
+        assert config.node_event_indexes(100) == {200: 0, 201: 2}
+        assert config.find_short_event(7).event_vars == bytes([2])
+        assert config.find_short_event(8) is None
+        config.write_event(0, Event(101, 200, [4]))
+        assert config.find_event(100, 200) is None
+        assert config.find_event(101, 200).event_vars == bytes([4])
+        assert config.node_event_indexes(100) == {201: 2}
+        config = Configuration(filename)
+        assert config.find_event_index(101, 200) == 0
+        assert config.find_event_index(0, 7) == 1
+        config.clear_event(1)
+        assert config.find_short_event(7) is None
+        config.clear_all_events()
+        assert config.find_event(101, 200) is None
+        assert config.node_event_indexes(100) == {}
+
+    def test_event_repr(self):
+        """
+        Events are immutable and keep their variables as bytes.
+        """
+        # pylint: disable=R0201
+        evt = Event(1, 2, [3, 4])
+        assert evt.event_vars == b"\x03\x04"
+        assert not hasattr(evt, "__dict__")
+        with pytest.raises(AttributeError):
+            evt.node_number = 5
+        config = Configuration("pyvlcb/config_factory.json")
+        with config.batch():
+            config.write_event(3, evt)
+            config.write_event(1, Event(1, 3))
+        assert config.read_event(3) is config.read_event(3)
+        assert dict(config.iter_events()) == {3: evt, 1: Event(1, 3, b"")}
+        config.clear_all_events()
+
     def test_node_vars(self):
         """
         Node variables configuration handling test.
@@ -109,8 +182,316 @@ class TestConfiguration:
         assert config.read_node_var(3) is None
         assert config.clear_node_var(3) is None
 
+    def test_write_behind(self):
+        """
+        Write-behind persistence test.
+        """
+        # pylint: disable=R0201
+        filename = "pyvlcb/config_factory.json"
+        config = Configuration(filename, write_behind=True, flush_delay=3600)
+        config.clear_all_node_vars()
+        config.flush()
+        for i in range(10):
+            config.write_node_var(i, i)
+        assert config.dirty
+        assert Configuration(filename).num_node_vars == 0
+        assert not config.flush_if_due()
+        config.flush()
+        assert not config.dirty
+        assert Configuration(filename).num_node_vars == 10
+        config = Configuration(filename, write_behind=True, flush_delay=0)
+        config.clear_all_node_vars()
+        assert config.flush_if_due()
+        assert Configuration(filename).num_node_vars == 0
+
+    def test_write_behind_debounce(self, tmp_path, monkeypatch):
+        """
+        Write-behind saves after changes pause, or after a while at the latest.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.json"
+        copyfile("pyvlcb/config_factory.json", filename)
+        now = [0.0]
+        monkeypatch.setattr("pyvlcb.modules.storage.monotonic", lambda: now[0])
+        config = Configuration(filename, write_behind=True, flush_delay=1.0)
+        config.write_node_var(0, 1)
+        now[0] = 0.9
+        config.write_node_var(1, 1)
+        now[0] = 1.5
+        assert not config.flush_if_due()
+        now[0] = 2.0
+        assert config.flush_if_due()
+        # changes that never pause are saved FLUSH_MAX_DELAYS flush delays in
+        for step in range(30):
+            now[0] = 3.0 + step * 0.5
+            config.write_node_var(2, step)
+            if config.flush_if_due():
+                break
+        assert now[0] == 13.0
+        assert not config.dirty
+
+    def test_batch(self):
+        """
+        Batched changes are saved once.
+        """
+        # pylint: disable=R0201
+        filename = "pyvlcb/config_factory.json"
+        config = Configuration(filename)
+        with config.batch():
+            config.write_node_var(0, 1)
+            config.write_node_var(1, 2)
+            assert config.dirty
+            assert Configuration(filename).read_node_var(1) is None
+        assert not config.dirty
+        assert Configuration(filename).read_node_var(1) == 2
+        config.clear_all_node_vars()
+
+
+class TestJournalStorage:
+    """
+    Journal storage tests
+    """
+
+    def test_replay(self, tmp_path):
+        """
+        Changes are replayed when the journal is opened.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.journal"
+        config = Configuration(JournalStorage(filename))
+        config.set_mode(Mode.NORMAL, node_number=256)
+        config.can_id = 5
+        config.write_event(0, Event(100, 200, [1, 2]))
+        config.write_event(1, Event(101, 201, [3]))
+        config.clear_event(0)
+        config.write_node_var(3, 42)
+        config.close()
+        config = Configuration(JournalStorage(filename))
+        assert config.mode == Mode.NORMAL
+        assert config.node_number == 256
+        assert config.can_id == 5
+        assert config.num_events == 1
+        assert config.find_event(100, 200) is None
+        assert config.find_event(101, 201).event_vars == bytes([3])
+        assert config.read_node_var(3) == 42
+        config.close()
+
+    def test_torn_record(self, tmp_path):
+        """
+        A torn record at the end of the journal is discarded.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.journal"
+        storage = JournalStorage(filename)
+        storage.write_node_var(0, 1)
+        storage.write_node_var(1, 2)
+        storage.close()
+        with open(filename, "r+b") as file:
+            file.truncate(filename.stat().st_size - 1)
+        storage = JournalStorage(filename)
+        assert storage.read_node_var(0) == 1
+        assert storage.read_node_var(1) is None
+        storage.write_node_var(2, 3)
+        storage.close()
+        assert JournalStorage(filename).read_node_var(2) == 3
+
+    def test_compaction(self, tmp_path):
+        """
+        The journal is compacted to a snapshot.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.journal"
+        storage = JournalStorage(filename, compact_size=1024)
+        for i in range(200):
+            storage.write_event(i % 10, Event(1, i, [i & 0xFF]))
+        storage.compact(wait=True)
+        assert filename.stat().st_size == storage.size
+        assert storage.size < 1024
+        storage.close()
+        storage = JournalStorage(filename)
+        assert storage.num_events == 10
+        assert storage.read_event(9).event_vars == bytes([199])
+        assert storage.find_event_index(1, 199) == 9
+        storage.close()
+
+    def test_import_export(self, tmp_path):
+        """
+        Import and export of config.json documents.
+        """
+        # pylint: disable=R0201
+        document = {
+            "settings": {"MODE": 1, "NODE_NUMBER": 300, "MODULE_NAME": "TEST"},
+            "node_vars": {"NV001": 7},
+            "events": {
+                "EVT002": {"NODE_NUMBER": 1, "EVENT_NUMBER": 2, "EVENT_VARS": [3]}
+            },
+        }
+        with open(tmp_path / "in.json", "wt", encoding="utf-8") as file:
+            dump(document, file)
+        storage = JournalStorage(tmp_path / "config.journal")
+        storage.import_json(tmp_path / "in.json")
+        storage.close()
+        storage = JournalStorage(tmp_path / "config.journal")
+        storage.export_json(tmp_path / "out.json")
+        storage.close()
+        with open(tmp_path / "out.json", "rt", encoding="utf-8") as file:
+            exported = load(file)
+        assert exported["settings"]["MODULE_NAME"] == "TEST"
+        assert exported["settings"]["NODE_NUMBER"] == 300
+        assert exported["node_vars"] == document["node_vars"]
+        assert exported["events"] == document["events"]
+
+
+class TestEepromStorage:
+    """
+    EEPROM storage tests
+    """
+
+    def test_slots(self, tmp_path):
+        """
+        Events and node variables are kept in their slots.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.eeprom"
+        config = Configuration(EepromStorage(filename, 8, 4, 4))
+        assert config.mode == Mode.UNINITIALISED
+        config.set_mode(Mode.NORMAL, node_number=300)
+        config.write_event(7, Event(100, 200, [1, 2, 3, 4]))
+        config.write_event(2, Event(0, 5, []))
+        config.write_event(2, Event(0, 6, [9]))
+        config.write_node_var(3, 255)
+        assert config.num_events == 2
+        assert config.find_short_event(5) is None
+        config.close()
+        config = Configuration(EepromStorage(filename, 8, 4, 4))
+        assert config.node_number == 300
+        assert config.num_events == 2
+        assert config.find_event(100, 200).event_vars == bytes([1, 2, 3, 4])
+        assert config.find_short_event(6).event_vars == bytes([9])
+        assert config.read_node_var(3) == 255
+        assert config.num_node_vars == 1
+        config.clear_event(7)
+        assert config.num_events == 1
+        assert config.read_event(7) is None
+        config.close()
+
+    def test_limits(self, tmp_path):
+        """
+        Slots are limited by the module parameters.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.eeprom"
+        params = Params()
+        params.num_evts = 2
+        params.num_evs = 1
+        params.num_nvs = 1
+        storage = EepromStorage.from_params(filename, params)
+        with pytest.raises(IndexError):
+            storage.write_event(2, Event(1, 1, [1]))
+        with pytest.raises(ValueError):
+            storage.write_event(0, Event(1, 1, [1, 2]))
+        with pytest.raises(IndexError):
+            storage.write_node_var(1, 1)
+        assert storage.read_event(5) is None
+        storage.write_setting("MODULE_NAME", "x" * 16)
+        with pytest.raises(ValueError):
+            storage.write_setting("MODULE_NAME", "x" * 17)
+        with pytest.raises(ValueError):
+            storage.write_setting("VERSION", "1.0.0-beta")
+        assert storage.read_setting("MODULE_NAME") == "x" * 16
+        storage.close()
+        with pytest.raises(ValueError):
+            EepromStorage(filename, 4, 1, 1)
+
+
+class TestSqliteStorage:
+    """
+    SQLite storage tests
+    """
+
+    def test_events(self, tmp_path):
+        """
+        Events are stored and located by contents.
+        """
+        # pylint: disable=R0201
+        filename = tmp_path / "config.db"
+        config = Configuration(SqliteStorage(filename))
+        assert config.mode == Mode.UNINITIALISED
+        with config.batch():
+            for i in range(100):
+                config.write_event(i, Event(i % 4, i, [i, 1]))
+        config.write_node_var(2, 5)
+        config.clear_event(0)
+        config.close()
+        config = Configuration(SqliteStorage(filename))
+        assert config.num_events == 99
+        assert config.find_event(3, 99).event_vars == bytes([99, 1])
+        assert config.find_event_index(0, 0) is None
+        assert config.node_event_indexes(1) == {i: i for i in range(1, 100, 4)}
+        assert config.read_node_var(2) == 5
+        assert [idx for idx, _ in config.storage.iter_events()][:2] == [1, 2]
+        config.close()
+
+    def test_batch_rollback(self, tmp_path):
+        """
+        A failed batch leaves the configuration unchanged.
+        """
+        # pylint: disable=R0201
+        storage = SqliteStorage(tmp_path / "config.db")
+        with pytest.raises(RuntimeError):
+            with storage.batch():
+                storage.write_node_var(0, 1)
+                raise RuntimeError
+        assert storage.num_node_vars == 0
+        storage.close()
+
+
+class TestStorageParity:
+    """
+    Storage backends behave the same behind Storage.
+    """
+
+    @pytest.fixture(params=["memory", "json", "journal", "eeprom", "sqlite"])
+    def storage(self, request, tmp_path):
+        """
+        Every storage backend, empty.
+        """
+        filename = tmp_path / "config"
+        if request.param == "memory":
+            storage = MemoryStorage()
+        elif request.param == "json":
+            copyfile("pyvlcb/config_factory.json", filename)
+            storage = JsonStorage(filename)
+        elif request.param == "journal":
+            storage = JournalStorage(filename)
+        elif request.param == "eeprom":
+            storage = EepromStorage(filename, 16, 4, 4)
+        else:
+            storage = SqliteStorage(filename)
+        storage.clear_all_events()
+        yield storage
+        storage.close()
+
+    def test_duplicate_events(self, storage):
+        """
+        An event stored at several indexes is found at the highest one.
+        """
+        # pylint: disable=R0201
+        storage.write_event(5, Event(1, 2, [5]))
+        storage.write_event(2, Event(1, 2, [2]))
+        storage.write_event(9, Event(1, 2, [9]))
+        assert storage.find_event_index(1, 2) == 9
+        assert storage.node_event_indexes(1) == {2: 9}
+        storage.clear_event(9)
+        assert storage.find_event_index(1, 2) == 5
+        storage.write_event(5, Event(1, 3, [5]))
+        assert storage.find_event_index(1, 2) == 2
+        assert storage.node_event_indexes(1) == {2: 2, 3: 5}
+        storage.clear_event(2)
+        assert storage.find_event_index(1, 2) is None
+        assert storage.num_events == 1
+
 
-# class TestMinimumNodeService:
 #     """
 #     Minimum node service tests.
 #     """
@@ -1,12 +1,44 @@
 #!/usr/bin/env python
 """Tests for `pyvlcb` package."""
+
 # pylint: disable=redefined-outer-name
 
+import os
+import time
+from asyncio import run
+from shutil import copyfile
+from threading import Thread, Timer, current_thread
+
+import pytest
+from can import Message
 
+from pyvlcb.modules.config import Configuration, Mode
 from pyvlcb.modules.controller import Controller
 from pyvlcb.modules.params import Params, ModuleFlags
+from pyvlcb.modules.responses import ResponseCache
+from pyvlcb.modules.ring import ActionRing
+from pyvlcb.modules.timing import Histogram
+from pyvlcb.services.can import CanService
 from pyvlcb.services.mns import MinimumNodeService
+from pyvlcb.services.service import (
+    ExecutionPolicy,
+    HandlerResult,
+    MessageIn,
+    MessageOut,
+    ModeChange,
+    Service,
+    TimerExpired,
+)
+from pyvlcb.transports.can import CanTransportOverVirtual
 from pyvlcb.vlcbdefs import (
+    OPC_ACOF,
+    OPC_ACON,
+    OPC_QNN,
+    OPC_RQMN,
+    OPC_RQNP,
+    OPC_RQNPN,
+    OPC_RQSD,
+    SERVICE_ID_MNS,
     MANU_DEV,
     CPUM_ARM,
     ARMCortex_A72,
@@ -30,6 +62,100 @@ from pyvlcb.vlcbdefs import (
 )
 
 
+class EventService(Service):
+    """
+    Service recording the accessory events it receives.
+    """
+
+    opcodes = (OPC_ACON, OPC_ACOF)
+
+    def __init__(self) -> None:
+        self.received = []
+        self.actions = []
+
+    @property
+    def service_id(self) -> int:
+        return 0
+
+    @property
+    def service_version_id(self) -> int:
+        return 1
+
+    def begin(self) -> None:
+        pass
+
+    def handle_message(self, data) -> None:
+        self.received.append(bytes(data))
+
+    def process(self, action) -> None:
+        if action is not None:
+            self.actions.append(action)
+
+
+class PooledService(EventService):
+    """
+    Service executing accessory on events on the thread pool.
+    """
+
+    execution = ExecutionPolicy.THREAD
+    opcode_execution = {OPC_ACOF: ExecutionPolicy.INLINE}
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.executed = []
+        self.results = []
+
+    def execute(self, data: bytes) -> int:
+        if data[4] == 0xFF:
+            raise ValueError("bad event")
+        # later events of a node finish sooner unless they wait for the earlier ones
+        time.sleep(0.001 * (4 - data[4] % 4))
+        self.executed.append(bytes(data))
+        return data[4]
+
+    def handle_result(self, result: HandlerResult) -> None:
+        self.results.append(result)
+
+
+class ProcessService(EventService):
+    """
+    Service executing accessory on events on the process pool.
+    """
+
+    execution = ExecutionPolicy.PROCESS
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.results = []
+
+    @staticmethod
+    def execute(data: bytes) -> int:
+        return os.getpid()
+
+    def handle_result(self, result: HandlerResult) -> None:
+        self.results.append(result.result)
+
+
+class SlottedProcessService(ProcessService):
+    """
+    Process pool service with slots.
+    """
+
+    __slots__ = ("extra",)
+
+
+class FailingService(EventService):
+    """
+    Service whose accessory on events fail on the process pool.
+    """
+
+    execution = ExecutionPolicy.PROCESS
+
+    @staticmethod
+    def execute(data: bytes) -> None:
+        raise ValueError("bad event")
+
+
 class TestConfiguration:
     """
     Configuration tests
@@ -60,6 +186,444 @@ class TestConfiguration:
         controller.can_id = 0
         assert controller.services == services
 
+    # pylint: disable=protected-access
+    def test_header_ids(self, tmp_path) -> None:
+        """
+        Cached CAN header words test
+        """
+        copyfile(self.filename, tmp_path / "config.json")
+        can_service = CanService(CanTransportOverVirtual(log_filename=None))
+        controller = Controller([can_service], tmp_path / "config.json")
+        assert can_service.controller is controller
+        assert controller.header_ids[0] == 0
+        assert can_service._own_header_id() == 0b1011 << 7
+        controller.can_id = 5
+        assert controller.header_ids[0b1001] == (0b1001 << 7) | 5
+        assert can_service._own_header_id(0b01, 0b10) == (0b1001 << 7) | 5
+        assert controller.header_ids[15] == (15 << 7) | 5
+
+    def test_dispatch(self) -> None:
+        """
+        Op-code dispatch test
+        """
+        consumers = [EventService(), EventService()]
+        controller = Controller([MinimumNodeService()] + consumers, self.filename)
+        assert controller.dispatch(bytes([OPC_ACON, 0, 1, 0, 2])) == 2
+        assert controller.dispatch(bytes([OPC_QNN])) == 0
+        assert controller.unhandled_counts[OPC_QNN] == 1
+        assert consumers[1].received == [bytes([OPC_ACON, 0, 1, 0, 2])]
+
+    # pylint: disable=protected-access
+    def test_can_dispatch(self) -> None:
+        """
+        Dispatch of received CAN frames test
+        """
+        transport = CanTransportOverVirtual(log_filename=None)
+        # another node on the bus, the module ignores its own frames
+        peer = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport)
+        consumer = EventService()
+        controller = Controller([can_service, consumer], self.filename)
+        event = [OPC_ACOF, 0, 1, 0, 3]
+        peer.send(Message(arbitration_id=0x5FF, data=event, is_extended_id=False))
+        peer.send(Message(arbitration_id=0x5FF, data=event, is_extended_id=True))
+        peer.send(Message(arbitration_id=0x5FF, is_extended_id=False))
+        peer.send(Message(arbitration_id=0x5FF, data=[OPC_QNN], is_extended_id=False))
+        time.sleep(0.01)
+        assert can_service._check_incoming_messages() == 4
+        assert not consumer.received
+        # messages no service handles are counted and dropped before being queued
+        assert len(controller.actions) == 1
+        assert controller.unhandled_counts[OPC_QNN] == 1
+        assert controller.process_actions() == 1
+        assert consumer.received == [bytes(event)]
+        transport.shutdown()
+        peer.shutdown()
+
+    # pylint: disable=protected-access
+    def test_actions(self) -> None:
+        """
+        Action pipeline test
+        """
+        transport = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport)
+        consumer = EventService()
+        controller = Controller(
+            [can_service, consumer], self.filename, action_capacity=3
+        )
+        assert controller.actions.capacity == 4
+        timer = controller.add_timer(0.0, repeat=False)
+        controller._run_timers()
+        assert controller.put_action(MessageIn(bytes([OPC_ACON, 0, 1, 0, 2])))
+        assert controller.put_action(MessageOut(bytes([OPC_QNN])))
+        assert controller.put_action(MessageIn(bytes([OPC_QNN])))
+        assert not controller.put_action(MessageIn(bytes([OPC_QNN])))
+        assert controller.actions.dropped == 1
+        # a full queue leaves received frames in the transport
+        assert can_service._check_incoming_messages() == 0
+        assert controller.process_actions(2) == 2
+        assert consumer.received == [bytes([OPC_ACON, 0, 1, 0, 2])]
+        assert [type(action) for action in consumer.actions] == [TimerExpired]
+        assert consumer.actions[0].timer_id == timer
+        assert controller.process_actions() == 2
+        assert consumer.actions[1].data == bytes([OPC_QNN])
+        assert controller.unhandled_counts[OPC_QNN] == 1
+        assert transport.tx_count == 1
+        assert controller.process_actions() == 0
+
+    def test_set_mode(self, tmp_path) -> None:
+        """
+        Mode change action test
+        """
+        copyfile(self.filename, tmp_path / "config.json")
+        consumer = EventService()
+        controller = Controller([consumer], tmp_path / "config.json")
+        controller.set_mode(Mode.NORMAL, 258)
+        assert controller.config.node_number == 258
+        controller.process()
+        assert len(consumer.actions) == 1
+        assert isinstance(consumer.actions[0], ModeChange)
+        assert consumer.actions[0].mode == Mode.NORMAL
+
+    def test_timers(self) -> None:
+        """
+        Controller timers test
+        """
+        controller = Controller([MinimumNodeService()], self.filename)
+        ticks = []
+        once = controller.add_timer(0.0, lambda: ticks.append("once"), repeat=False)
+        cancelled = controller.add_timer(0.0, lambda: ticks.append("cancelled"))
+        controller.cancel_timer(cancelled)
+        assert controller._run_timers() is None
+        assert ticks == ["once"]
+        controller.cancel_timer(once)
+
+    def test_run_async(self) -> None:
+        """
+        Asyncio run loop test
+        """
+        controller = Controller([MinimumNodeService()], self.filename)
+        ticks = []
+
+        def tick() -> None:
+            ticks.append(len(ticks))
+            if len(ticks) == 3:
+                controller.stop()
+
+        controller.add_timer(0.001, tick)
+        run(controller.run_async())
+        assert ticks == [0, 1, 2]
+
+    # pylint: disable=protected-access
+    def test_run(self, tmp_path) -> None:
+        """
+        Selector run loop test
+        """
+        copyfile(self.filename, tmp_path / "config.json")
+        transport = CanTransportOverVirtual(log_filename=None)
+        # another node on the bus, the module ignores its own frames
+        peer = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport)
+        consumer = EventService()
+        controller = Controller([can_service, consumer], tmp_path / "config.json")
+        assert can_service.fileobjs == (transport,)
+        assert can_service.poll_interval is None
+        event = [OPC_ACON, 0, 1, 0, 2]
+        # the frame arrives from the notifier thread while the loop waits
+        Timer(
+            0.05,
+            peer.send,
+            (Message(arbitration_id=0x5FF, data=event, is_extended_id=False),),
+        ).start()
+        stopper = Timer(0.2, controller.stop)
+        stopper.start()
+        start = time.monotonic()
+        controller.run()
+        assert time.monotonic() - start < 5.0
+        stopper.join()
+        assert consumer.received == [bytes(event)]
+        transport.shutdown()
+        peer.shutdown()
+
+    def test_timing(self, caplog) -> None:
+        """
+        Per-service timing, budget warnings and profiling test
+        """
+
+        class SlowService(EventService):
+            """
+            Service taking about a millisecond per tick.
+            """
+
+            opcodes = ()
+
+            def process(self, action) -> None:
+                time.sleep(0.001)
+
+        slow, consumer = SlowService(), EventService()
+        controller = Controller([slow, consumer], self.filename)
+        controller.process()
+        assert not controller.timing
+        controller.enable_timing(budget=0.0005)
+        controller.put_action(MessageIn(bytes([OPC_ACON, 0, 1, 0, 2])))
+        controller.process()
+        controller.process()
+        assert controller.timing[slow].count == 2
+        assert controller.timing[slow].percentile(50) >= 1000000
+        assert controller.timing[consumer].count == 3
+        assert "SlowService took" in caplog.text
+        assert "EventService took" not in caplog.text
+        capture = controller.profile(2, trace_memory=True)
+        controller.process()
+        assert not capture.done
+        controller.process()
+        assert capture.done
+        assert capture.stats is not None and capture.snapshot is not None
+        controller.disable_timing()
+        controller.process()
+        assert not controller.timing
+
+    def test_direct_dispatch(self, tmp_path) -> None:
+        """
+        Direct-dispatch receive mode test
+        """
+
+        class ThreadSafeService(EventService):
+            """
+            Service recording the thread its handler runs on.
+            """
+
+            thread_safe = True
+
+            def handle_message(self, data) -> None:
+                self.thread = current_thread()
+                super().handle_message(data)
+
+        copyfile(self.filename, tmp_path / "config.json")
+        transport = CanTransportOverVirtual(log_filename=None)
+        # another node on the bus, the module ignores its own frames
+        peer = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport, direct=True)
+        fast, slow = ThreadSafeService(), EventService()
+        controller = Controller([can_service, fast, slow], tmp_path / "config.json")
+        assert can_service.direct
+        assert can_service.fileobjs == () and can_service.poll_interval is None
+        controller.begin()
+        event = [OPC_ACON, 0, 1, 0, 2]
+        peer.send(Message(arbitration_id=0x5FF, data=[OPC_QNN], is_extended_id=False))
+        peer.send(Message(arbitration_id=0x5FF, data=event, is_extended_id=False))
+        deadline = time.monotonic() + 5.0
+        while not fast.received and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert fast.received == [bytes(event)]
+        assert fast.thread is not current_thread()
+        assert not slow.received
+        assert not transport.available()
+        controller.process()
+        assert slow.received == [bytes(event)]
+        assert controller.unhandled_counts[OPC_QNN] == 1
+        transport.set_receiver(None)
+        peer.send(Message(arbitration_id=0x5FF, data=event, is_extended_id=False))
+        assert transport.recv(1.0) is not None
+        transport.shutdown()
+        peer.shutdown()
+
+    def test_direct_dispatch_replies(self, tmp_path) -> None:
+        """
+        Replies put by direct-mode handlers from the receive thread test
+        """
+
+        class ReplyingService(EventService):
+            """
+            Thread-safe service answering every ACON with an ACOF.
+            """
+
+            opcodes = (OPC_ACON,)
+            thread_safe = True
+
+            def handle_message(self, data) -> None:
+                reply = bytes([OPC_ACOF]) + bytes(data[1:])
+                self.controller.put_action(MessageOut(reply))
+
+        copyfile(self.filename, tmp_path / "config.json")
+        transport = CanTransportOverVirtual(log_filename=None)
+        peer = CanTransportOverVirtual(log_filename=None)
+        can_service = CanService(transport, direct=True)
+        replying, consumer = ReplyingService(), EventService()
+        controller = Controller(
+            [can_service, replying, consumer], tmp_path / "config.json"
+        )
+        controller.begin()
+        # actions from other threads wait aside until the controller moves them
+        other = Thread(target=controller.put_action, args=(TimerExpired(-1),))
+        other.start()
+        other.join()
+        assert not controller.actions
+        assert controller.process_actions() == 1
+        assert consumer.actions[0].timer_id == -1
+        consumer.actions.clear()
+        count = 100
+        for i in range(count):
+            peer.send(
+                Message(
+                    arbitration_id=0x5FF,
+                    data=[OPC_ACON, 0, 1, 0, i],
+                    is_extended_id=False,
+                )
+            )
+        # the controller thread puts actions of its own meanwhile
+        replies, timers = [], 0
+        deadline = time.monotonic() + 5.0
+        while (len(replies) < count or timers < count) and time.monotonic() < deadline:
+            if timers < count:
+                controller.put_action(TimerExpired(timers))
+                timers += 1
+            controller.process()
+            replies += [msg for msg in peer.recv_many(64) if msg.data[0] == OPC_ACOF]
+        assert [msg.data[4] for msg in replies] == list(range(count))
+        expired = [
+            action.timer_id
+            for action in consumer.actions
+            if isinstance(action, TimerExpired)
+        ]
+        assert expired == list(range(count))
+        assert controller.actions.dropped == 0
+        transport.shutdown()
+        peer.shutdown()
+
+    def test_thread_pool(self) -> None:
+        """
+        Thread pool execution policy and per node ordering test
+        """
+        pooled = PooledService()
+        controller = Controller([pooled], self.filename, thread_workers=4)
+        assert controller.queue_depths == {ExecutionPolicy.INLINE: 0}
+        events = [bytes([OPC_ACON, 0, node, 0, i]) for i in range(8) for node in (1, 2)]
+        for event in events:
+            assert controller.dispatch(event) == 1
+        assert controller.queue_depths[ExecutionPolicy.THREAD] > 0
+        controller.dispatch(bytes([OPC_ACOF, 0, 1, 0, 9]))
+        assert pooled.received == [bytes([OPC_ACOF, 0, 1, 0, 9])]
+        controller.dispatch(bytes([OPC_ACON, 0, 3, 0, 0xFF]))
+        deadline = time.monotonic() + 5.0
+        while len(pooled.results) < len(events) + 1 and time.monotonic() < deadline:
+            controller.process()
+            time.sleep(0.001)
+        for node in (1, 2):
+            in_order = [event for event in events if event[2] == node]
+            assert [data for data in pooled.executed if data[2] == node] == in_order
+            assert [
+                result.data for result in pooled.results if result.data[2] == node
+            ] == in_order
+        failed = [result for result in pooled.results if result.data[2] == 3]
+        assert isinstance(failed[0].error, ValueError)
+        assert all(
+            result.result == result.data[4] and result.error is None
+            for result in pooled.results
+            if result.data[2] != 3
+        )
+        assert controller.queue_depths[ExecutionPolicy.THREAD] == 0
+        controller.shutdown_pools()
+
+    def test_failing_handler(self, tmp_path, caplog) -> None:
+        """
+        A failing pooled handler is logged and does not stop run() test
+        """
+        copyfile(self.filename, tmp_path / "config.json")
+        controller = Controller(
+            [FailingService()], tmp_path / "config.json", process_workers=1
+        )
+        deadline = time.monotonic() + 10.0
+
+        def check() -> None:
+            if "failed to execute" in caplog.text or time.monotonic() > deadline:
+                controller.stop()
+
+        controller.add_timer(0.01, check)
+        controller.dispatch(bytes([OPC_ACON, 0, 1, 0, 2]))
+        controller.run()
+        assert "FailingService failed to execute 9000010002" in caplog.text
+        assert "ValueError: bad event" in caplog.text
+        assert time.monotonic() < deadline
+
+    def test_process_pool(self) -> None:
+        """
+        Process pool execution policy test
+        """
+        service = ProcessService()
+        controller = Controller([service], self.filename, process_workers=1)
+        controller.dispatch(bytes([OPC_ACON, 0, 1, 0, 2]))
+        deadline = time.monotonic() + 10.0
+        while not service.results and time.monotonic() < deadline:
+            controller.process()
+            time.sleep(0.001)
+        controller.shutdown_pools()
+        assert service.results and service.results[0] != os.getpid()
+        assert not service.received
+        # the default execute is bound to the service, which cannot be pickled
+        unpicklable = EventService()
+        unpicklable.execution = ExecutionPolicy.PROCESS
+        with pytest.raises(ValueError):
+            Controller([unpicklable], self.filename)
+        # nor can a lambda
+        unpicklable = ProcessService()
+        unpicklable.execute = lambda data: None
+        with pytest.raises(ValueError):
+            Controller([unpicklable], self.filename)
+        # slotted services are checked the same way
+        Controller([SlottedProcessService()], self.filename)
+
+
+class TestActionRing:
+    """
+    Action ring buffer tests.
+    """
+
+    def test_wrap_around(self) -> None:
+        """
+        FIFO order across the end of the slots test
+        """
+        ring = ActionRing(4)
+        actions = [TimerExpired(i) for i in range(10)]
+        assert ring.put(actions[0]) and ring.put(actions[1]) and ring.put(actions[2])
+        assert ring.drain(2) == actions[:2]
+        for action in actions[3:6]:
+            assert ring.put(action)
+        assert ring.free == 0
+        assert not ring.put(actions[6])
+        assert len(ring) == 4
+        assert ring.drain(10) == actions[2:6]
+        assert ring.drain(10) == []
+        assert ring.free == 4
+
+
+class TestHistogram:
+    """
+    Duration histogram tests.
+    """
+
+    def test_summary(self) -> None:
+        """
+        Percentiles within a bucket of the exact value test
+        """
+        histogram = Histogram()
+        assert histogram.summary() == {
+            "count": 0,
+            "mean": 0.0,
+            "p50": 0,
+            "p99": 0,
+            "max": 0,
+        }
+        for i in range(1, 1001):
+            histogram.add(i * 1000)
+        assert histogram.count == 1000
+        assert histogram.mean == 500500.0
+        assert 500000 <= histogram.percentile(50) < 500000 * 1.25
+        assert 990000 <= histogram.percentile(99) <= 1000000
+        assert histogram.max == 1000000
+        histogram.clear()
+        assert histogram.count == 0
+
 
 class TestParams:
     """
@@ -120,3 +684,42 @@ class TestParams:
         assert not p.is_learn_mode
         p.is_learn_mode = True
         assert p.is_learn_mode
+
+
+class TestResponseCache:
+    """
+    Node information replies cache test.
+    """
+
+    def test_replies(self, tmp_path) -> None:
+        """
+        Replies are encoded once and refreshed after a change.
+        """
+        # pylint: disable=R0201
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        config = Configuration(tmp_path / "config.json")
+        config.node_number = 0x0102
+        params = Params()
+        params.num_evts = 10
+        cache = ResponseCache(params, config, [MinimumNodeService()])
+        params_reply = cache.reply(bytes([OPC_RQNP]))
+        assert params_reply == (bytes([0xEF, MANU_DEV, ord("a"), 0, 10, 0, 0, 0]),)
+        assert cache.reply(bytes([OPC_RQNP])) is params_reply
+        assert cache.reply(bytes([OPC_RQMN])) == (b"\xe2       ",)
+        assert cache.reply(bytes([OPC_RQNPN, 1, 2, PAR_EVTNUM])) == (
+            bytes([0x9B, 1, 2, PAR_EVTNUM, 10]),
+        )
+        assert cache.reply(bytes([OPC_RQNPN, 1, 3, PAR_EVTNUM])) == ()
+        assert cache.reply(bytes([OPC_RQNPN, 1, 2, 99])) == ()
+        assert cache.reply(bytes([OPC_RQSD, 1, 2, 0])) == (
+            bytes([0xAC, 1, 2, 0, 0, 1]),
+            bytes([0xAC, 1, 2, 1, SERVICE_ID_MNS, 1]),
+        )
+        assert cache.reply(bytes([OPC_RQSD, 1, 2, 1])) == (
+            bytes([0xE7, 1, 2, 1, SERVICE_ID_MNS, 0, 0, 0]),
+        )
+        assert cache.reply(bytes([OPC_QNN])) == ()
+        params.num_evts = 20
+        assert cache.reply(bytes([OPC_RQNP]))[0][4] == 20
+        config.node_number = 0x0103
+        assert cache.reply(bytes([OPC_RQNPN, 1, 3, PAR_EVTNUM]))[0][1:3] == b"\x01\x03"
@@ -1,8 +1,14 @@
 #!/usr/bin/env python
 """Tests for `pyvlcb` package."""
+
 # pylint: disable=redefined-outer-name
 
+import os
+import sys
+from shutil import copyfile
+
 from pytest import fixture
+from pyvlcb.modules.controller import Controller
 from pyvlcb.services.serialui import ConsoleUIService
 
 
@@ -20,14 +26,41 @@ class TestConsoleUI:
 
     def test_no_request(self, console_service: ConsoleUIService, monkeypatch) -> None:
         """
-        Request action tests.
+        End of input test.
         """
         monkeypatch.setattr("sys.stdin.readline", lambda: "")
+        console_service.on_readable(sys.stdin)
         console_service.process(None)
+        assert console_service.fileobjs == ()
 
-    def test_request(self, console_service: ConsoleUIService, monkeypatch) -> None:
+    def test_request(
+        self, console_service: ConsoleUIService, monkeypatch, capsys
+    ) -> None:
         """
         Request action tests.
         """
-        monkeypatch.setattr("sys.stdin.readline", lambda: "s")
+        monkeypatch.setattr("sys.stdin.readline", lambda: "s\n")
+        console_service.on_readable(sys.stdin)
         console_service.process(None)
+        assert capsys.readouterr().out == "s\n"
+        assert console_service.fileobjs == (sys.stdin,)
+
+    def test_polled_input(self, tmp_path, monkeypatch, capsys) -> None:
+        """
+        Input read by process() when the controller loop does not run test.
+        """
+        read_fd, write_fd = os.pipe()
+        console = os.fdopen(read_fd)
+        monkeypatch.setattr("pyvlcb.services.serialui.stdin", console)
+        copyfile("pyvlcb/config.json", tmp_path / "config.json")
+        console_service = ConsoleUIService()
+        controller = Controller([console_service], tmp_path / "config.json")
+        controller.process()
+        assert capsys.readouterr().out == ""
+        os.write(write_fd, b"s\n")
+        controller.process()
+        assert capsys.readouterr().out == "s\n"
+        os.close(write_fd)
+        controller.process()
+        assert console_service.fileobjs == ()
+        console.close()
@@ -1,7 +1,5 @@
 """Prueba."""
 
-from time import sleep
-
 from pyvlcb.modules.controller import Controller
 from pyvlcb.services.serialui import ConsoleUIService
 
@@ -20,6 +18,4 @@ class KK(Controller):
 
 if __name__ == "__main__":
     kk = KK()
-    while True:
-        kk.services[0].process(None)
-        sleep(0.1)
+    kk.run()